@@ -1,12 +1,24 @@
 # modular_db_agent.py
+import os
+import re
+import asyncio
+import contextvars
 import logging
+import threading
 from langchain_core.messages import HumanMessage, AIMessage
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, END, START
 from langgraph.graph.message import MessagesState
+from langchain_core.runnables import RunnableConfig
 from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
 from pydantic import BaseModel
 from azure_openai_llm import get_llm # can use Your Own LLM Instance
+from rate_limiter import BACKGROUND
+from prompt_templates import StablePrompt
+from llm_dispatcher import WindowedDispatcher
+from sql_stream_parser import JSON_OUTPUT_INSTRUCTIONS, QueryStreamParser, validate_statement
+from tenant_registry import TenantRegistry, MAX_TENANTS, TENANT_IDLE_SECONDS
 
 # Configure logging
 logging.basicConfig(
@@ -15,6 +27,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+PIPELINE_QUEUE_SIZE = 2  # Statements buffered between SQL generation and execution
+
+# Tenants map to databases through a URL template, e.g. "sqlite:///tenants/{tenant_id}.db"
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "northwind")
+TENANT_DB_URL = os.getenv("TENANT_DB_URL", "sqlite:///{tenant_id}.db")
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Callers that can cancel a run (e.g. the HTTP service) set a threading.Event here;
+# it is copied into node threads and interrupts running SQLite statements.
+run_cancelled = contextvars.ContextVar("run_cancelled", default=None)
+SQLITE_PROGRESS_STEPS = 1000  # VM steps between cancellation checks
+
+# Static prompt prefixes come first and never change between calls, so provider-side
+# prompt caching can reuse them; the per-request parts go in the suffix.
+INTENT_INSTRUCTIONS = """
+You are an assistant helping to interact with a database.
+Based on the conversation, understand the user's intent and generate a clear and detailed prompt that can be used to create SQL queries.
+Ensure the prompt provides enough context and clarity for generating accurate SQL queries aligned with the user's intent.
+If the intent is unclear or not related to the database, return "No prompt generated."
+"""
+
+SQL_INSTRUCTIONS = """
+You are a SQL expert. You write SQL for the database schema below.
+Analyze the user's intent and, if necessary, break it down into multiple steps.
+Write one or more SQL queries (as a list) to fulfill the user's request, ensuring that the queries align with the schema and handle any dependencies between tables.
+
+Database schema:
+
+{schema}
+"""
+
+SUMMARY_INSTRUCTIONS = """
+You are a helpful assistant. Generate a natural-language summary of the query result the user receives, in the proper structured format.
+"""
+
+intent_prompt = StablePrompt(
+    "extract_user_intent",
+    INTENT_INSTRUCTIONS,
+    "Here is the conversation so far:\n\n{convo}\nThe user has now said:\n\n{latest}",
+)
+summary_prompt = StablePrompt(
+    "summarize_result",
+    SUMMARY_INSTRUCTIONS,
+    'The user asked: "{user_query}"\n\nResult: {result}',
+)
+
+
 class SQLQuery(BaseModel):
     query: list[str]
 
@@ -29,11 +88,32 @@ class DBState(MessagesState):
 class SQLiteAdapter:
     def __init__(self, db):
         self.db = db
+        # One engine (and connection pool) per adapter, created lazily and reused
+        self._engine = None
+        self._engine_lock = threading.Lock()
+        self._schema = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    self._engine = create_engine(self.db)
+        return self._engine
+
+    def dispose(self):
+        # The engine object is kept: a request still running on an evicted
+        # adapter reuses it instead of creating a second, never-disposed engine.
+        # Connections it checks out after this are dropped with the adapter.
+        with self._engine_lock:
+            if self._engine is not None:
+                self._engine.dispose()
 
     def get_schema_metadata(self):
+        if self._schema is not None:
+            return self._schema
         try:
-            engine = create_engine(self.db)
-            inspector = inspect(engine)
+            inspector = inspect(self.engine)
             schema_info = {}
             for table_name in inspector.get_table_names():
                 columns = inspector.get_columns(table_name)
@@ -47,6 +127,7 @@ class SQLiteAdapter:
                     "primary_key": inspector.get_pk_constraint(table_name)["constrained_columns"]
                 }
             logger.info("Schema metadata retrieved successfully.")
+            self._schema = schema_info
             return schema_info
         except Exception as e:
             logger.error(f"Failed to retrieve schema metadata: {e}")
@@ -57,12 +138,22 @@ class SQLiteAdapter:
             logger.warning("No query found to execute.")
             return {"result": "No query found to execute."}
 
+        cancel = run_cancelled.get()
+        if cancel is not None and cancel.is_set():
+            raise RuntimeError("Run cancelled.")
         try:
-            engine = create_engine(self.db)
-            with engine.connect() as connection:
-                result_proxy = connection.execute(text(query))
-                rows = result_proxy.fetchall()
-                column_names = result_proxy.keys()
+            with self.engine.connect() as connection:
+                raw = connection.connection.dbapi_connection
+                interruptible = cancel is not None and hasattr(raw, "set_progress_handler")
+                if interruptible:
+                    raw.set_progress_handler(cancel.is_set, SQLITE_PROGRESS_STEPS)
+                try:
+                    result_proxy = connection.execute(text(query))
+                    rows = result_proxy.fetchall()
+                    column_names = result_proxy.keys()
+                finally:
+                    if interruptible:
+                        raw.set_progress_handler(None, 0)
 
                 # Format results as a list of dictionaries
                 results = [dict(zip(column_names, row)) for row in rows]
@@ -72,23 +163,160 @@ class SQLiteAdapter:
             logger.error(f"Query execution failed: {e}")
             raise
 
-class ModularDBAgent:
-    def __init__(self, db, llm):
+def resolve_tenant_db(tenant_id: str):
+    """
+    Default tenant resolver: fills TENANT_DB_URL with the tenant id. Unknown
+    SQLite tenants raise instead of silently creating an empty database file.
+    """
+    if not TENANT_ID_PATTERN.match(tenant_id or ""):
+        raise ValueError(f"Invalid tenant id: {tenant_id!r}")
+    url = TENANT_DB_URL.format(tenant_id=tenant_id)
+    database = make_url(url).database
+    if url.startswith("sqlite") and database and database != ":memory:" and not os.path.exists(database):
+        raise LookupError(f"No database for tenant '{tenant_id}'.")
+    return SQLiteAdapter(url)
+
+
+def tenant_config(tenant_id: str, thread_id: str) -> dict:
+    """
+    Run config for one tenant's conversation. The thread id is namespaced by
+    tenant because all tenants share one graph and one checkpointer.
+    """
+    return {"configurable": {"tenant_id": tenant_id, "thread_id": f"{tenant_id}:{thread_id}"}}
+
+
+class Tenant:
+    """
+    Warm per-tenant state: the adapter (engine + cached schema) and the SQL
+    prompt whose static prefix embeds that schema.
+    """
+
+    def __init__(self, tenant_id, db, sql_prompt):
+        self.tenant_id = tenant_id
         self.db = db
-        self.llm = llm
+        self.sql_prompt = sql_prompt
+
+    def close(self):
+        dispose = getattr(self.db, "dispose", None)
+        if dispose is not None:
+            dispose()
+
+
+class ModularDBAgent:
+    def __init__(self, db=None, llm=None, dispatch_window_ms=None, sql_output_mode="function_calling", pipelined=False,
+                 resolve_db=None, max_tenants=MAX_TENANTS, tenant_idle_seconds=TENANT_IDLE_SECONDS):
+        if db is None and resolve_db is None:
+            raise ValueError("ModularDBAgent needs a db adapter or a resolve_db(tenant_id) function.")
+        # A fixed db serves every request; otherwise each run's config names its tenant
+        self.fixed_db = db
+        self.resolve_db = resolve_db
+        self._llm = llm  # None -> shared client from the registry, built on first use
+        self._dispatcher = None
+        self._dispatcher_lock = threading.Lock()
+        self._structured_sql = None
+        # "function_calling": provider tool call via with_structured_output (built once, reused)
+        # "json_stream": plain streamed JSON, statements parsed as soon as each one completes
+        self.sql_output_mode = "json_stream" if pipelined else sql_output_mode
+        # Pipelined: statements run on the adapter while the LLM is still writing the next one
+        self.pipelined = pipelined
+        # Optional windowed dispatch of intent / summary calls: caps how many run at once
+        # across concurrent conversations (one provider request per call either way)
+        self.dispatch_window_ms = dispatch_window_ms
         self.memory = MemorySaver()
+        self.tenants = TenantRegistry(
+            self.load_tenant,
+            max_tenants=1 if db is not None else max_tenants,
+            idle_seconds=0 if db is not None else tenant_idle_seconds,
+        )
+        if db is not None:
+            self.tenants.get(DEFAULT_TENANT)  # Fail fast on a bad fixed database
+
+    def load_tenant(self, tenant_id: str) -> Tenant:
+        db = self.fixed_db if self.fixed_db is not None else self.resolve_db(tenant_id)
         try:
-            self.metadata = self.db.get_schema_metadata()
+            metadata = db.get_schema_metadata()
         except Exception as e:
-            logger.error(f"Failed to initialize metadata: {e}")
+            logger.error(f"Failed to initialize metadata for tenant '{tenant_id}': {e}")
             raise
+        # The schema is static for the tenant's lifetime, so it is part of the cached prefix
+        sql_instructions = SQL_INSTRUCTIONS.format(schema=self.format_schema(metadata))
+        if self.sql_output_mode == "json_stream":
+            sql_instructions += JSON_OUTPUT_INSTRUCTIONS
+        sql_prompt = StablePrompt(
+            "generate_sql",
+            sql_instructions,
+            "{error_note}The user has asked the following question or made the following request:\n\n\"{user_query}\"",
+        )
+        return Tenant(tenant_id, db, sql_prompt)
+
+    def tenant(self, config: RunnableConfig | None = None) -> Tenant:
+        if self.fixed_db is not None:
+            return self.tenants.get(DEFAULT_TENANT)
+        tenant_id = ((config or {}).get("configurable") or {}).get("tenant_id") or DEFAULT_TENANT
+        return self.tenants.get(tenant_id)
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = get_llm()
+        return self._llm
+
+    @property
+    def structured_sql(self):
+        if self._structured_sql is None:
+            self._structured_sql = self.llm.with_structured_output(SQLQuery, include_raw=True)
+        return self._structured_sql
+
+    def stream_sql_statements(self, sql_prompt, prompt):
+        """
+        Streams the SQL plan as JSON and yields each statement, validated, as soon
+        as its closing quote arrives.
+        """
+        parser = QueryStreamParser()
+        full_message = None
+        for chunk in self.llm.stream(prompt):
+            full_message = chunk if full_message is None else full_message + chunk
+            for statement in parser.feed(chunk.content):
+                yield validate_statement(statement)
+        sql_prompt.report(full_message)
+        if not parser.done:
+            raise ValueError("SQL plan ended before the query list was complete.")
+
+    def _get_dispatcher(self):
+        if self._dispatcher is None:
+            with self._dispatcher_lock:
+                if self._dispatcher is None:
+                    self._dispatcher = WindowedDispatcher(self.llm, window_ms=self.dispatch_window_ms)
+        return self._dispatcher
+
+    def _completion_target(self, priority=None):
+        llm = self.llm
+        if priority and hasattr(llm, "with_priority"):
+            llm = llm.with_priority(priority)
+        return llm
+
+    def complete(self, prompt, priority=None):
+        """
+        Non-streamed LLM call, routed through the windowed dispatcher when it is enabled.
+        """
+        if self.dispatch_window_ms:
+            return self._get_dispatcher().invoke(prompt, priority=priority)
+        return self._completion_target(priority).invoke(prompt)
 
-    def format_schema(self) -> str:
+    async def acomplete(self, prompt, priority=None):
+        """
+        Async `complete` for async nodes, so the call does not block the event loop.
+        """
+        if self.dispatch_window_ms:
+            return await self._get_dispatcher().ainvoke(prompt, priority=priority)
+        return await self._completion_target(priority).ainvoke(prompt)
+
+    def format_schema(self, metadata) -> str:
         """
         Converts parsed schema dict into a readable schema format for the LLM.
         """
         formatted = []
-        for table_name, table_data in self.metadata.items():
+        for table_name, table_data in metadata.items():
             columns = ", ".join(
                 f"{col['name']} ({col['type']})"
                 for col in table_data.get("columns", [])
@@ -100,18 +328,8 @@ class ModularDBAgent:
         try:
             prior, latest = state["messages"][:-1], state["messages"][-1]
             convo = "\n".join(f"User: {m.content}" for m in prior)
-            prompt = f"""
-You are an assistant helping to interact with a database. Here is the conversation so far:
-
-{convo}
-The user has now said:
-
-{latest.content}
-Based on the conversation, understand the user's intent and generate a clear and detailed prompt that can be used to create SQL queries. 
-Ensure the prompt provides enough context and clarity for generating accurate SQL queries aligned with the user's intent.
-If the intent is unclear or not related to the database, return "No prompt generated."
-            """
-            response = self.llm.invoke(prompt)
+            response = self.complete(intent_prompt.messages(convo=convo, latest=latest.content))
+            intent_prompt.report(response)
             state["intent"] = [response.content.strip()]
             logger.info("User intent extracted successfully.")
             return state
@@ -119,9 +337,9 @@ If the intent is unclear or not related to the database, return "No prompt gener
             logger.error(f"Failed to extract user intent: {e}")
             raise
 
-    def generate_sql_query(self, state: DBState):
+    def generate_sql_query(self, state: DBState, config: RunnableConfig = None):
         try:
-            schema_str = self.format_schema()
+            tenant = self.tenant(config)
             user_query = state["intent"] if state["intent"] else ""
             previous_error = state.get("error", None)
             if user_query == "No query found.":
@@ -129,21 +347,18 @@ If the intent is unclear or not related to the database, return "No prompt gener
                 logger.warning("No actionable query found.")
                 return state
 
-            prompt = f"""
-You are a SQL expert. Given the following database schema:
-
-{schema_str}
-The user has asked the following question or made the following request:
-
-{f"The previous query attempt failed with the following error:\n{previous_error}\nPlease correct it." if previous_error else ""}
-
-"{user_query}"
-Analyze the user's intent and, if necessary, break it down into multiple steps.
-Write one or more SQL queries (as a list) to fulfill the user's request, ensuring that the queries align with the schema and handle any dependencies between tables.
-            """
-            structured_sql = self.llm.with_structured_output(SQLQuery)
-            result = structured_sql.invoke(prompt)
-            state["query"] = result.query
+            error_note = ""
+            if previous_error:
+                error_note = f"The previous query attempt failed with the following error:\n{previous_error}\nPlease correct it.\n\n"
+            prompt = tenant.sql_prompt.messages(error_note=error_note, user_query=user_query)
+            if self.sql_output_mode == "json_stream":
+                state["query"] = list(self.stream_sql_statements(tenant.sql_prompt, prompt))
+            else:
+                output = self.structured_sql.invoke(prompt)
+                tenant.sql_prompt.report(output["raw"])
+                if output["parsing_error"]:
+                    raise output["parsing_error"]
+                state["query"] = output["parsed"].query
             state.pop("error", None)
             logger.info("SQL query generated successfully.")
             return state
@@ -151,12 +366,13 @@ Write one or more SQL queries (as a list) to fulfill the user's request, ensurin
             logger.error(f"Failed to generate SQL query: {e}")
             raise
 
-    def execute_sql_query(self, state: DBState):
+    def execute_sql_query(self, state: DBState, config: RunnableConfig = None):
         results = []
         state["error"] = None  # Reset previous error
         try:
+            db = self.tenant(config).db
             for query in state["query"]:
-                res = self.db.execute_query(query)
+                res = db.execute_query(query)
                 results.append(res)
             state["result"] = results
             logger.info("SQL query executed successfully.")
@@ -167,6 +383,57 @@ Write one or more SQL queries (as a list) to fulfill the user's request, ensurin
             logger.error(f"SQL query execution failed: {error_msg}")
         return state
 
+    async def generate_and_execute_sql(self, state: DBState, config: RunnableConfig = None):
+        """
+        Pipelined generate + execute. The LLM streams the SQL plan into a bounded
+        queue; each completed statement is validated and run on the adapter while
+        the model is still producing the next one.
+        """
+        user_query = state["intent"] if state["intent"] else ""
+        previous_error = state.get("error", None)
+        error_note = ""
+        if previous_error:
+            error_note = f"The previous query attempt failed with the following error:\n{previous_error}\nPlease correct it.\n\n"
+        tenant = await asyncio.to_thread(self.tenant, config)  # May load the tenant's schema
+        prompt = tenant.sql_prompt.messages(error_note=error_note, user_query=user_query)
+
+        queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        queries, results = [], []
+
+        async def produce():
+            parser = QueryStreamParser()
+            full_message = None
+            async for chunk in self.llm.astream(prompt):
+                full_message = chunk if full_message is None else full_message + chunk
+                for statement in parser.feed(chunk.content):
+                    await queue.put(validate_statement(statement))
+            tenant.sql_prompt.report(full_message)
+            if not parser.done:
+                raise ValueError("SQL plan ended before the query list was complete.")
+            await queue.put(None)
+
+        async def consume():
+            while (statement := await queue.get()) is not None:
+                queries.append(statement)
+                results.append(await asyncio.to_thread(tenant.db.execute_query, statement))
+
+        producer = asyncio.create_task(produce())
+        consumer = asyncio.create_task(consume())
+        state["error"] = None  # Reset previous error
+        try:
+            await asyncio.gather(producer, consumer)
+            state["result"] = results
+            logger.info(f"Pipelined SQL generation and execution finished ({len(queries)} statements).")
+        except Exception as e:
+            producer.cancel()
+            consumer.cancel()
+            error_msg = f"{type(e).__name__}: {str(e)}"
+            state["result"] = None
+            state["error"] = error_msg
+            logger.error(f"Pipelined SQL execution failed: {error_msg}")
+        state["query"] = queries
+        return state
+
     async def validate_and_generate_result(self, state: DBState):
         try:
             state.setdefault("retries", 0)
@@ -190,12 +457,10 @@ Write one or more SQL queries (as a list) to fulfill the user's request, ensurin
                     yield {"event": "on_custom_stream", "data": {"chunk": AIMessage(content=response_msg)}}
                 else:
                     user_query = state["messages"][-1].content
-                    prompt = f"""
-You are a helpful assistant. The user asked:"{user_query}"
-
-Generate a natural-language summary of the result : "{result} in the proper structured format".
-"""
-                    response = self.llm.invoke(prompt)
+                    prompt = summary_prompt.messages(user_query=user_query, result=result)
+                    # Summaries yield to interactive calls when the shared rate limiter is busy
+                    response = await self.acomplete(prompt, priority=BACKGROUND)
+                    summary_prompt.report(response)
                     state["messages"].append(AIMessage(content=response.content.strip()))
                     logger.info("Result validated and summarized successfully.")
 
@@ -218,19 +483,28 @@ Generate a natural-language summary of the result : "{result} in the proper stru
     def compile_graph(self):
         graph = StateGraph(DBState)
         graph.add_node("extract_user_intent", self.extract_user_intent)
-        graph.add_node("generate_sql", self.generate_sql_query)
-        graph.add_node("execute_sql", self.execute_sql_query)
         graph.add_node("validate_and_generate_result", self.validate_and_generate_result)
-
         graph.set_entry_point("extract_user_intent")
-        graph.add_edge("extract_user_intent", "generate_sql")
-        graph.add_edge("generate_sql", "execute_sql")
-        graph.add_edge("execute_sql", "validate_and_generate_result")
+
+        if self.pipelined:
+            # One node runs the generate -> queue -> execute pipeline
+            sql_node = "generate_and_execute_sql"
+            graph.add_node(sql_node, self.generate_and_execute_sql)
+            graph.add_edge("extract_user_intent", sql_node)
+            graph.add_edge(sql_node, "validate_and_generate_result")
+        else:
+            sql_node = "generate_sql"
+            graph.add_node("generate_sql", self.generate_sql_query)
+            graph.add_node("execute_sql", self.execute_sql_query)
+            graph.add_edge("extract_user_intent", "generate_sql")
+            graph.add_edge("generate_sql", "execute_sql")
+            graph.add_edge("execute_sql", "validate_and_generate_result")
+
         graph.add_conditional_edges(
             "validate_and_generate_result",
             self.route_validation,
             {
-                "generate_sql": "generate_sql",
+                "generate_sql": sql_node,
                 END: END
             }  # “condition mapping” — it tells the graph which nodes are valid destinations for the condition function (validate_result) to return.
         )
@@ -241,11 +515,15 @@ Generate a natural-language summary of the result : "{result} in the proper stru
 
 
 
-db = SQLiteAdapter("sqlite:///northwind.db")
-
-llm = get_llm()
-
-agent = ModularDBAgent(db=db, llm=llm)
+# LLM client is resolved lazily on the first call; set LLM_DISPATCH_WINDOW_MS to cap how many
+# intent/summary calls run at once across concurrent users (their tokens are then not streamed to the UI)
+# One agent and one compiled graph serve every tenant; pass tenant_config(tenant_id, thread_id) per run
+agent = ModularDBAgent(
+    resolve_db=resolve_tenant_db,
+    dispatch_window_ms=float(os.getenv("LLM_DISPATCH_WINDOW_MS", "0")) or None,
+    sql_output_mode=os.getenv("SQL_OUTPUT_MODE", "function_calling"),
+    pipelined=os.getenv("SQL_PIPELINED", "").lower() in ("1", "true", "yes"),
+)
 graph = agent.compile_graph()
 
 # initial_state = DBState(messages=[
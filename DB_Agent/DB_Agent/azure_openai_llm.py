@@ -1,21 +1,49 @@
 import os
+import time
 import base64
+import asyncio
+import logging
+import threading
+import weakref
+from functools import lru_cache
+import httpx
 import requests
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
+from rate_limiter import RateLimiter, RateLimitedLLM, DEFAULT_RPM, DEFAULT_TPM, DEFAULT_MAX_CONCURRENCY
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-model = os.getenv("AZURE_MODEL")
-azure_endpoint = os.getenv("AZURE_ENDPOINT")
-api_version = os.getenv("API_VERSION")
-azure_openai_api_key = os.getenv("AZURE_OPEN_AI_API_KEY")
+TOKEN_REFRESH_MARGIN = 300   # Refresh this many seconds before the token expires
+TOKEN_DEFAULT_TTL = 3600     # Used when the token endpoint omits expires_in
+TOKEN_RETRY_DELAY = 30       # Background retry delay after a failed refresh
 
-print(os.getenv("API_VERSION"))
-api_key_url = os.getenv("API_KEY_URL")
-client_id = os.getenv("CLIENT_ID")
-client_secret = os.getenv("CLIENT_SECRET")
-appkey = os.getenv("APPKEY")
+HTTP_MAX_CONNECTIONS = 50          # Pooled connections shared per endpoint
+HTTP_MAX_KEEPALIVE = 20
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+
+@lru_cache(maxsize=1)
+def get_settings():
+    """
+    Reads the LLM configuration from .env / the environment on first use
+    (not at import time).
+    """
+    load_dotenv()
+    return {
+        "mode": os.getenv("MODE", "AzureOpenAI"),
+        "model": os.getenv("AZURE_MODEL"),
+        "embedding_model": os.getenv("AZURE_EMBEDDING_MODEL") or os.getenv("AZURE_MODEL"),
+        "azure_endpoint": os.getenv("AZURE_ENDPOINT"),
+        "api_version": os.getenv("API_VERSION"),
+        "azure_openai_api_key": os.getenv("AZURE_OPEN_AI_API_KEY"),
+        "api_key_url": os.getenv("API_KEY_URL"),
+        "client_id": os.getenv("CLIENT_ID"),
+        "client_secret": os.getenv("CLIENT_SECRET"),
+        "appkey": os.getenv("APPKEY"),
+        "rpm": int(os.getenv("LLM_RPM", DEFAULT_RPM)),
+        "tpm": int(os.getenv("LLM_TPM", DEFAULT_TPM)),
+        "max_concurrency": int(os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+    }
 
 
 def encode_credentials(client_id, client_secret):
@@ -23,45 +51,312 @@ def encode_credentials(client_id, client_secret):
     return base64.b64encode(credentials.encode("utf-8")).decode("utf-8")
 
 
-def get_token(encoded_value):
-    url = api_key_url
+def fetch_token(encoded_value):
+    """
+    Requests a client-credentials access token.
+    Returns (access_token, expires_in_seconds); raises on a failed request.
+    """
+    url = get_settings()["api_key_url"]
     headers = {
         "Accept": "*/*",
         "Content-Type": "application/x-www-form-urlencoded",
         "Authorization": f"Basic {encoded_value}",
     }
     data = {"grant_type": "client_credentials"}
-    response = requests.post(url, headers=headers, data=data)
-    if response.status_code == 200:
-        return response.json().get("access_token")
-    else:
-        return response.text
+    response = requests.post(url, headers=headers, data=data, timeout=30)
+    response.raise_for_status()
+    payload = response.json()
+    return payload["access_token"], int(payload.get("expires_in", TOKEN_DEFAULT_TTL))
 
 
-def get_llm():
-    if azure_openai_api_key and azure_openai_api_key.strip():
-        print("Azure OpenAI API Key found")
-        llm = AzureOpenAIEmbeddings(
-            deployment_name=model,
-            azure_endpoint=azure_endpoint,
-            api_key=azure_openai_api_key,
-            api_version=api_version,
-        )
-        return llm
-    elif client_id and client_secret:
-        print("Client ID and Client Secret found -- Initializing -- AzureChatOpenAI")
-        encoded_value = encode_credentials(client_id, client_secret)
-        token = get_token(encoded_value)
-        user = f'{{"appkey": "{appkey}"}}'
-
-        llm = AzureChatOpenAI(
-            deployment_name=model,
-            azure_endpoint=azure_endpoint,
-            api_key=token,
-            api_version=api_version,  # Optional if specific base URL is needed
-            model_kwargs=dict(user=user),  # Include API key if necessary
+def get_token(encoded_value):
+    """
+    Returns a fresh access token; request errors propagate to the caller.
+    """
+    return fetch_token(encoded_value)[0]
+
+
+class TokenProvider:
+    """
+    Caches the OAuth access token together with its expiry and refreshes it in
+    a background timer before it expires, so callers always get a cached token.
+
+    Instances are callables and plug straight into `azure_ad_token_provider`;
+    `async_provider` is the matching `azure_ad_async_token_provider`.
+    Concurrent refreshes are deduplicated: only one thread fetches, the others
+    either keep using the still-valid token or wait for that single fetch.
+    """
+
+    def __init__(self, encoded_value, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.encoded_value = encoded_value
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0.0
+        self._margin = refresh_margin
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def _valid(self):
+        return self._token is not None and time.monotonic() < self._expires_at
+
+    def _schedule(self, delay):
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(delay, 0), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def refresh(self, force=False):
+        """
+        Fetches a new token unless another caller already refreshed it.
+        """
+        with self._lock:
+            if not force and self._valid() and time.monotonic() < self._expires_at - self._margin:
+                return self._token
+            token, expires_in = fetch_token(self.encoded_value)
+            self._token = token
+            self._expires_at = time.monotonic() + expires_in
+            # Short-lived tokens refresh at half-life; the freshness check above uses the same margin
+            self._margin = min(self.refresh_margin, expires_in / 2)
+            self._schedule(expires_in - self._margin)
+            logger.info("Access token refreshed; expires in %ss.", expires_in)
+            return token
+
+    def _background_refresh(self):
+        try:
+            self.refresh(force=True)
+        except Exception as e:
+            logger.error(f"Background token refresh failed: {e}")
+            self._schedule(TOKEN_RETRY_DELAY)
+
+    def start(self):
+        """
+        Prefetches the first token in the background.
+        """
+        self._schedule(0)
+        return self
+
+    def __call__(self):
+        if self._valid():
+            return self._token
+        # Cold start or expired: a single caller fetches, the rest wait on the lock
+        return self.refresh()
+
+    async def async_provider(self):
+        if self._valid():
+            return self._token
+        return await asyncio.to_thread(self.refresh)
+
+    def stop(self):
+        """
+        Cancels the pending background refresh.
+        """
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+
+# --- Client registry ---
+# Clients are built lazily on first use and shared by every agent in the process.
+# All clients for one endpoint reuse a single pooled HTTP transport; async
+# connections are pooled per event loop, since a connection belongs to the loop
+# that opened it (asyncio.run per message, the dispatcher loop, uvicorn, ...).
+
+_clients = {}
+_http_clients = {}
+_limiters = {}
+_token_provider = None
+_registry_lock = threading.Lock()
+
+
+class PerLoopTransport(httpx.AsyncBaseTransport):
+    """
+    Async transport that keeps one connection pool per running event loop.
+    Pools of loops that have been garbage-collected are dropped with them.
+    """
+
+    def __init__(self, limits):
+        self.limits = limits
+        self._transports = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _for_loop(self, loop):
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = httpx.AsyncHTTPTransport(limits=self.limits)
+                self._transports[loop] = transport
+            return transport
+
+    async def handle_async_request(self, request):
+        transport = self._for_loop(asyncio.get_running_loop())
+        return await transport.handle_async_request(request)
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.pop(loop, None)
+        if transport is not None:
+            await transport.aclose()
+        self.close()
+
+    def close(self):
+        """
+        Closes every pool on its own loop; pools of closed loops are just dropped.
+        """
+        with self._lock:
+            pools = list(self._transports.items())
+            self._transports.clear()
+        for loop, transport in pools:
+            if loop.is_closed():
+                continue
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(transport.aclose(), loop)
+            else:
+                loop.run_until_complete(transport.aclose())
+
+
+def _http_clients_for(endpoint):
+    if endpoint not in _http_clients:
+        limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+        async_transport = PerLoopTransport(limits)
+        _http_clients[endpoint] = (
+            httpx.Client(limits=limits, timeout=HTTP_TIMEOUT),
+            httpx.AsyncClient(transport=async_transport, timeout=HTTP_TIMEOUT),
+            async_transport,
         )
-        return llm
+    return _http_clients[endpoint]
+
+
+def _get_token_provider(settings):
+    global _token_provider
+    if _token_provider is None:
+        encoded_value = encode_credentials(settings["client_id"], settings["client_secret"])
+        _token_provider = TokenProvider(encoded_value).start()
+    return _token_provider
+
+
+def _fake_client(kind):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    if kind == "embeddings":
+        return DeterministicFakeEmbedding(size=384)
+    responses = os.getenv("FAKE_LLM_RESPONSES", "This is a fake response.").split("||")
+    # FAKE_LLM_SLEEP: seconds per streamed character, to simulate token latency
+    sleep = float(os.getenv("FAKE_LLM_SLEEP", "0")) or None
+    return FakeListChatModel(responses=responses, sleep=sleep)
+
+
+def _build_client(kind, deployment, settings):
+    from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
+
+    http_client, http_async_client, _ = _http_clients_for(settings["azure_endpoint"])
+    common = dict(
+        azure_endpoint=settings["azure_endpoint"],
+        api_version=settings["api_version"],
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+    api_key = settings["azure_openai_api_key"]
+    if api_key and api_key.strip():
+        logger.info(f"Azure OpenAI API Key found -- Initializing {kind} client for {deployment}")
+        common["api_key"] = api_key
+    elif settings["client_id"] and settings["client_secret"]:
+        logger.info(f"Client ID and Client Secret found -- Initializing {kind} client for {deployment}")
+        token_provider = _get_token_provider(settings)
+        common["azure_ad_token_provider"] = token_provider
+        common["azure_ad_async_token_provider"] = token_provider.async_provider
     else:
-        print("Azure OpenAI API Key or Client ID and Client Secret not found")
-        return None
+        raise ValueError("Azure OpenAI API Key or Client ID and Client Secret not found")
+
+    if kind == "embeddings":
+        return AzureOpenAIEmbeddings(deployment=deployment, **common)
+    appkey = settings["appkey"]
+    user = f'{{"appkey": "{appkey}"}}'
+    return AzureChatOpenAI(
+        deployment_name=deployment,
+        model_kwargs=dict(user=user),  # Include API key if necessary
+        max_retries=0,  # Retries and backoff are handled by the shared RateLimiter
+        stream_usage=True,  # Streamed responses report token usage (incl. cached tokens)
+        **common,
+    )
+
+
+def _limiter_for(deployment, settings):
+    # Caller holds _registry_lock
+    if deployment not in _limiters:
+        _limiters[deployment] = RateLimiter(
+            rpm=settings["rpm"], tpm=settings["tpm"], max_concurrency=settings["max_concurrency"]
+        )
+    return _limiters[deployment]
+
+
+def get_rate_limiter(deployment=None):
+    """
+    Returns the limiter shared by all chat calls to a deployment
+    (LLM_RPM / LLM_TPM / LLM_MAX_CONCURRENCY, read through get_settings()).
+    """
+    settings = get_settings()
+    deployment = deployment or settings["model"]
+    with _registry_lock:
+        return _limiter_for(deployment, settings)
+
+
+def get_client(kind="chat", deployment=None):
+    """
+    Returns the shared client of the given kind ("chat" or "embeddings"),
+    building it on first use. MODE=Fake returns offline fake models.
+    """
+    settings = get_settings()
+    if deployment is None:
+        deployment = settings["embedding_model"] if kind == "embeddings" else settings["model"]
+    key = (kind, settings["mode"], settings["azure_endpoint"], deployment)
+    client = _clients.get(key)
+    if client is None:
+        with _registry_lock:
+            client = _clients.get(key)
+            if client is None:
+                if settings["mode"].lower() == "fake":
+                    client = _fake_client(kind)
+                else:
+                    client = _build_client(kind, deployment, settings)
+                if kind == "chat":
+                    client = RateLimitedLLM(client, _limiter_for(deployment, settings))
+                _clients[key] = client
+    return client
+
+
+def get_chat_llm(deployment=None):
+    return get_client("chat", deployment)
+
+
+def get_embeddings(deployment=None):
+    return get_client("embeddings", deployment)
+
+
+def get_llm():
+    """
+    Backwards-compatible entry point: the shared chat model.
+    """
+    return get_chat_llm()
+
+
+def reset_clients():
+    """
+    Closes and drops cached clients and settings (e.g. between tests or after
+    changing .env), and stops the token provider's background refresh.
+    """
+    global _token_provider
+    with _registry_lock:
+        _clients.clear()
+        _limiters.clear()
+        for http_client, _, async_transport in _http_clients.values():
+            http_client.close()
+            async_transport.close()
+        _http_clients.clear()
+        if _token_provider is not None:
+            _token_provider.stop()
+        _token_provider = None
+        get_settings.cache_clear()
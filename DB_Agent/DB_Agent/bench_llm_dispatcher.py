@@ -0,0 +1,104 @@
+# Benchmark for llm_dispatcher.py: many concurrent conversations issuing small
+# intent/summary calls, sent directly vs. through the windowed dispatcher.
+#
+# The fake LLM models a connection-limited endpoint where every request pays a
+# fixed overhead (connection, auth, queueing). Like the real chat models, its
+# `abatch` sends one request per input, so both modes make the same number of
+# provider requests; the dispatcher only bounds how many are in flight (and adds
+# up to one window of latency).
+#
+# Usage: python bench_llm_dispatcher.py --users 200 --window-ms 5
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+from langchain_core.messages import AIMessage
+
+from llm_dispatcher import WindowedDispatcher
+
+
+class OverheadFakeLLM:
+    def __init__(self, overhead: float = 0.05, connections: int = 8):
+        self.overhead = overhead
+        self.connections = asyncio.Semaphore(connections)
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def ainvoke(self, value, config=None):
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            async with self.connections:
+                await asyncio.sleep(self.overhead)
+        finally:
+            self.in_flight -= 1
+        return AIMessage(content=f"ok: {value}")
+
+    async def abatch(self, values, config=None, return_exceptions=False):
+        return await asyncio.gather(*(self.ainvoke(v) for v in values), return_exceptions=return_exceptions)
+
+
+async def run_direct(llm, arrivals):
+    async def one(i, delay):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        await llm.ainvoke(f"q{i}")
+        return time.perf_counter() - start
+    return await asyncio.gather(*(one(i, d) for i, d in enumerate(arrivals)))
+
+
+async def run_dispatched(dispatcher, arrivals):
+    async def one(i, delay):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        await dispatcher.ainvoke(f"q{i}")
+        return time.perf_counter() - start
+    return await asyncio.gather(*(one(i, d) for i, d in enumerate(arrivals)))
+
+
+def report(name, latencies, elapsed, llm):
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{name:<10}{len(latencies) / elapsed:>10.1f}{statistics.median(ordered) * 1000:>10.1f}{p95 * 1000:>10.1f}{llm.requests:>10}{llm.peak_in_flight:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=0.5, help="Seconds over which requests arrive")
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-group", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Groups dispatched at once")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    arrivals = [rng.uniform(0, args.spread) for _ in range(args.users)]
+    print(f"{'mode':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'requests':>10}{'peak':>10}")
+
+    async def direct():
+        llm = OverheadFakeLLM()
+        start = time.perf_counter()
+        latencies = await run_direct(llm, arrivals)
+        report("direct", latencies, time.perf_counter() - start, llm)
+
+    asyncio.run(direct())
+
+    # asyncio primitives bind to a loop on first use, so the fake can serve the dispatcher's loop
+    llm = OverheadFakeLLM()
+    dispatcher = WindowedDispatcher(llm, window_ms=args.window_ms, max_group_size=args.max_group, max_groups_in_flight=args.max_in_flight)
+
+    async def dispatched():
+        start = time.perf_counter()
+        latencies = await run_dispatched(dispatcher, arrivals)
+        report("dispatched", latencies, time.perf_counter() - start, llm)
+
+    asyncio.run(dispatched())
+    dispatcher.close()
+
+
+if __name__ == "__main__":
+    main()
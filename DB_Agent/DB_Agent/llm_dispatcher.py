@@ -0,0 +1,109 @@
+import os
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_WINDOW_MS = float(os.getenv("LLM_DISPATCH_WINDOW_MS", "5"))
+MAX_GROUP_SIZE = int(os.getenv("LLM_DISPATCH_MAX_GROUP_SIZE", "16"))
+MAX_GROUPS_IN_FLIGHT = int(os.getenv("LLM_DISPATCH_MAX_GROUPS_IN_FLIGHT", "4"))
+
+
+class WindowedDispatcher:
+    """
+    Bounded concurrent dispatch for small LLM calls. Requests that arrive within
+    a few milliseconds of each other are grouped and handed to the model's
+    `abatch`, and at most `max_groups_in_flight` groups run at once, so no more
+    than `max_groups_in_flight * max_group_size` calls are outstanding.
+
+    This is not provider-side batching: `abatch` on the chat models (and on
+    RateLimitedLLM) issues one request per input concurrently, so the number of
+    provider requests is unchanged. What it buys is a cap on concurrency and a
+    single loop shared by every caller.
+
+    The dispatcher runs its own event loop on a daemon thread, so both sync graph
+    nodes (`invoke`, which LangGraph runs in worker threads) and async nodes
+    (`ainvoke`) from any loop can share one window.
+
+    Requests carry an optional priority lane; each flushed group is split per
+    lane and dispatched through `llm.with_priority(...)` when the model has it.
+
+    Dispatched calls run outside the caller's callback context, so they do not
+    emit per-token `on_chat_model_stream` events; use it for calls whose output
+    is not streamed to a UI.
+    """
+
+    def __init__(self, llm, window_ms: float = DISPATCH_WINDOW_MS, max_group_size: int = MAX_GROUP_SIZE, max_groups_in_flight: int = MAX_GROUPS_IN_FLIGHT):
+        self.llm = llm
+        self.window = window_ms / 1000
+        self.max_group_size = max_group_size
+        self.max_groups_in_flight = max_groups_in_flight
+        self.stats = {"requests": 0, "groups": 0}
+        self._pending = []
+        self._flush_handle = None
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._thread = threading.Thread(target=self._run_loop, name="llm-dispatcher", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.max_groups_in_flight)
+        self._loop.run_forever()
+
+    # --- Runs on the dispatcher loop ---
+
+    async def _submit(self, value, priority=None):
+        future = self._loop.create_future()
+        self._pending.append((value, priority, future))
+        self.stats["requests"] += 1
+        if len(self._pending) >= self.max_group_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        group, self._pending = self._pending, []
+        lanes = {}
+        for value, priority, future in group:
+            lanes.setdefault(priority, []).append((value, future))
+        for priority, lane in lanes.items():
+            self._loop.create_task(self._dispatch(lane, priority))
+
+    async def _dispatch(self, group, priority=None):
+        llm = self.llm
+        if priority and hasattr(llm, "with_priority"):
+            llm = llm.with_priority(priority)
+        async with self._semaphore:
+            self.stats["groups"] += 1
+            inputs = [value for value, _ in group]
+            try:
+                # One provider request per input; the semaphore is what bounds them
+                outputs = await llm.abatch(inputs, return_exceptions=True)
+            except Exception as e:
+                outputs = [e] * len(group)
+        for (_, future), output in zip(group, outputs):
+            if future.done():
+                continue
+            if isinstance(output, Exception):
+                future.set_exception(output)
+            else:
+                future.set_result(output)
+
+    # --- Public API (any thread / any loop) ---
+
+    def invoke(self, value, config=None, priority=None):
+        return asyncio.run_coroutine_threadsafe(self._submit(value, priority), self._loop).result()
+
+    async def ainvoke(self, value, config=None, priority=None):
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._submit(value, priority), self._loop))
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._flush)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
@@ -0,0 +1,61 @@
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+
+from langchain_core.messages import SystemMessage, HumanMessage
+
+logger = logging.getLogger(__name__)
+
+# Per-prompt usage totals: {name: {"calls", "input_tokens", "cached_tokens"}}
+usage_stats = defaultdict(lambda: {"calls": 0, "input_tokens": 0, "cached_tokens": 0})
+_stats_lock = threading.Lock()
+
+
+class StablePrompt:
+    """
+    Prompt split into a static prefix and a variable suffix.
+
+    The prefix (instructions, schema, system prompt) is rendered once into a
+    SystemMessage and reused byte-for-byte on every call, and the variable
+    parts (question, history, errors) always come after it. Provider-side
+    prompt caching matches on an identical prefix, so it can reuse the prefix
+    across calls and users.
+    """
+
+    def __init__(self, name: str, prefix: str, suffix: str = "{input}"):
+        self.name = name
+        self.prefix = prefix.strip()
+        self.suffix = suffix
+        self.system_message = SystemMessage(content=self.prefix)
+        self.prefix_hash = hashlib.sha256(self.prefix.encode("utf-8")).hexdigest()[:12]
+        logger.info(f"Prompt '{name}' prefix hash={self.prefix_hash} chars={len(self.prefix)}")
+
+    def messages(self, history=None, **variables) -> list:
+        """
+        [static system prefix] + optional history + variable suffix.
+        """
+        messages = [self.system_message]
+        if history:
+            messages.extend(history)
+        if self.suffix:
+            messages.append(HumanMessage(content=self.suffix.format(**variables).strip()))
+        return messages
+
+    def report(self, message) -> dict:
+        """
+        Logs and accumulates input / cached-token counts from a model response
+        (AIMessage or aggregated AIMessageChunk). Returns the per-call numbers.
+        """
+        usage = getattr(message, "usage_metadata", None) or {}
+        input_tokens = usage.get("input_tokens", 0)
+        cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0)
+        with _stats_lock:
+            stats = usage_stats[self.name]
+            stats["calls"] += 1
+            stats["input_tokens"] += input_tokens
+            stats["cached_tokens"] += cached_tokens
+        logger.info(
+            f"Prompt '{self.name}' prefix={self.prefix_hash} input_tokens={input_tokens} cached_tokens={cached_tokens}"
+        )
+        return {"prompt": self.name, "prefix_hash": self.prefix_hash, "input_tokens": input_tokens, "cached_tokens": cached_tokens}
@@ -0,0 +1,312 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes
+INTERACTIVE = "interactive"   # User-facing calls, e.g. streamed answers
+BACKGROUND = "background"     # Summaries / bookkeeping that can wait
+
+# Defaults; the client registry overrides them with LLM_RPM / LLM_TPM / LLM_MAX_CONCURRENCY
+# from get_settings() (values from the Azure deployment's quota page)
+DEFAULT_RPM = 60
+DEFAULT_TPM = 60000
+DEFAULT_MAX_CONCURRENCY = 16
+
+BACKGROUND_HEADROOM = 0.2     # Share of bucket capacity / concurrency kept free for interactive calls
+LATENCY_TARGET = 20.0         # Seconds; slower calls count as an overload signal
+COMPLETION_TOKEN_ESTIMATE = 512
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+POLL_INTERVAL = 0.01
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def estimate_tokens(value) -> int:
+    """
+    Rough prompt size in tokens (~4 characters per token) plus the expected completion.
+    """
+    if isinstance(value, str):
+        text = value
+    elif isinstance(value, (list, tuple)):
+        text = " ".join(str(getattr(m, "content", m)) for m in value)
+    else:
+        text = str(value)
+    return len(text) // 4 + COMPLETION_TOKEN_ESTIMATE
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` per second.
+    Not locked on its own; RateLimiter only touches it under its lock.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, floor: float = 0.0) -> float:
+        """
+        Seconds until `amount` can be taken while leaving at least `floor` tokens (0 = now).
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity - floor)
+        return max(0.0, (amount + floor - self.tokens) / self.rate)
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self):
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+
+class RateLimiter:
+    """
+    Client-side limiter shared by every call to one deployment:
+    - token buckets on requests/minute and estimated tokens/minute,
+    - AIMD adaptive concurrency: +1/limit per fast success, halved on 429s or slow calls,
+    - priority lanes: background calls keep BACKGROUND_HEADROOM free and yield to waiting interactive calls,
+    - jittered exponential backoff (honouring Retry-After) for retryable errors.
+    """
+
+    def __init__(self, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, min_concurrency: int = 1):
+        self.requests = TokenBucket(rpm / 60.0, max(1, rpm))
+        self.tokens = TokenBucket(tpm / 60.0, max(1, tpm))
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.interactive_waiting = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0}
+
+    # --- Admission ---
+
+    def _try_admit(self, priority: str, tokens: int) -> float:
+        background = priority == BACKGROUND
+        with self._lock:
+            allowed = self.limit * (1 - BACKGROUND_HEADROOM) if background else self.limit
+            if self.in_flight >= max(1, int(allowed)) or (background and self.interactive_waiting):
+                return POLL_INTERVAL
+            headroom = BACKGROUND_HEADROOM if background else 0.0
+            wait = max(
+                self.requests.wait_time(1, self.requests.capacity * headroom),
+                self.tokens.wait_time(tokens, self.tokens.capacity * headroom),
+            )
+            if wait:
+                return wait
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            return 0.0
+
+    def _waiting(self, priority: str, delta: int):
+        if priority == INTERACTIVE:
+            with self._lock:
+                self.interactive_waiting += delta
+
+    @contextmanager
+    def slot(self, priority: str = INTERACTIVE, tokens: int = COMPLETION_TOKEN_ESTIMATE):
+        self._waiting(priority, 1)
+        try:
+            while wait := self._try_admit(priority, tokens):
+                time.sleep(min(wait, 1.0))
+        finally:
+            self._waiting(priority, -1)
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._release(start, error=e)
+            raise
+        self._release(start)
+
+    @asynccontextmanager
+    async def aslot(self, priority: str = INTERACTIVE, tokens: int = COMPLETION_TOKEN_ESTIMATE):
+        self._waiting(priority, 1)
+        try:
+            while wait := self._try_admit(priority, tokens):
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            self._waiting(priority, -1)
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._release(start, error=e)
+            raise
+        self._release(start)
+
+    # --- AIMD feedback ---
+
+    def _release(self, start: float, error: BaseException | None = None):
+        latency = time.monotonic() - start
+        throttled = status_code(error) == 429
+        with self._lock:
+            self.in_flight -= 1
+            self.stats["calls"] += 1
+            now = time.monotonic()
+            if throttled or latency > LATENCY_TARGET:
+                # Multiplicative decrease, at most once per second to absorb a burst of 429s
+                if now - self._last_decrease > 1.0:
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                    self._last_decrease = now
+                if throttled:
+                    self.stats["throttled"] += 1
+            elif error is None:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            if throttled:
+                self.requests.drain()  # The server says we are over quota; pause new requests
+
+    # --- Retries ---
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, BACKOFF_BASE)
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))  # Full jitter
+
+    def call(self, fn, *args, priority: str = INTERACTIVE, tokens: int = COMPLETION_TOKEN_ESTIMATE, **kwargs):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                with self.slot(priority, tokens):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == MAX_RETRIES or not is_retryable(e):
+                    raise
+                self.stats["retries"] += 1
+                delay = self.backoff(attempt, e)
+                logger.warning(f"LLM call failed ({type(e).__name__}); retry {attempt + 1}/{MAX_RETRIES} in {delay:.2f}s")
+                time.sleep(delay)
+
+    async def acall(self, fn, *args, priority: str = INTERACTIVE, tokens: int = COMPLETION_TOKEN_ESTIMATE, **kwargs):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with self.aslot(priority, tokens):
+                    return await fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == MAX_RETRIES or not is_retryable(e):
+                    raise
+                self.stats["retries"] += 1
+                delay = self.backoff(attempt, e)
+                logger.warning(f"LLM call failed ({type(e).__name__}); retry {attempt + 1}/{MAX_RETRIES} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+
+def status_code(error: BaseException | None):
+    if error is None:
+        return None
+    code = getattr(error, "status_code", None)
+    if code is None and getattr(error, "response", None) is not None:
+        code = getattr(error.response, "status_code", None)
+    return code
+
+
+def retry_after_seconds(error: BaseException):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in ("retry-after-ms", "retry-after"):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except ValueError:
+            continue
+        return seconds / 1000 if header.endswith("-ms") else seconds
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    if status_code(error) in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in {"APITimeoutError", "APIConnectionError", "TimeoutException", "ConnectError"}
+
+
+class RateLimitedLLM:
+    """
+    Wraps a LangChain chat model (or structured-output runnable) so every call
+    goes through a shared RateLimiter. Calls pass the config through unchanged,
+    so LangGraph streaming events still reach the caller.
+    """
+
+    def __init__(self, llm, limiter: RateLimiter, priority: str = INTERACTIVE):
+        self.llm = llm
+        self.limiter = limiter
+        self.priority = priority
+
+    def with_priority(self, priority: str):
+        return RateLimitedLLM(self.llm, self.limiter, priority)
+
+    def with_structured_output(self, *args, **kwargs):
+        return RateLimitedLLM(self.llm.with_structured_output(*args, **kwargs), self.limiter, self.priority)
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.limiter.call(self.llm.invoke, input, config, priority=self.priority, tokens=estimate_tokens(input), **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.limiter.acall(self.llm.ainvoke, input, config, priority=self.priority, tokens=estimate_tokens(input), **kwargs)
+
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        outputs = []
+        for i in inputs:
+            try:
+                outputs.append(self.invoke(i, config, **kwargs))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                outputs.append(e)
+        return outputs
+
+    async def abatch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        # Concurrency is bounded by the limiter's adaptive slots
+        return await asyncio.gather(*(self.ainvoke(i, config, **kwargs) for i in inputs), return_exceptions=return_exceptions)
+
+    def stream(self, input, config=None, **kwargs):
+        tokens = estimate_tokens(input)
+        for attempt in range(MAX_RETRIES + 1):
+            started = False
+            try:
+                with self.limiter.slot(self.priority, tokens):
+                    for chunk in self.llm.stream(input, config, **kwargs):
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                # Only retry if nothing reached the caller yet
+                if started or attempt == MAX_RETRIES or not is_retryable(e):
+                    raise
+                self.limiter.stats["retries"] += 1
+                time.sleep(self.limiter.backoff(attempt, e))
+
+    async def astream(self, input, config=None, **kwargs):
+        tokens = estimate_tokens(input)
+        for attempt in range(MAX_RETRIES + 1):
+            started = False
+            try:
+                async with self.limiter.aslot(self.priority, tokens):
+                    async for chunk in self.llm.astream(input, config, **kwargs):
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                if started or attempt == MAX_RETRIES or not is_retryable(e):
+                    raise
+                self.limiter.stats["retries"] += 1
+                await asyncio.sleep(self.limiter.backoff(attempt, e))
+
+    def __getattr__(self, name):
+        # Anything else (bind_tools, model_name, ...) goes to the wrapped model
+        return getattr(self.llm, name)
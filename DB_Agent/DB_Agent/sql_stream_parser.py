@@ -0,0 +1,91 @@
+import json
+import sqlite3
+
+# Appended to the SQL prompt prefix when the model streams plain JSON instead of
+# going through the provider's function-calling path.
+JSON_OUTPUT_INSTRUCTIONS = """
+Respond with JSON only, no prose and no code fences, in exactly this shape:
+{"query": ["<first SQL statement>", "<second SQL statement>"]}
+Put each SQL statement in its own string and order them so each one can run as soon as it is written.
+"""
+
+
+class QueryStreamParser:
+    """
+    Incremental parser for `{"query": ["...", "..."]}` streamed token by token.
+
+    `feed()` returns the statements whose closing quote has just arrived, so the
+    caller can validate and run the first statement while the model is still
+    writing the rest. Leading prose or ```json fences are skipped. A string
+    that is not valid JSON (e.g. a bad escape) raises ValueError.
+    """
+
+    def __init__(self, key: str = "query"):
+        self.key = f'"{key}"'
+        self.buffer = ""
+        self.pos = 0
+        self.state = "seek_key"   # seek_key -> seek_array -> in_array <-> in_string -> done
+        self.item_start = 0
+        self.escaped = False
+
+    def feed(self, text: str) -> list[str]:
+        self.buffer += text
+        items = []
+        while self.pos < len(self.buffer) and self.state != "done":
+            if self.state == "seek_key":
+                index = self.buffer.find(self.key, self.pos)
+                if index < 0:
+                    # Keep enough of the tail to match a key split across chunks
+                    self.pos = max(self.pos, len(self.buffer) - len(self.key))
+                    break
+                self.pos = index + len(self.key)
+                self.state = "seek_array"
+            elif self.state == "seek_array":
+                char = self.buffer[self.pos]
+                self.pos += 1
+                if char == "[":
+                    self.state = "in_array"
+            elif self.state == "in_array":
+                char = self.buffer[self.pos]
+                self.pos += 1
+                if char == '"':
+                    self.state = "in_string"
+                    self.item_start = self.pos
+                    self.escaped = False
+                elif char == "]":
+                    self.state = "done"
+            elif self.state == "in_string":
+                char = self.buffer[self.pos]
+                self.pos += 1
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    raw = self.buffer[self.item_start:self.pos - 1]
+                    self.state = "in_array"
+                    try:
+                        # strict=False: models often put raw newlines in multi-line SQL
+                        items.append(json.loads(f'"{raw}"', strict=False))
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"Malformed SQL string in plan: {e.msg}") from e
+        return items
+
+    @property
+    def done(self) -> bool:
+        return self.state == "done"
+
+
+def validate_statement(query: str) -> str:
+    """
+    Cheap syntactic check before a statement is sent to the database.
+    Returns the normalised statement or raises ValueError.
+    """
+    statement = query.strip()
+    if not statement:
+        raise ValueError("Empty SQL statement.")
+    if not statement.endswith(";"):
+        statement += ";"
+    if not sqlite3.complete_statement(statement):
+        raise ValueError(f"Incomplete SQL statement: {query}")
+    return statement
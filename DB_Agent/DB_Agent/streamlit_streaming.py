@@ -0,0 +1,81 @@
+# Chat rendering and token streaming shared by the agents' Streamlit UIs.
+#
+# The agent graph runs on one background event loop per server process; the
+# script thread drains its tokens from a queue and redraws the reply at most
+# once per RENDER_INTERVAL.
+import asyncio
+import queue
+import threading
+import time
+
+import streamlit as st
+
+RENDER_INTERVAL = 0.05      # Seconds between UI updates while a response streams
+RENDER_EVERY_TOKENS = 20    # ...or after this many tokens, whichever comes first
+
+
+# One event loop for the whole server process, kept alive across reruns and sessions
+@st.cache_resource
+def background_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-ui-loop", daemon=True).start()
+    return loop
+
+
+def render_message(role: str, content: str) -> str:
+    if role == "user":
+        return f'<div class="user-message-container"><div class="user-message">{content}</div></div>'
+    return f'<div class="bot-message-container"><div class="bot-message">{content}</div></div>'
+
+
+def init_history():
+    if "conversation_history" not in st.session_state:
+        st.session_state.conversation_history = []
+    if "history_html" not in st.session_state:
+        st.session_state.history_html = "".join(
+            render_message(msg["role"], msg["content"]) for msg in st.session_state.conversation_history
+        )
+
+
+def add_to_history(role: str, content: str):
+    st.session_state.conversation_history.append({"role": role, "content": content})
+    # Each message is rendered to HTML once; reruns draw the whole history as one element
+    st.session_state.history_html += render_message(role, content)
+
+
+def stream_response(produce) -> str:
+    """
+    Runs `produce(tokens)` on the background loop and draws the tokens it puts on
+    the queue (None ends the stream), coalescing them into at most one update per
+    RENDER_INTERVAL. If a rerun or stop abandons the script mid-stream, the graph
+    run is cancelled instead of being left to finish on the loop.
+    """
+    tokens = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(produce(tokens), background_loop())
+    try:
+        response_placeholder = st.empty()
+        parts = []
+        pending = 0
+        last_render = time.monotonic()
+        while True:
+            try:
+                token = tokens.get(timeout=RENDER_INTERVAL)
+            except queue.Empty:
+                token = ""
+            if token is None:
+                break
+            if token:
+                parts.append(token)
+                pending += 1
+            if pending and (pending >= RENDER_EVERY_TOKENS or time.monotonic() - last_render >= RENDER_INTERVAL):
+                response_placeholder.markdown(render_message("assistant", "".join(parts)), unsafe_allow_html=True)
+                pending = 0
+                last_render = time.monotonic()
+
+        future.result()  # Re-raise errors from the graph run
+    finally:
+        if not future.done():
+            future.cancel()
+    bot_response = "".join(parts)
+    response_placeholder.markdown(render_message("assistant", bot_response), unsafe_allow_html=True)
+    return bot_response
@@ -0,0 +1,134 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+MAX_TENANTS = int(os.getenv("MAX_WARM_TENANTS", "32"))
+TENANT_IDLE_SECONDS = float(os.getenv("TENANT_IDLE_SECONDS", "900"))
+
+
+class TenantRegistry:
+    """
+    Bounded LRU of warm per-tenant entries (adapter, schema, prompt).
+
+    `load(tenant_id)` builds an entry on first use; concurrent first requests
+    for the same tenant share one load. Entries beyond `max_tenants` are
+    evicted least-recently-used first, and entries idle for longer than
+    `idle_seconds` are evicted by a background sweep. Evicted entries are
+    closed with their `close()` method, if they have one.
+    """
+
+    def __init__(self, load, max_tenants: int = MAX_TENANTS, idle_seconds: float = TENANT_IDLE_SECONDS):
+        self._load = load
+        self.max_tenants = max_tenants
+        self.idle_seconds = idle_seconds
+        self._entries = OrderedDict()   # tenant_id -> [entry, last_used]
+        self._loading = {}              # tenant_id -> Lock held while the entry is built
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.cold_starts_ms = deque(maxlen=256)
+        self._stop = threading.Event()
+        if idle_seconds:
+            threading.Thread(target=self._sweep_loop, name="tenant-sweeper", daemon=True).start()
+
+    def _touch(self, tenant_id):
+        item = self._entries.get(tenant_id)
+        if item is None:
+            return None
+        item[1] = time.monotonic()
+        self._entries.move_to_end(tenant_id)
+        self.stats["hits"] += 1
+        return item[0]
+
+    def get(self, tenant_id: str):
+        with self._lock:
+            entry = self._touch(tenant_id)
+            if entry is not None:
+                return entry
+            load_lock = self._loading.setdefault(tenant_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._touch(tenant_id)
+                if entry is not None:
+                    return entry
+            start = time.perf_counter()
+            try:
+                entry = self._load(tenant_id)
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(tenant_id, None)
+                raise
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            # Publish the entry and retire the load lock together, so no request
+            # can find neither and load the tenant a second time
+            with self._lock:
+                self._loading.pop(tenant_id, None)
+                self._entries[tenant_id] = [entry, time.monotonic()]
+                self.stats["misses"] += 1
+                self.cold_starts_ms.append(elapsed_ms)
+                evicted = self._evict_locked()
+
+        logger.info(f"Tenant '{tenant_id}' loaded in {elapsed_ms:.1f} ms ({len(self._entries)} warm).")
+        self._close(evicted)
+        return entry
+
+    def _evict_locked(self, idle_only: bool = False) -> list:
+        evicted = []
+        if self.idle_seconds:
+            cutoff = time.monotonic() - self.idle_seconds
+            for tenant_id, (entry, last_used) in list(self._entries.items()):
+                if last_used >= cutoff:
+                    break  # OrderedDict is in LRU order
+                evicted.append((tenant_id, self._entries.pop(tenant_id)[0]))
+        while not idle_only and len(self._entries) > self.max_tenants:
+            tenant_id, (entry, _) = self._entries.popitem(last=False)
+            evicted.append((tenant_id, entry))
+        self.stats["evictions"] += len(evicted)
+        return evicted
+
+    def _close(self, evicted):
+        for tenant_id, entry in evicted:
+            logger.info(f"Evicting tenant '{tenant_id}'.")
+            close = getattr(entry, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception as e:
+                    logger.warning(f"Failed to close tenant '{tenant_id}': {e}")
+
+    def sweep(self):
+        """
+        Evicts entries that have been idle for longer than `idle_seconds`.
+        """
+        with self._lock:
+            evicted = self._evict_locked(idle_only=True)
+        self._close(evicted)
+
+    def _sweep_loop(self):
+        interval = max(1.0, self.idle_seconds / 4)
+        while not self._stop.wait(interval):
+            self.sweep()
+
+    def invalidate(self, tenant_id: str):
+        """
+        Drops a tenant so its next request reloads it (e.g. after a schema change).
+        """
+        with self._lock:
+            item = self._entries.pop(tenant_id, None)
+        if item is not None:
+            self._close([(tenant_id, item[0])])
+
+    def warm(self) -> list:
+        with self._lock:
+            return list(self._entries)
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            evicted = [(tenant_id, item[0]) for tenant_id, item in self._entries.items()]
+            self._entries.clear()
+        self._close(evicted)
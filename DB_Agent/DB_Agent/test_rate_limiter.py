@@ -0,0 +1,161 @@
+# Standalone checks for rate_limiter.py against a local mock Azure OpenAI server.
+# The server enforces a requests-per-second quota and answers 429 + Retry-After
+# when it is exceeded, like an Azure deployment over its RPM limit.
+#
+# Usage: python test_rate_limiter.py
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_openai import AzureChatOpenAI
+from rate_limiter import RateLimiter, RateLimitedLLM, INTERACTIVE, BACKGROUND
+
+test_counter = 0
+passed = 0
+failed = 0
+
+
+def run_test(description, func):
+    global test_counter, passed, failed
+    test_counter += 1
+    try:
+        result = func()
+        if not result:
+            raise AssertionError(f"Failed: {description}")
+        print(f"Test {test_counter} PASS: {description}")
+        passed += 1
+    except AssertionError as e:
+        print(f"Test {test_counter} FAIL: {description} - {e}")
+        failed += 1
+
+
+class MockAzureOpenAI(BaseHTTPRequestHandler):
+    quota_per_second = 10
+    latency = 0.05
+    lock = threading.Lock()
+    window = []
+    in_flight = 0
+    max_in_flight = 0
+    throttled = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        cls = type(self)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        now = time.monotonic()
+        with cls.lock:
+            cls.window = [t for t in cls.window if now - t < 1.0]
+            over_quota = len(cls.window) >= cls.quota_per_second
+            if over_quota:
+                cls.throttled += 1
+            else:
+                cls.window.append(now)
+                cls.in_flight += 1
+                cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        if over_quota:
+            payload = json.dumps({"error": {"code": "429", "message": "Rate limit exceeded"}}).encode()
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+        else:
+            time.sleep(cls.latency)
+            with cls.lock:
+                cls.in_flight -= 1
+            prompt = body["messages"][-1]["content"]
+            payload = json.dumps({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "gpt-4o-mini",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": f"echo: {prompt}"}}],
+                "usage": {"prompt_tokens": 5, "completion_tokens": 5, "total_tokens": 10},
+            }).encode()
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.window, cls.in_flight, cls.max_in_flight, cls.throttled = [], 0, 0, 0
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockAzureOpenAI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_llm(server):
+    return AzureChatOpenAI(
+        deployment_name="mock",
+        azure_endpoint=f"http://127.0.0.1:{server.server_port}",
+        api_key="test-key",
+        api_version="2024-06-01",
+        max_retries=0,
+    )
+
+
+async def burst(llm, n, priority=INTERACTIVE):
+    target = llm.with_priority(priority) if isinstance(llm, RateLimitedLLM) else llm
+    return await asyncio.gather(*(target.ainvoke(f"q{i}") for i in range(n)), return_exceptions=True)
+
+
+def main():
+    server = start_server()
+    raw = make_llm(server)
+
+    # Baseline: an unthrottled burst over the quota produces a 429 storm
+    MockAzureOpenAI.reset()
+    results = asyncio.run(burst(raw, 30))
+    run_test("Unlimited burst hits 429s", lambda: sum(isinstance(r, Exception) for r in results) > 0)
+
+    # Limiter below the quota: every call succeeds without any 429
+    MockAzureOpenAI.reset()
+    limited = RateLimitedLLM(raw, RateLimiter(rpm=420, tpm=10_000_000, max_concurrency=8))
+    limited.limiter.requests.tokens = 2  # Start with a small burst allowance
+    results = asyncio.run(burst(limited, 30))
+    run_test("Limited burst succeeds", lambda: all(getattr(r, "content", "").startswith("echo") for r in results))
+    run_test("Limited burst sees no 429s", lambda: MockAzureOpenAI.throttled == 0)
+    run_test("Concurrency capped", lambda: MockAzureOpenAI.max_in_flight <= 8)
+
+    # Limiter above the quota: 429s are retried with backoff and shrink the concurrency limit
+    MockAzureOpenAI.reset()
+    eager = RateLimitedLLM(raw, RateLimiter(rpm=100_000, tpm=100_000_000, max_concurrency=32))
+    results = asyncio.run(burst(eager, 30))
+    run_test("429s are retried until success", lambda: all(getattr(r, "content", "").startswith("echo") for r in results))
+    run_test("AIMD decreases the limit after 429s", lambda: eager.limiter.stats["throttled"] > 0 and eager.limiter.limit < 32)
+
+    # Priority lanes: interactive calls overtake queued background calls
+    MockAzureOpenAI.reset()
+    shared = RateLimitedLLM(raw, RateLimiter(rpm=100_000, tpm=100_000_000, max_concurrency=2))
+    finished = []
+
+    async def tracked(priority, i):
+        await shared.with_priority(priority).ainvoke(f"{priority}{i}")
+        finished.append(priority)
+
+    async def mixed():
+        background = [asyncio.create_task(tracked(BACKGROUND, i)) for i in range(8)]
+        await asyncio.sleep(0.02)
+        interactive = [asyncio.create_task(tracked(INTERACTIVE, i)) for i in range(4)]
+        await asyncio.gather(*background, *interactive)
+
+    asyncio.run(mixed())
+    run_test("Interactive lane finishes ahead of background", lambda: finished.index(INTERACTIVE) < 4 and finished[-1] == BACKGROUND)
+
+    # Sync path works the same way
+    MockAzureOpenAI.reset()
+    run_test("Sync invoke through limiter", lambda: limited.invoke("hello").content == "echo: hello")
+
+    server.shutdown()
+    print(f"\nExecuted {test_counter} tests: {passed} passed, {failed} failed.")
+
+
+if __name__ == "__main__":
+    main()
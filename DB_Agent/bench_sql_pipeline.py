@@ -0,0 +1,100 @@
+# Benchmark for the pipelined SQL mode in DB_Agent.py: end-to-end latency of
+# multi-statement plans, generate-then-execute vs. execute-while-generating.
+#
+# The fake LLM streams the JSON plan a few characters at a time with a fixed
+# per-chunk delay, and the fake adapter sleeps a fixed time per statement.
+#
+# Usage (from this folder, DB_Agent/DB_Agent on PYTHONPATH):
+#   python bench_sql_pipeline.py --statements 1 2 3 5 --chunk-ms 15 --query-ms 150
+import json
+import time
+import logging
+import asyncio
+import argparse
+
+from langchain_core.messages import AIMessageChunk
+
+from DB_Agent import ModularDBAgent
+
+
+class StreamingFakeLLM:
+    def __init__(self, text: str, chunk_chars: int = 4, chunk_delay: float = 0.015):
+        self.text = text
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+
+    def _chunks(self):
+        for i in range(0, len(self.text), self.chunk_chars):
+            yield AIMessageChunk(content=self.text[i:i + self.chunk_chars])
+
+    def stream(self, messages, config=None):
+        for chunk in self._chunks():
+            time.sleep(self.chunk_delay)
+            yield chunk
+
+    async def astream(self, messages, config=None):
+        for chunk in self._chunks():
+            await asyncio.sleep(self.chunk_delay)
+            yield chunk
+
+
+class SlowAdapter:
+    def __init__(self, query_delay: float = 0.15):
+        self.query_delay = query_delay
+
+    def get_schema_metadata(self):
+        columns = [("OrderID", "INTEGER"), ("CustomerID", "TEXT"), ("OrderDate", "TEXT")]
+        return {"Orders": {
+            "columns": [{"name": name, "type": kind, "nullable": True} for name, kind in columns],
+            "foreign_keys": [],
+            "primary_key": ["OrderID"],
+        }}
+
+    def execute_query(self, query):
+        time.sleep(self.query_delay)
+        return [(1,)]
+
+
+def make_plan(n: int) -> str:
+    statements = [f"SELECT COUNT(*) FROM Orders WHERE OrderDate LIKE '199{i % 10}-%' AND CustomerID IS NOT NULL" for i in range(n)]
+    return json.dumps({"query": statements})
+
+
+def run_sequential(agent, state):
+    start = time.perf_counter()
+    agent.execute_sql_query(agent.generate_sql_query(dict(state)))
+    return time.perf_counter() - start
+
+
+def run_pipelined(agent, state):
+    start = time.perf_counter()
+    result = asyncio.run(agent.generate_and_execute_sql(dict(state)))
+    elapsed = time.perf_counter() - start
+    assert result["error"] is None, result["error"]
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statements", type=int, nargs="+", default=[1, 2, 3, 5])
+    parser.add_argument("--chunk-ms", type=float, default=15)
+    parser.add_argument("--query-ms", type=float, default=150)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"{'stmts':>6}{'sequential ms':>16}{'pipelined ms':>15}{'saved':>8}")
+    for n in args.statements:
+        llm = StreamingFakeLLM(make_plan(n), chunk_delay=args.chunk_ms / 1000)
+        db = SlowAdapter(args.query_ms / 1000)
+        sequential = ModularDBAgent(db=db, llm=llm, sql_output_mode="json_stream")
+        pipelined = ModularDBAgent(db=db, llm=llm, pipelined=True)
+        state = {"intent": "Order counts per year", "error": None}
+
+        seq = min(run_sequential(sequential, state) for _ in range(args.repeat))
+        pipe = min(run_pipelined(pipelined, state) for _ in range(args.repeat))
+        print(f"{n:>6}{seq * 1000:>16.0f}{pipe * 1000:>15.0f}{(1 - pipe / seq) * 100:>7.0f}%")
+
+
+if __name__ == "__main__":
+    main()
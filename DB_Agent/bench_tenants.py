@@ -0,0 +1,85 @@
+# Benchmark for multi-tenant routing in DB_Agent.py: cold-start latency of a
+# new tenant (engine + schema reflection + SQL prompt), warm lookup latency,
+# and memory held per warm tenant.
+#
+# Creates throwaway SQLite databases in a temp folder; no LLM calls are made.
+#
+# Usage (from this folder, DB_Agent/DB_Agent on PYTHONPATH):
+#   python bench_tenants.py --tenants 200 --tables 20 --max-warm 64
+import os
+import time
+import logging
+import sqlite3
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+from DB_Agent import ModularDBAgent, SQLiteAdapter
+
+
+def create_tenant_db(path: str, tables: int):
+    connection = sqlite3.connect(path)
+    for t in range(tables):
+        connection.execute(
+            f"CREATE TABLE table_{t} (id INTEGER PRIMARY KEY, name TEXT NOT NULL, amount REAL, "
+            f"created_at TEXT, parent_id INTEGER REFERENCES table_{max(t - 1, 0)}(id))"
+        )
+    connection.commit()
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--tables", type=int, default=20)
+    parser.add_argument("--max-warm", type=int, default=64)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    folder = tempfile.mkdtemp(prefix="tenants_")
+    tenant_ids = [f"tenant_{i}" for i in range(args.tenants)]
+    for tenant_id in tenant_ids:
+        create_tenant_db(os.path.join(folder, f"{tenant_id}.db"), args.tables)
+
+    def resolve(tenant_id):
+        return SQLiteAdapter(f"sqlite:///{os.path.join(folder, tenant_id)}.db")
+
+    agent = ModularDBAgent(resolve_db=resolve, max_tenants=args.max_warm, tenant_idle_seconds=0, llm=object())
+    graph = agent.compile_graph()  # Compiled once, shared by every tenant
+
+    def config(tenant_id):
+        return {"configurable": {"tenant_id": tenant_id}}
+
+    # Memory per warm tenant, measured while the registry is below its bound
+    warm_count = min(args.max_warm, args.tenants)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for tenant_id in tenant_ids[:warm_count]:
+        agent.tenant(config(tenant_id))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    per_tenant_kb = sum(stat.size_diff for stat in after.compare_to(before, "filename")) / warm_count / 1024
+
+    for tenant_id in tenant_ids[warm_count:]:
+        agent.tenant(config(tenant_id))
+    cold = list(agent.tenants.cold_starts_ms)
+
+    warm_ids = agent.tenants.warm()
+    start = time.perf_counter()
+    for _ in range(20):
+        for tenant_id in warm_ids:
+            agent.tenant(config(tenant_id))
+    warm_us = (time.perf_counter() - start) / (20 * len(warm_ids)) * 1e6
+
+    ordered = sorted(cold)
+    print(f"tenants={args.tenants} tables/tenant={args.tables} max warm={args.max_warm} graph nodes={len(graph.get_graph().nodes)}")
+    print(f"cold start ms   p50={statistics.median(ordered):.2f} p95={ordered[int(len(ordered) * 0.95) - 1]:.2f} max={ordered[-1]:.2f}")
+    print(f"warm lookup us  mean={warm_us:.2f}")
+    print(f"memory/tenant   {per_tenant_kb:.1f} KiB")
+    print(f"registry        {agent.tenants.stats} warm={len(warm_ids)}")
+    agent.tenants.close()
+
+
+if __name__ == "__main__":
+    main()
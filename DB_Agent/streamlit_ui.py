@@ -1,9 +1,18 @@
 # streamlit_db_agent.py
 
+import sys
+import queue
+from pathlib import Path
 import streamlit as st
-import asyncio
-from DB_Agent import graph  # Your compiled ModularDBAgent.graph
-from langchain_core.messages import HumanMessage, AIMessage
+
+# The shared LLM plumbing and UI helpers live in DB_Agent/DB_Agent
+SHARED_DIR = str(Path(__file__).resolve().parent / "DB_Agent")
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
+from DB_Agent import graph, tenant_config, DEFAULT_TENANT  # Your compiled ModularDBAgent.graph
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
+from streamlit_streaming import render_message, init_history, add_to_history, stream_response
 
 st.set_page_config(page_title="Database Assistant")
 
@@ -49,30 +58,19 @@ st.markdown("""
 st.title("📊 Database Assistant")
 
 # 🌱 Session state for chat history
-if "conversation_history" not in st.session_state:
-    st.session_state.conversation_history = []
+init_history()
 
 chat_container = st.container()
 
 # 🖼️ Render previous conversation
 with chat_container:
-    for msg in st.session_state.conversation_history:
-        if msg["role"] == "user":
-            st.markdown(
-                f'<div class="user-message-container"><div class="user-message">{msg["content"]}</div></div>',
-                unsafe_allow_html=True,
-            )
-        elif msg["role"] == "assistant":
-            st.markdown(
-                f'<div class="bot-message-container"><div class="bot-message">{msg["content"]}</div></div>',
-                unsafe_allow_html=True,
-            )
-
-# 📤 Streaming function for DBAgent
-async def run_db_agent_stream(user_message: str):
-    from langchain_core.messages import AIMessageChunk
-
-    config = {"configurable": {"thread_id": "db_agent_thread"}}
+    if st.session_state.history_html:
+        st.markdown(st.session_state.history_html, unsafe_allow_html=True)
+
+# 📤 Streaming function for DBAgent (runs on the background loop, hands tokens to the script thread)
+async def run_db_agent_stream(user_message: str, tenant_id: str, tokens: queue.Queue):
+    # ?tenant=<id> in the URL picks the database; the graph is shared by all tenants
+    config = tenant_config(tenant_id, "db_agent_thread")
     initial_state = {
         "messages": [HumanMessage(content=user_message)],
         "result": [],
@@ -81,48 +79,32 @@ async def run_db_agent_stream(user_message: str):
         "intent": user_message,
     }
 
-    bot_response = ""
-    response_placeholder = st.empty()
-    bot_response = ""
-    async for event in graph.astream_events(initial_state, config=config, version="v2", stream_mode="updates"):
-        if event["event"] == "on_chain_stream" and event["metadata"].get("langgraph_node") == "validate_and_generate_result":
-            chunk_data = event["data"].get("chunk", {})
-            if chunk_data.get("event") == "on_custom_stream":
-                token = chunk_data["data"]["chunk"].content
-                bot_response += token
-                print('-------------------on_chain_stream-----------------------',token)
-                response_placeholder.markdown(
-                f'<div class="bot-message-container"><div class="bot-message">{bot_response}</div></div>',
-                unsafe_allow_html=True,
-            )
-
-        elif event["event"] == "on_chat_model_stream" and event["metadata"].get("langgraph_node") == "validate_and_generate_result":
-            data = event["data"]
-            token = data["chunk"].content if hasattr(data["chunk"], "content") else str(data["chunk"])
-            bot_response += token
-            print('-----------------------on_chat_model_stream-------------------------',token)
-            response_placeholder.markdown(
-                f'<div class="bot-message-container"><div class="bot-message">{bot_response}</div></div>',
-                unsafe_allow_html=True,
-            )
-
-    return bot_response
+    try:
+        async for event in graph.astream_events(initial_state, config=config, version="v2", stream_mode="updates"):
+            if event["event"] == "on_chain_stream" and event["metadata"].get("langgraph_node") == "validate_and_generate_result":
+                chunk_data = event["data"].get("chunk", {})
+                if isinstance(chunk_data, dict) and chunk_data.get("event") == "on_custom_stream":
+                    tokens.put(chunk_data["data"]["chunk"].content)
+
+            elif event["event"] == "on_chat_model_stream" and event["metadata"].get("langgraph_node") == "validate_and_generate_result":
+                data = event["data"]
+                tokens.put(data["chunk"].content if hasattr(data["chunk"], "content") else str(data["chunk"]))
+    finally:
+        tokens.put(None)
+
 
 # 🧠 Main chat handler
 def chat_with_db_agent():
     user_input = st.chat_input("Ask a database question, like 'How many customers are there?'")
     if user_input:
-        st.session_state.conversation_history.append({"role": "user", "content": user_input})
+        add_to_history("user", user_input)
 
         with chat_container:
-            st.markdown(
-                f'<div class="user-message-container"><div class="user-message">{user_input}</div></div>',
-                unsafe_allow_html=True,
-            )
-
-        response = asyncio.run(run_db_agent_stream(user_input))
+            st.markdown(render_message("user", user_input), unsafe_allow_html=True)
+            tenant_id = st.query_params.get("tenant", DEFAULT_TENANT)
+            response = stream_response(lambda tokens: run_db_agent_stream(user_input, tenant_id, tokens))
 
-        st.session_state.conversation_history.append({"role": "assistant", "content": response})
+        add_to_history("assistant", response)
 
 # 🚀 Launch it
 chat_with_db_agent()
@@ -0,0 +1,288 @@
+# agent_service.py
+# HTTP front end for the LangGraph agents (DB agent and research agent).
+#
+# One uvicorn process = one long-lived event loop shared by every request; each
+# run streams tokens to the client as Server-Sent Events through a bounded
+# buffer, and can be cancelled by disconnecting or via DELETE /agents/runs/{id}.
+#
+# Run from the repo root:
+#   uvicorn agent_service:app --app-dir FastAPI --port 8001
+import os
+import sys
+import json
+import uuid
+import asyncio
+import logging
+import importlib
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import FastAPI, HTTPException, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from langchain_core.messages import HumanMessage
+
+# The agents are flat script folders; the shared LLM plumbing lives in DB_Agent/DB_Agent
+ROOT = Path(__file__).resolve().parent.parent
+for folder in ("DB_Agent/DB_Agent", "DB_Agent", "Research_Agent"):
+    path = str(ROOT / folder)
+    if path not in sys.path:
+        sys.path.append(path)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STREAM_BUFFER = int(os.getenv("AGENT_STREAM_BUFFER", "64"))              # Events buffered per run
+SLOW_CLIENT_TIMEOUT = float(os.getenv("AGENT_SLOW_CLIENT_TIMEOUT", "30"))  # Seconds a full buffer may block the run
+HEARTBEAT_SECONDS = float(os.getenv("AGENT_HEARTBEAT_SECONDS", "15"))
+MAX_ACTIVE_RUNS = int(os.getenv("AGENT_MAX_RUNS", "512"))
+NODE_THREADS = int(os.getenv("AGENT_NODE_THREADS", "64"))  # Sync graph nodes (LLM invoke, DB queries) run here
+
+app = FastAPI(
+    title="Agent Service",
+    description="Streams the DB and research agent graphs over Server-Sent Events.",
+    version="1.0.0"
+)
+
+
+class ChatRequest(BaseModel):
+    message: str
+    thread_id: str = "default"
+    tenant_id: str | None = None  # DB agent only
+
+
+# -----------------------------------
+# Agents
+# -----------------------------------
+# Each agent module is imported on first use (off the event loop) and exposes a compiled `graph`.
+
+def db_input(request: ChatRequest):
+    return {"messages": [HumanMessage(content=request.message)], "result": [], "error": "", "retries": 0, "intent": request.message}
+
+
+def db_config(module, request: ChatRequest):
+    return module.tenant_config(request.tenant_id or module.DEFAULT_TENANT, request.thread_id)
+
+
+def db_token(event):
+    if event["metadata"].get("langgraph_node") != "validate_and_generate_result":
+        return None
+    if event["event"] == "on_chat_model_stream":
+        return event["data"]["chunk"].content
+    if event["event"] == "on_chain_stream":
+        chunk = event["data"].get("chunk", {})
+        if isinstance(chunk, dict) and chunk.get("event") == "on_custom_stream":
+            return chunk["data"]["chunk"].content
+    return None
+
+
+def research_input(request: ChatRequest):
+    return {
+        "messages": [HumanMessage(content=request.message)],
+        "research_needed": False,
+        "wikipedia_results": [],
+        "tavily_results": [],
+        "local_results": [],
+        "live_search_needed": False,
+        "final_response": ""
+    }
+
+
+def research_config(module, request: ChatRequest):
+    return {"configurable": {"thread_id": request.thread_id}}
+
+
+def research_token(event):
+    if event["event"] == "on_chat_model_stream" and event["metadata"].get("langgraph_node") == "generate_response":
+        return event["data"]["chunk"].content
+    return None
+
+
+AGENTS = {
+    "db": {"module": "DB_Agent", "input": db_input, "config": db_config, "token": db_token},
+    "research": {"module": "research_Agent", "input": research_input, "config": research_config, "token": research_token},
+}
+_modules = {}
+_import_lock = asyncio.Lock()
+
+
+async def load_agent(name: str):
+    if name not in _modules:
+        async with _import_lock:
+            if name not in _modules:
+                _modules[name] = await asyncio.to_thread(importlib.import_module, AGENTS[name]["module"])
+    return _modules[name]
+
+
+# -----------------------------------
+# Runs
+# -----------------------------------
+
+class SlowClient(Exception):
+    pass
+
+
+class AgentRun:
+    """
+    One streamed graph run. The graph task is the producer; the SSE response is
+    the consumer. The bounded queue between them applies backpressure: when a
+    client stops reading, the graph blocks on `put` and is cancelled after
+    SLOW_CLIENT_TIMEOUT.
+    """
+
+    def __init__(self, agent: str, thread_key: str):
+        self.id = uuid.uuid4().hex
+        self.agent = agent
+        self.thread_key = thread_key
+        self.queue = asyncio.Queue(maxsize=STREAM_BUFFER)
+        self.cancel_event = threading.Event()  # Seen by node threads (interrupts SQLite work)
+        self.task = None
+
+    async def put(self, event: str, data: dict):
+        try:
+            await asyncio.wait_for(self.queue.put((event, data)), SLOW_CLIENT_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise SlowClient(f"Client did not read for {SLOW_CLIENT_TIMEOUT:.0f}s")
+
+    def finished(self, task):
+        if task.cancelled():
+            try:
+                self.queue.put_nowait(("cancelled", {}))
+            except asyncio.QueueFull:
+                pass  # The consumer notices the finished task on its next heartbeat
+
+    def cancel(self):
+        self.cancel_event.set()
+        if self.task is not None:
+            self.task.cancel()
+
+
+runs: dict[str, AgentRun] = {}
+active_threads: set[str] = set()
+
+
+async def produce(run: AgentRun, module, spec, request: ChatRequest):
+    # Copied into every node thread, so cancelling the run also stops DB work
+    cancelled_var = getattr(module, "run_cancelled", None)
+    if cancelled_var is not None:
+        cancelled_var.set(run.cancel_event)
+    config = spec["config"](module, request)
+    response = ""
+    try:
+        async for event in module.graph.astream_events(spec["input"](request), config, version="v2"):
+            token = spec["token"](event)
+            if token:
+                response += token
+                await run.put("token", {"text": token})
+        if not response:
+            # Nothing was token-streamed (e.g. micro-batched calls): send the final message
+            snapshot = await module.graph.aget_state(config)
+            messages = snapshot.values.get("messages") or []
+            response = getattr(messages[-1], "content", "") if messages else ""
+        await run.put("done", {"response": response})
+    except asyncio.CancelledError:
+        run.cancel_event.set()
+        raise
+    except SlowClient as e:
+        run.cancel_event.set()
+        logger.warning(f"Run {run.id} aborted: {e}")
+    except Exception as e:
+        logger.exception(f"Run {run.id} failed")
+        try:
+            run.queue.put_nowait(("error", {"detail": f"{type(e).__name__}: {e}"}))
+        except asyncio.QueueFull:
+            pass
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def consume(run: AgentRun):
+    try:
+        yield sse("run", {"run_id": run.id})
+        pending = None
+        while True:
+            if pending is not None:
+                (event, data), pending = pending, None
+            else:
+                try:
+                    event, data = await asyncio.wait_for(run.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if run.task.done() and run.queue.empty():
+                        break
+                    yield ": ping\n\n"  # Keeps proxies from closing an idle stream
+                    continue
+            if event == "token":
+                # Coalesce whatever has piled up, so slow clients get fewer, larger writes
+                text = [data["text"]]
+                while not run.queue.empty():
+                    item = run.queue.get_nowait()
+                    if item[0] != "token":
+                        pending = item
+                        break
+                    text.append(item[1]["text"])
+                data = {"text": "".join(text)}
+            yield sse(event, data)
+            if event in ("done", "error", "cancelled"):
+                break
+    finally:
+        # Client disconnected, run finished or failed: stop any work still in flight
+        run.cancel()
+        runs.pop(run.id, None)
+        active_threads.discard(run.thread_key)
+
+
+@app.post("/agents/{agent}/stream", summary="Stream an agent run (SSE)", tags=["Agents"])
+async def stream_agent(agent: str, request: ChatRequest):
+    """
+    Runs the agent graph for one message and streams `run`, `token`, then one of
+    `done`, `error` or `cancelled`. Disconnecting cancels the run.
+    """
+    if agent not in AGENTS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown agent '{agent}'")
+    if len(runs) >= MAX_ACTIVE_RUNS:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many active runs")
+    thread_key = f"{agent}:{request.tenant_id or ''}:{request.thread_id}"
+    if thread_key in active_threads:
+        # Two concurrent runs on one checkpointer thread would interleave its history
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A run is already active for this thread")
+
+    module = await load_agent(agent)
+    run = AgentRun(agent, thread_key)
+    runs[run.id] = run
+    active_threads.add(thread_key)
+    run.task = asyncio.create_task(produce(run, module, AGENTS[agent], request))
+    run.task.add_done_callback(run.finished)
+    return StreamingResponse(
+        consume(run),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Run-ID": run.id},
+    )
+
+
+@app.delete("/agents/runs/{run_id}", summary="Cancel a run", tags=["Agents"])
+async def cancel_run(run_id: str):
+    run = runs.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Run not found")
+    run.cancel()
+    return {"cancelled": run_id}
+
+
+@app.get("/agents/runs", summary="Active runs", tags=["Agents"])
+async def list_runs():
+    return {"active": len(runs), "runs": [{"run_id": r.id, "agent": r.agent} for r in runs.values()]}
+
+
+@app.on_event("startup")
+async def startup_event():
+    # LangGraph runs sync nodes in the loop's default executor; the stock pool is sized by CPU count
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=NODE_THREADS, thread_name_prefix="agent-node"))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for run in list(runs.values()):
+        run.cancel()
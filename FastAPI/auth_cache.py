@@ -0,0 +1,114 @@
+# auth_cache.py
+# Cache of verified principals for bearer-token auth. A token that has been
+# verified once (signature, expiry, user lookup) maps to the user's id,
+# username and role until the earlier of PRINCIPAL_CACHE_TTL and the token's
+# own `exp`, so repeat requests skip both the JWT decode and the database.
+# Entries are LRU-capped and dropped explicitly when a user changes or is
+# deleted; in multi-worker deployments the TTL bounds how long another
+# worker can keep serving the old role. A lookup that started before an
+# invalidation of its user is not cached (see `generation`).
+import os
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))           # Seconds; 0 disables the cache
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))        # Tokens kept
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    username: str
+    role: str
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_entries: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # token -> (Principal, expiry as epoch seconds)
+        self._tokens = {}               # user id -> set of cached tokens
+        self._generation = 0            # Bumped by every invalidate_user
+        self._invalidated = OrderedDict()   # user id -> generation of its last invalidation, oldest first
+        self._floor = 0                 # Highest generation pruned from _invalidated
+        self._lock = threading.Lock()   # Sync endpoints resolve dependencies in worker threads
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+
+    def get(self, token: str) -> Principal | None:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            principal, expires = entry
+            if expires <= time.time():
+                self._remove(token)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(token)
+            self.stats["hits"] += 1
+            return principal
+
+    def generation(self) -> int:
+        """
+        Invalidation counter; read it before loading a user and pass it to `put`.
+        """
+        with self._lock:
+            return self._generation
+
+    def put(self, token: str, principal: Principal, token_exp: float | None, generation: int | None = None):
+        """
+        Caches a principal for a verified token; `token_exp` is the token's `exp` claim.
+        With `generation` (from `generation()` before the user was read), the
+        principal is not cached if its user was invalidated since, as the read
+        may have seen the old row.
+        """
+        if self.ttl <= 0:
+            return
+        expires = time.time() + self.ttl
+        if token_exp is not None:
+            expires = min(expires, token_exp)
+        with self._lock:
+            if generation is not None and max(self._floor, self._invalidated.get(principal.id, 0)) > generation:
+                return
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (principal, expires)
+            self._tokens.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evicted"] += 1
+
+    def invalidate_user(self, user_id: int):
+        """
+        Forgets every cached token of a user (role change, deletion, password reset).
+        """
+        with self._lock:
+            self._generation += 1
+            self._invalidated.pop(user_id, None)
+            self._invalidated[user_id] = self._generation
+            while len(self._invalidated) > self.max_entries:
+                _, pruned = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, pruned)
+            for token in self._tokens.pop(user_id, ()):
+                self._entries.pop(token, None)
+                self.stats["invalidated"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens.clear()
+
+    def _remove(self, token: str):
+        principal, _ = self._entries.pop(token)
+        tokens = self._tokens.get(principal.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens[principal.id]
+
+    def __len__(self):
+        return len(self._entries)
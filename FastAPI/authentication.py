@@ -11,11 +11,13 @@
 # HMAC for message authentication (currently unused, can be removed later if not needed)
 from hmac import new
 # FastAPI core classes and HTTP utilities
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
 # OAuth2 helpers for password flow and dependency injection
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+# Runs blocking token verification off the event loop
+from fastapi.concurrency import run_in_threadpool
 # SQLAlchemy ORM and types for database models and relationships
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
+from sqlalchemy import create_engine, event, Column, Integer, String, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Session
 # Pydantic for request/response schema definitions and validations
@@ -28,10 +30,18 @@ from passlib.context import CryptContext  # type: ignore
 from jose import JWTError, jwt  # type: ignore
 # Standard library for handling token expiry timestamps
 import datetime
+# Fast JSON responses: orjson/msgspec encoding and direct Pydantic serialization
+import fast_json
+# Keyset pagination, field projection and count estimates for list endpoints
+import pagination
+# Full-text search index over documents (SQLite FTS5 by default)
+import search
+# Verified-principal cache so repeat requests skip the JWT decode and the user lookup
+from auth_cache import Principal, PrincipalCache
 
 # --- Application & Database Setup ---
-# Create FastAPI application instance
-app = FastAPI()
+# Create FastAPI application instance (FAST_JSON=1 switches the default response class to orjson/msgspec)
+app = FastAPI(**fast_json.app_options())
 
 # Use SQLite for demonstration; switch to PostgreSQL/MySQL in production
 DATABASE_URL = "sqlite:///./test.db"
@@ -54,6 +64,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # OAuth2 scheme for extracting bearer tokens from requests
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
+# token -> Principal for tokens verified in the last PRINCIPAL_CACHE_TTL seconds (auth_cache.py)
+principal_cache = PrincipalCache()
 
 # --- ORM Models ---
 class User(Base):
@@ -73,9 +85,17 @@ class Document(Base):
     content = Column(String)                            # Document body
     owner_id = Column(Integer, ForeignKey("users.id"))  # FK reference to owning user
     owner = relationship("User", back_populates="documents")  # ORM relationship
+    # Serves `WHERE owner_id = ? AND id > ? ORDER BY id` pages as one index range read
+    __table_args__ = (Index("ix_documents_owner_id_id", "owner_id", "id"),)
 
 # Create database tables based on defined models
 Base.metadata.create_all(bind=engine)
+# create_all skips indexes on tables that already exist
+for index in Document.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+# Search index, kept current by the backend on every document insert/update/delete
+search_index = search.get_backend(engine)
+search_index.setup()
 
 # --- Pydantic Schemas ---
 class UserCreate(BaseModel):
@@ -109,6 +129,16 @@ class DocumentOut(BaseModel):
     class Config:
         from_attributes = True  # Enable ORM compatibility for response serialization
 
+class DocumentListItem(BaseModel):
+    # GET /documents item; fields left out by `fields=` are absent
+    id: int
+    title: Optional[str] = None
+    content: Optional[str] = None
+    owner_id: Optional[int] = None
+
+DOCUMENT_FIELDS = list(DocumentOut.model_fields)
+document_counts = pagination.CountEstimator()
+
 # --- Utility Functions & Dependencies ---
 
 def get_db():
@@ -146,10 +176,9 @@ def create_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def load_principal(token: str) -> Principal:
     """
-    Dependency that decodes the JWT token, validates it, and retrieves
-    the corresponding user from the database.
+    Verifies the JWT token and looks up its user in the database.
     Raises HTTPException if token is invalid or user does not exist.
     """
     credentials_exception = HTTPException(
@@ -164,10 +193,27 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise credentials_exception
-    return user
+    # Taken before the read: if the user is invalidated meanwhile, this row may be stale
+    generation = principal_cache.generation()
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.username == username).first()
+        if not user:
+            raise credentials_exception
+        principal = Principal(id=user.id, username=user.username, role=user.role)
+    principal_cache.put(token, principal, payload.get("exp"), generation)
+    return principal
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    """
+    Dependency returning the verified principal (id, username, role) for the bearer token.
+    Tokens seen recently are answered from principal_cache without decoding the JWT or
+    opening a database session; the rest are verified in a worker thread.
+    """
+    principal = principal_cache.get(token)
+    if principal is None:
+        principal = await run_in_threadpool(load_principal, token)
+    return principal
 
 
 def role_required(roles: List[str]):
@@ -175,13 +221,33 @@ def role_required(roles: List[str]):
     Factory function returning a dependency that ensures the current user
     has one of the allowed roles; raises HTTPException if not.
     """
-    def checker(current_user: User = Depends(get_current_user)):
+    # async: a role check needs no worker thread
+    async def checker(current_user: Principal = Depends(get_current_user)):
         if current_user.role not in roles:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                                 detail="Forbidden: insufficient role")
         return current_user
     return checker
 
+
+@event.listens_for(SessionLocal, "after_flush")
+def collect_changed_users(session, flush_context):
+    # Users updated or deleted in this transaction; their cached principals go once it commits.
+    # Bulk query.update()/delete() bypass the session and are only bounded by the cache TTL.
+    changed = session.info.setdefault("changed_user_ids", set())
+    changed.update(obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User) and obj.id is not None)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def invalidate_changed_users(session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        principal_cache.invalidate_user(user_id)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def discard_changed_users(session):
+    session.info.pop("changed_user_ids", None)
+
 # --- API Routes ---
 
 @app.post("/register", response_model=Token)
@@ -213,21 +279,96 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 @app.post("/documents", response_model=DocumentOut)
 # Create a new document; only users with 'admin' or 'editor' roles allowed.
-def create_doc(doc: DocumentCreate, db: Session = Depends(get_db), current_user: User = Depends(role_required(["admin", "editor"]))):
+def create_doc(doc: DocumentCreate, db: Session = Depends(get_db), current_user: Principal = Depends(role_required(["admin", "editor"]))):
     new_doc = Document(title=doc.title, content=doc.content, owner_id=current_user.id)
     db.add(new_doc)
     db.commit()
+    document_counts.invalidate(Document)
     db.refresh(new_doc)
     return new_doc
 
-@app.get("/documents", response_model=List[DocumentOut])
-# Retrieve all documents; permitted for 'admin', 'editor', and 'user' roles.
-def read_all_docs(db: Session = Depends(get_db), current_user: User = Depends(role_required(["admin", "editor", "user"]))):
-    return db.query(Document).all()
+@app.get("/documents", response_model=List[DocumentListItem], response_model_exclude_unset=True)
+# List documents one page at a time, ordered by id; permitted for 'admin', 'editor', and 'user' roles.
+# The next page is `?cursor=` from the X-Next-Cursor header (also in Link: rel="next"),
+# `fields=id,title` leaves out the rest, and X-Total-Count holds an exact or estimated total.
+def read_all_docs(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma-separated: " + ",".join(DOCUMENT_FIELDS)),
+    owner_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(role_required(["admin", "editor", "user"])),
+):
+    filters = [Document.owner_id == owner_id] if owner_id is not None else []
+    items, next_id = pagination.keyset_page(
+        db, Document, pagination.parse_fields(fields, DOCUMENT_FIELDS), pagination.decode_cursor(cursor), limit, filters
+    )
+    total, exact = document_counts.count(db, Document, filters, cache_key=owner_id)
+    response.headers["X-Total-Count"] = str(total)
+    response.headers["X-Total-Count-Exact"] = "true" if exact else "false"
+    if next_id is not None:
+        next_cursor = pagination.encode_cursor(next_id)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    # Rows are plain dicts of the selected columns; response_model validates them, and
+    # exclude_unset keeps the columns left out by `fields=` absent
+    return items
+
+class SearchResult(BaseModel):
+    id: int
+    title: Optional[str]
+    owner_id: Optional[int]
+    score: float                     # BM25 relevance; higher is better
+    title_highlight: Optional[str]   # HTML-escaped, matches wrapped in <mark>
+    snippet: Optional[str]           # Best-matching fragment of the content, same markup
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int
+    total_exact: bool                # False when total is only a lower bound
+    next_offset: Optional[int]
+    results: List[SearchResult]
+
+def search_owner_filter(user: Principal, scope: str, owner_id: Optional[int]):
+    """
+    Applies the caller's role to a search: returns (owner_id to restrict to or None, allowed).
+    'all' is every readable document, 'mine' the caller's own, and 'editable' what
+    the caller may update (everything for admins, their own for editors, nothing for users).
+    """
+    if scope == "mine" or (scope == "editable" and user.role == "editor"):
+        return user.id, owner_id in (None, user.id)
+    if scope == "editable" and user.role != "admin":
+        return None, False
+    return owner_id, True
+
+@app.get("/documents/search", response_model=SearchResponse)
+# Full-text search over titles and content, best matches first; permitted for 'admin', 'editor', and 'user' roles.
+def search_docs(
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=search.MAX_RESULTS),
+    scope: Literal["all", "mine", "editable"] = "all",
+    owner_id: Optional[int] = None,
+    current_user: Principal = Depends(role_required(["admin", "editor", "user"])),
+):
+    restrict_to, allowed = search_owner_filter(current_user, scope, owner_id)
+    page = search_index.search(q, limit, offset, restrict_to) if allowed else search.SearchPage([], 0, True)
+    end = offset + len(page.results)
+    next_offset = end if page.results and end < min(page.total, search.MAX_RESULTS) else None
+    return {
+        "query": q, "total": page.total, "total_exact": page.total_exact, "next_offset": next_offset, "results": page.results,
+    }
+
+@app.get("/auth/cache")
+# Principal cache hit/miss counters; 'admin' only.
+def principal_cache_stats(current_user: Principal = Depends(role_required(["admin"]))):
+    return {**principal_cache.stats, "size": len(principal_cache), "ttl": principal_cache.ttl}
 
 @app.put("/documents/{doc_id}", response_model=DocumentOut)
 # Update an existing document; only 'admin' or the document owner can perform this.
-def update_doc(doc_id: int, doc: DocumentCreate, db: Session = Depends(get_db), current_user: User = Depends(role_required(["admin", "editor"]))):
+def update_doc(doc_id: int, doc: DocumentCreate, db: Session = Depends(get_db), current_user: Principal = Depends(role_required(["admin", "editor"]))):
     existing_doc = db.query(Document).filter(Document.id == doc_id).first()
     if not existing_doc:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -241,12 +382,13 @@ def update_doc(doc_id: int, doc: DocumentCreate, db: Session = Depends(get_db),
 
 @app.delete("/documents/{doc_id}")
 # Delete a document; restricted to 'admin' users.
-def delete_doc(doc_id: int, db: Session = Depends(get_db), current_user: User = Depends(role_required(["admin"]))):
+def delete_doc(doc_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(role_required(["admin"]))):
     doc = db.query(Document).filter(Document.id == doc_id).first()
     if not doc:
         raise HTTPException(status_code=404, detail="Not found")
     db.delete(doc)
     db.commit()
+    document_counts.invalidate(Document)
     return {"detail": "Deleted"}
 
 
@@ -0,0 +1,161 @@
+# bench_auth_cache.py
+# Cost of authentication per request in authentication.py: database queries,
+# transactions and latency (p50 / p99 under concurrency) for the previous
+# get_current_user (kept here as /whoami_legacy), the new dependency with the
+# principal cache disabled, and with it enabled. GET /documents is measured
+# the same way as a real endpoint.
+#
+# Runs against a temporary ./test.db; the app is called directly through ASGI.
+#
+# Usage: python bench_auth_cache.py --requests 5000 --concurrency 32 --users 1000
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_auth_cache_")
+os.chdir(WORKDIR)  # authentication.py opens ./test.db
+
+from fastapi import Depends, HTTPException, status
+from jose import JWTError, jwt
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import authentication
+from authentication import app, User, Document, Principal, get_db, oauth2_scheme, role_required
+
+counters = {"queries": 0, "transactions": 0}
+event.listen(authentication.engine, "before_cursor_execute", lambda *args: counters.__setitem__("queries", counters["queries"] + 1))
+event.listen(authentication.SessionLocal, "after_begin", lambda *args: counters.__setitem__("transactions", counters["transactions"] + 1))
+
+
+def legacy_get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    # The previous implementation
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    try:
+        payload = jwt.decode(token, authentication.SECRET_KEY, algorithms=[authentication.ALGORITHM])
+        username = payload.get("sub")
+        if username is None:
+            raise credentials_exception
+    except JWTError:
+        raise credentials_exception
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise credentials_exception
+    return user
+
+
+def legacy_role_required(roles):
+    def checker(current_user: User = Depends(legacy_get_current_user)):
+        if current_user.role not in roles:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden: insufficient role")
+        return current_user
+    return checker
+
+
+@app.get("/whoami_legacy")
+def whoami_legacy(current_user: User = Depends(legacy_role_required(["admin", "editor", "user"]))):
+    return {"id": current_user.id, "role": current_user.role}
+
+
+@app.get("/whoami")
+def whoami(current_user: Principal = Depends(role_required(["admin", "editor", "user"]))):
+    return {"id": current_user.id, "role": current_user.role}
+
+
+async def call(path: str, token: str):
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    response = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+
+    await app(scope, receive, send)
+    assert response["status"] == 200, response
+
+
+async def run(path: str, tokens: list, requests: int, concurrency: int):
+    rng = random.Random(requests)  # Warm-up and measured runs draw different sequences
+    picks = [rng.choice(tokens) for _ in range(requests)]
+    samples = []
+    queue = iter(picks)
+
+    async def worker():
+        for token in queue:
+            start = time.perf_counter_ns()
+            await call(path, token)
+            samples.append(time.perf_counter_ns() - start)
+
+    counters.update(queries=0, transactions=0)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    return {
+        "req/s": requests / elapsed,
+        "p50": statistics.median(samples) / 1e6,
+        "p99": samples[int(len(samples) * 0.99)] / 1e6,
+        "queries": counters["queries"] / requests,
+        "transactions": counters["transactions"] / requests,
+    }
+
+
+async def main_async(args):
+    db = authentication.SessionLocal()
+    roles = ["admin", "editor", "user"]
+    for i in range(args.users):
+        db.add(User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="-", role=roles[i % 3]))
+    db.commit()
+    db.add_all(Document(title=f"Document {i}", content="Lorem ipsum " * 30, owner_id=1 + i % args.users) for i in range(2000))
+    db.commit()
+    db.close()
+    tokens = [authentication.create_token({"sub": f"user{i}"}) for i in range(args.users)]
+    ttl = authentication.principal_cache.ttl
+
+    cases = [
+        ("legacy dependency", "/whoami_legacy", 0),
+        ("new, cache disabled", "/whoami", 0),
+        ("new, cache enabled", "/whoami", ttl),
+        ("GET /documents, cache disabled", "/documents?limit=20", 0),
+        ("GET /documents, cache enabled", "/documents?limit=20", ttl),
+    ]
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {args.users} distinct tokens\n")
+    print(f"{'case':<32}{'req/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'queries/req':>13}{'txns/req':>10}{'hit rate':>10}")
+    for label, path, case_ttl in cases:
+        authentication.principal_cache.ttl = case_ttl
+        authentication.principal_cache.clear()
+        await run(path, tokens, 3 * len(tokens), args.concurrency)  # Warm up; the cache sees most tokens once
+        before = dict(authentication.principal_cache.stats)
+        result = await run(path, tokens, args.requests, args.concurrency)
+        stats = authentication.principal_cache.stats
+        lookups = (stats["hits"] - before["hits"]) + (stats["misses"] - before["misses"])
+        hit_rate = f"{(stats['hits'] - before['hits']) / lookups:.1%}" if lookups and "legacy" not in label else "-"
+        print(f"{label:<32}{result['req/s']:>8.0f}{result['p50']:>9.2f}{result['p99']:>9.2f}"
+              f"{result['queries']:>13.2f}{result['transactions']:>10.2f}{hit_rate:>10}")
+    authentication.principal_cache.ttl = ttl
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# bench_documents.py
+# Latency of GET /documents (authentication.py) as the documents table grows:
+# first page, a page deep into the table via its cursor, an owner-filtered
+# page and a `fields=id,title` page, against the previous endpoint (every row
+# with full content, kept here as /documents_legacy) while it stays feasible.
+#
+# Runs against a temporary ./test.db; the app is called directly through ASGI.
+#
+# Usage: python bench_documents.py --sizes 10000,100000,1000000 --requests 200
+import os
+import time
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+import statistics
+from typing import List
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_documents_")
+os.chdir(WORKDIR)  # authentication.py opens ./test.db
+
+from fastapi import Depends
+from sqlalchemy.orm import Session
+
+import authentication
+import pagination
+from authentication import app, Document, DocumentOut, User, get_db, role_required
+
+OWNERS = 100
+
+
+@app.get("/documents_legacy", response_model=List[DocumentOut])
+def read_all_docs_legacy(db: Session = Depends(get_db), current_user: User = Depends(role_required(["admin", "editor", "user"]))):
+    # The previous implementation
+    return db.query(Document).all()
+
+
+async def call(path: str, token: str) -> tuple[int, dict]:
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    response = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        else:
+            response["bytes"] = response.get("bytes", 0) + len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    assert response["status"] == 200, (path, response)
+    return response["bytes"], response["headers"]
+
+
+async def measure(path: str, token: str, requests: int):
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter_ns()
+        size, _ = await call(path, token)
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    return statistics.median(samples) / 1e6, samples[int(len(samples) * 0.99)] / 1e6, size
+
+
+def grow(target: int, content: str):
+    conn = sqlite3.connect("test.db")
+    current = conn.execute("SELECT count(*) FROM documents").fetchone()[0]
+    batch = 50000
+    for start in range(current, target, batch):
+        conn.executemany(
+            "INSERT INTO documents (title, content, owner_id) VALUES (?, ?, ?)",
+            ((f"Document {i}", content, 1 + i % OWNERS) for i in range(start, min(start + batch, target))),
+        )
+        conn.commit()
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+async def main_async(args):
+    db = authentication.SessionLocal()
+    for i in range(1, OWNERS + 1):
+        db.add(User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="-", role="user"))
+    db.commit()
+    db.close()
+    token = authentication.create_token({"sub": "user1"})
+    content = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 8)[:args.content_bytes]
+
+    print(f"{'rows':>9}  {'request':<34}{'p50 ms':>9}{'p99 ms':>9}{'bytes':>12}")
+    for size in args.sizes:
+        grow(size, content)
+        authentication.document_counts.invalidate()
+        deep_cursor = pagination.encode_cursor(int(size * 0.9))
+        cases = [
+            ("first page", "/documents"),
+            ("page at 90% (cursor)", f"/documents?cursor={deep_cursor}"),
+            ("owner_id filter, page at 90%", f"/documents?owner_id=7&cursor={deep_cursor}"),
+            ("fields=id,title, limit=1000", "/documents?fields=id,title&limit=1000"),
+        ]
+        if size <= args.legacy_max:
+            cases.append(("legacy: all rows", "/documents_legacy"))
+        for label, path in cases:
+            requests = max(args.requests // 20, 3) if "legacy" in label else args.requests
+            await call(path, token)  # Warm up
+            p50, p99, body = await measure(path, token, requests)
+            print(f"{size:>9,}  {label:<34}{p50:>9.2f}{p99:>9.2f}{body:>12,}")
+        _, headers = await call("/documents", token)
+        print(f"{'':>11}X-Total-Count {headers['x-total-count']} (exact: {headers['x-total-count-exact']})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--content-bytes", type=int, default=400)
+    parser.add_argument("--legacy-max", type=int, default=100_000, help="Largest table the legacy endpoint is run against")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# bench_json.py
+# Throughput and latency of the JSON response paths in fast_json.py against
+# FastAPI's defaults, for a small object and a list of documents (the shape of
+# GET /documents). Each app is called directly through ASGI (no sockets), so
+# the numbers are framework + serialization only.
+#
+#   dict                     return a dict (jsonable_encoder + json.dumps)
+#   dict, FastJSONResponse   the same route with response_class=FastJSONResponse (FAST_JSON=1)
+#   FastJSONResponse(...)    the endpoint returns FastJSONResponse directly (orjson only)
+#   response_model           return ORM objects with response_model (validate + FastAPI's serializer)
+#   older FastAPI path       validate, dump to dicts, jsonable_encoder + json.dumps
+#   model_response(...)      fast_json.model_response (validate + pydantic-core dump_json)
+#
+# Usage: python bench_json.py --requests 2000 --documents 1000
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+import fast_json
+from fast_json import FastJSONResponse, model_response
+
+
+class DocumentOut(BaseModel):
+    id: int
+    title: str
+    content: str
+    owner_id: int
+
+
+class Row:
+    # Stands in for a SQLAlchemy Document; response models read it via from_attributes
+    def __init__(self, id, title, content, owner_id):
+        self.id, self.title, self.content, self.owner_id = id, title, content, owner_id
+
+
+def build_app(rows: list, small_row: Row) -> FastAPI:
+    app = FastAPI()
+    dicts = [vars(row) for row in rows]
+    small = vars(small_row)
+    adapter = TypeAdapter(List[DocumentOut])
+
+    @app.get("/dict/small")
+    def dict_small():
+        return small
+
+    @app.get("/dict/large")
+    def dict_large():
+        return dicts
+
+    @app.get("/fast-class/small", response_class=FastJSONResponse)
+    def fast_class_small():
+        return small
+
+    @app.get("/fast-class/large", response_class=FastJSONResponse)
+    def fast_class_large():
+        return dicts
+
+    @app.get("/fast-direct/small")
+    def fast_direct_small():
+        return FastJSONResponse(small)
+
+    @app.get("/fast-direct/large")
+    def fast_direct_large():
+        return FastJSONResponse(dicts)
+
+    @app.get("/model/small", response_model=DocumentOut)
+    def model_small():
+        return small_row
+
+    @app.get("/model/large", response_model=List[DocumentOut])
+    def model_large():
+        return rows
+
+    @app.get("/older/small")
+    def older_small():
+        return JSONResponse(jsonable_encoder(DocumentOut.model_validate(small_row, from_attributes=True).model_dump()))
+
+    @app.get("/older/large")
+    def older_large():
+        return JSONResponse(jsonable_encoder(adapter.dump_python(adapter.validate_python(rows, from_attributes=True))))
+
+    @app.get("/model-response/small", response_model=DocumentOut)
+    def model_response_small():
+        return model_response(DocumentOut, small_row)
+
+    @app.get("/model-response/large", response_model=List[DocumentOut])
+    def model_response_large():
+        return model_response(List[DocumentOut], rows)
+
+    return app
+
+
+VARIANTS = [
+    ("dict", "/dict"),
+    ("dict, FastJSONResponse", "/fast-class"),
+    ("FastJSONResponse(...)", "/fast-direct"),
+    ("response_model", "/model"),
+    ("older FastAPI path", "/older"),
+    ("model_response(...)", "/model-response"),
+]
+
+
+async def call(app, path: str) -> bytes:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    body = bytearray()
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.extend(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return bytes(body)
+
+
+async def measure(app, path: str, requests: int) -> list:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter_ns()
+        await call(app, path)
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+async def main_async(args):
+    content = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 8)[:args.content_bytes]
+    rows = [Row(i, f"Document {i}", content, i % 50) for i in range(1, args.documents + 1)]
+    app = build_app(rows, Row(1, "Document 1", "Hello", 1))
+    print(f"JSON backend: {fast_json.BACKEND}")
+
+    for size, requests in (("small", args.requests * 10), ("large", args.requests)):
+        expected = json.loads(await call(app, f"/dict/{size}"))
+        for label, prefix in VARIANTS:  # Warm up, and check every path returns the same JSON
+            assert json.loads(await call(app, f"{prefix}/{size}")) == expected, label
+            await measure(app, f"{prefix}/{size}", 50)
+        results = {prefix: [] for _, prefix in VARIANTS}
+        for _ in range(args.rounds):  # Interleaved so drift affects every variant alike
+            for _, prefix in VARIANTS:
+                results[prefix] += await measure(app, f"{prefix}/{size}", requests // args.rounds)
+
+        body_bytes = len(await call(app, f"/model-response/{size}"))
+        print(f"\n{size} payload ({body_bytes:,} bytes)")
+        print(f"{'path':<25}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}")
+        for label, prefix in VARIANTS:
+            ordered = sorted(results[prefix])
+            print(f"{label:<25}{1e9 / statistics.mean(ordered):>9.0f}{statistics.median(ordered) / 1e6:>9.3f}"
+                  f"{ordered[int(len(ordered) * 0.99)] / 1e6:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per variant for the large payload (10x for small)")
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--content-bytes", type=int, default=400)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
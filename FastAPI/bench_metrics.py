@@ -0,0 +1,85 @@
+# bench_metrics.py
+# Per-request overhead of MetricsMiddleware (metrics.py) against no middleware
+# and the previous @app.middleware("http") add_process_time, calling each app
+# directly through ASGI (no sockets) so only framework and middleware cost is
+# measured.
+#
+# Usage: python bench_metrics.py --requests 20000
+import time
+import asyncio
+import argparse
+import statistics
+
+from fastapi import FastAPI, Request
+
+from metrics import Metrics, MetricsMiddleware
+
+
+def build(kind: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        return {"item_id": item_id}
+
+    if kind == "http middleware":
+        @app.middleware("http")
+        async def add_process_time(request: Request, call_next):
+            # The previous implementation
+            start = time.time()
+            response = await call_next(request)
+            response.headers["X-Process-Time"] = str(time.time() - start)
+            return response
+    elif kind == "metrics (ASGI)":
+        app.add_middleware(MetricsMiddleware, metrics=Metrics())
+    return app
+
+
+async def run(app, requests: int) -> list:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/items/1", "raw_path": b"/items/1", "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter_ns()
+        await app(dict(scope), receive, send)
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+async def main_async(args):
+    kinds = ["none", "http middleware", "metrics (ASGI)"]
+    apps = {kind: build(kind) for kind in kinds}
+    for app in apps.values():
+        await run(app, 500)  # Warm up (builds the middleware stack)
+    results = {kind: [] for kind in kinds}
+    for _ in range(args.rounds):  # Interleave rounds so drift hits every variant alike
+        for kind in kinds:
+            results[kind] += await run(apps[kind], args.requests // args.rounds)
+    base = statistics.median(results["none"])
+    print(f"{'middleware':<17}{'p50 us':>8}{'p99 us':>8}{'overhead us':>13}")
+    for kind in kinds:
+        ordered = sorted(results[kind])
+        p50 = statistics.median(ordered)
+        print(f"{kind:<17}{p50 / 1000:>8.1f}{ordered[int(len(ordered) * 0.99)] / 1000:>8.1f}{(p50 - base) / 1000:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
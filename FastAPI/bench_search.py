@@ -0,0 +1,168 @@
+# bench_search.py
+# GET /documents/search (authentication.py + search.py) on a synthetic corpus:
+# documents are drawn from a Zipf-distributed vocabulary, so queries range
+# from rare terms to near-stopwords. Reports incremental indexing throughput
+# (rows inserted through the index triggers), a full rebuild, and search
+# latency per query type, with a LIKE scan of the documents table (the only
+# option before) as the baseline.
+#
+# Runs against a temporary ./test.db; the app is called directly through ASGI.
+#
+# Usage: python bench_search.py --documents 1000000 --requests 100
+import os
+import json
+import time
+import random
+import string
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+import statistics
+import itertools
+from urllib.parse import urlencode
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_search_")
+os.chdir(WORKDIR)  # authentication.py opens ./test.db
+
+import authentication
+from authentication import app, User
+
+OWNERS = 100
+VOCABULARY = 20000
+
+
+def make_vocabulary(rng: random.Random) -> list[str]:
+    words = set()
+    while len(words) < VOCABULARY:
+        words.add("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))))
+    return sorted(words, key=lambda w: rng.random())
+
+
+def generate(rng, vocabulary, cum_weights, count: int, start: int, content_words: int):
+    for i in range(start, start + count):
+        title = " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=5))
+        content = " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=content_words))
+        yield title.capitalize(), content, 1 + i % OWNERS
+
+
+async def call(path: str, token: str) -> dict:
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    response = {"body": b""}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        else:
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    assert response["status"] == 200, response
+    return response
+
+
+async def measure(path: str, token: str, requests: int):
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter_ns()
+        response = await call(path, token)
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    return statistics.median(samples) / 1e6, samples[int(len(samples) * 0.99)] / 1e6, response
+
+
+def like_scan(term: str, runs: int = 3):
+    # Counting the matches needs the whole table, as ranking them would
+    conn = sqlite3.connect("test.db")
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter_ns()
+        conn.execute("SELECT count(*) FROM documents WHERE title LIKE ? OR content LIKE ?", (f"%{term}%", f"%{term}%")).fetchone()
+        samples.append(time.perf_counter_ns() - start)
+    conn.close()
+    return statistics.median(samples) / 1e6, max(samples) / 1e6
+
+
+async def main_async(args):
+    rng = random.Random(7)
+    vocabulary = make_vocabulary(rng)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY)))
+
+    db = authentication.SessionLocal()
+    for i in range(1, OWNERS + 1):
+        db.add(User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="-", role="editor"))
+    db.commit()
+    db.close()
+    token = authentication.create_token({"sub": "user1"})
+
+    # Incremental: every insert goes through the FTS5 triggers
+    conn = sqlite3.connect("test.db")
+    batch = 20000
+    start = time.perf_counter()
+    for offset in range(0, args.documents, batch):
+        count = min(batch, args.documents - offset)
+        conn.executemany("INSERT INTO documents (title, content, owner_id) VALUES (?, ?, ?)",
+                         generate(rng, vocabulary, cum_weights, count, offset, args.content_words))
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {args.documents:,} documents with incremental indexing in {elapsed:.1f}s "
+          f"({args.documents / elapsed:,.0f} docs/s, including text generation)")
+
+    start = time.perf_counter()
+    conn.execute("UPDATE documents SET content = content || ' edited' WHERE id % 1000 = 0")
+    conn.commit()
+    updated = args.documents // 1000
+    print(f"Updated {updated:,} documents (re-indexed by trigger) in {(time.perf_counter() - start) * 1000:.0f} ms")
+    conn.close()
+
+    start = time.perf_counter()
+    authentication.search_index.rebuild()
+    print(f"Full rebuild: {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    authentication.search_index.optimize()
+    print(f"Optimize (merge segments): {time.perf_counter() - start:.1f}s")
+    print(f"Database size: {os.path.getsize('test.db') / 1e6:,.0f} MB\n")
+
+    common, medium, rare = vocabulary[2], vocabulary[300], vocabulary[15000]
+    cases = [
+        (f"rare term ({rare})", {"q": rare}),
+        (f"medium term ({medium})", {"q": medium}),
+        (f"common term ({common})", {"q": common}),
+        ("two medium terms", {"q": f"{vocabulary[300]} {vocabulary[400]}"}),
+        (f"prefix ({medium[:3]}*)", {"q": medium[:3]}),
+        ("medium term, scope=mine", {"q": medium, "scope": "mine"}),
+        ("medium term, offset=500", {"q": medium, "offset": 500}),
+    ]
+    print(f"{'query':<36}{'p50 ms':>9}{'p99 ms':>9}{'total':>9}")
+    for label, params in cases:
+        path = f"/documents/search?{urlencode(params)}"
+        await call(path, token)  # Warm up
+        p50, p99, response = await measure(path, token, args.requests)
+        total = json.loads(response["body"])["total"]
+        print(f"{label:<36}{p50:>9.2f}{p99:>9.2f}{total:>9}")
+    p50, worst = like_scan(medium)
+    print(f"{'baseline: LIKE scan, medium term':<36}{p50:>9.2f}{worst:>9.2f}")
+    p50, worst = like_scan(rare)
+    print(f"{'baseline: LIKE scan, rare term':<36}{p50:>9.2f}{worst:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=1_000_000)
+    parser.add_argument("--content-words", type=int, default=60)
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# bench_static.py
+# Compares /download (static_files.py) against the previous endpoint, kept
+# here as /download_legacy: small-file GETs, browser-style revalidation with
+# If-None-Match, large-file throughput and 1 MB range reads.
+#
+# The app runs on uvicorn in a child process against a temporary ./static.
+#
+# Usage: python bench_static.py --concurrency 20 --requests 2000
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+WORKDIR = Path(tempfile.mkdtemp(prefix="bench_static_"))
+os.chdir(WORKDIR)  # main.py serves ./static and keeps its user store under ./db
+
+import httpx
+import uvicorn
+from fastapi import HTTPException, status
+from fastapi.responses import FileResponse
+
+from main import app
+
+PORT = 8771
+MB = 1024 * 1024
+
+
+@app.get("/download_legacy/{filename}")
+def download_legacy(filename: str):
+    # The previous implementation
+    file_path = Path("static") / filename
+    if not file_path.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    return FileResponse(path=file_path, filename=filename)
+
+
+async def run(client, path: str, requests: int, concurrency: int, headers=None, expect=200):
+    received = 0
+    queue = iter(range(requests))
+
+    async def worker():
+        nonlocal received
+        for _ in queue:
+            response = await client.get(path, headers=headers)
+            assert response.status_code == expect, response.status_code
+            received += len(response.content)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return requests / elapsed, received / MB / elapsed
+
+
+async def main_async(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=120, limits=limits) as client:
+        etag = (await client.get("/download/small.txt")).headers["etag"]
+        legacy_etag = (await client.get("/download_legacy/small.txt")).headers["etag"]
+        cases = [
+            ("4 KB file", "small.txt", {}, {}, 200, 200, args.requests),
+            ("4 KB revalidate", "small.txt", {"If-None-Match": legacy_etag}, {"If-None-Match": etag}, 200, 304, args.requests),
+            (f"{args.large_mb} MB file", "large.bin", {}, {}, 200, 200, max(args.requests // 50, 20)),
+            ("1 MB range", "large.bin", {"Range": "bytes=1048576-2097151"}, {"Range": "bytes=1048576-2097151"}, 206, 206, args.requests // 4),
+        ]
+        print(f"{'case':<18}{'legacy req/s':>14}{'new req/s':>12}{'legacy MB/s':>13}{'new MB/s':>10}")
+        for name, filename, legacy_headers, new_headers, legacy_status, new_status, requests in cases:
+            legacy_rps, legacy_mbps = await run(client, f"/download_legacy/{filename}", requests, args.concurrency, legacy_headers, legacy_status)
+            new_rps, new_mbps = await run(client, f"/download/{filename}", requests, args.concurrency, new_headers, new_status)
+            print(f"{name:<18}{legacy_rps:>14.0f}{new_rps:>12.0f}{legacy_mbps:>13.0f}{new_mbps:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--large-mb", type=int, default=20)
+    args = parser.parse_args()
+
+    static = WORKDIR / "static"
+    static.mkdir()
+    (static / "small.txt").write_bytes(os.urandom(4096))
+    (static / "large.bin").write_bytes(os.urandom(args.large_mb * MB))
+
+    server = multiprocessing.get_context("fork").Process(
+        target=uvicorn.run, args=(app,), kwargs={"host": "127.0.0.1", "port": PORT, "log_level": "warning"}, daemon=True
+    )
+    server.start()
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/")
+            break
+        except httpx.TransportError:
+            time.sleep(0.1)
+    try:
+        asyncio.run(main_async(args))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
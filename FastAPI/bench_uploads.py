@@ -0,0 +1,103 @@
+# bench_uploads.py
+# Peak server memory per upload for the streaming /uploadfile and resumable
+# /uploads endpoints (uploads.py), against the old `await file.read()`
+# endpoint, which is kept here as /uploadfile_legacy.
+#
+# The app runs on uvicorn in a thread of this process and tracemalloc records
+# the peak of Python allocations while each upload is in flight; the client
+# streams the file from disk, so it adds almost nothing itself.
+#
+# Usage: python bench_uploads.py --sizes 10 50 200
+import gc
+import os
+import time
+import tempfile
+import argparse
+import threading
+import tracemalloc
+from pathlib import Path
+
+WORKDIR = Path(tempfile.mkdtemp(prefix="bench_uploads_"))
+os.environ.setdefault("UPLOAD_DIR", str(WORKDIR / "uploads"))
+os.environ.setdefault("MAX_UPLOAD_BYTES", str(1 << 40))
+os.chdir(WORKDIR)  # main.py keeps its user store under ./db
+
+import logging
+import httpx
+import uvicorn
+from fastapi import UploadFile, File
+
+from main import app
+
+PORT = 8770
+MB = 1024 * 1024
+
+
+@app.post("/uploadfile_legacy")
+async def upload_file_legacy(file: UploadFile = File(...)):
+    # The previous implementation
+    content = await file.read()
+    return {"filename": file.filename, "size": len(content)}
+
+
+def measure(upload) -> tuple:
+    gc.collect()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    upload()
+    elapsed = time.perf_counter() - start
+    return (tracemalloc.get_traced_memory()[1] - base) / MB, elapsed
+
+
+def resumable(client, path: Path, size: int, part: int = 16 * MB):
+    upload_id = client.post("/uploads", params={"filename": "resumable.bin"}, headers={"Upload-Length": str(size)}).json()["upload_id"]
+    with open(path, "rb") as f:
+        for offset in range(0, size, part):
+            def body(remaining=min(part, size - offset)):
+                while remaining:
+                    chunk = f.read(min(64 * 1024, remaining))
+                    remaining -= len(chunk)
+                    yield chunk
+            response = client.patch(f"/uploads/{upload_id}", content=body(), headers={"Upload-Offset": str(offset)})
+            response.raise_for_status()
+    assert response.json()["complete"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="Upload sizes in MB")
+    args = parser.parse_args()
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    logging.disable(logging.INFO)
+    tracemalloc.start()
+    print(f"{'size MB':>8}{'legacy peak MB':>16}{'streaming peak MB':>19}{'resumable peak MB':>19}{'streaming MB/s':>16}")
+    with httpx.Client(base_url=f"http://127.0.0.1:{PORT}", timeout=600) as client:
+        for size_mb in args.sizes:
+            path = WORKDIR / f"payload_{size_mb}.bin"
+            with open(path, "wb") as f:
+                for _ in range(size_mb):
+                    f.write(os.urandom(MB))
+            size = size_mb * MB
+
+            def multipart(url):
+                with open(path, "rb") as f:
+                    response = client.post(url, files={"file": (path.name, f)})
+                response.raise_for_status()
+                assert response.json()["size"] == size
+
+            streaming, elapsed = measure(lambda: multipart("/uploadfile"))
+            resumed, _ = measure(lambda: resumable(client, path, size))
+            legacy, _ = measure(lambda: multipart("/uploadfile_legacy"))
+            print(f"{size_mb:>8}{legacy:>16.1f}{streaming:>19.1f}{resumed:>19.1f}{size_mb / elapsed:>16.0f}")
+            path.unlink()
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
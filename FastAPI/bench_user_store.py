@@ -0,0 +1,116 @@
+# bench_user_store.py
+# Per-registration cost of the append-only user store (user_store.py) as it
+# grows to 1M users, against the old save_user that rewrote db/users.json.
+# Also checks that concurrent worker processes lose no registrations.
+#
+# Usage: python bench_user_store.py --users 1000000
+import os
+import json
+import time
+import random
+import resource
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+from user_store import UserStore
+
+
+def user(i: int) -> dict:
+    return {"name": f"User {i}", "email": f"user{i}@example.com", "password": f"hashed_{random.getrandbits(64):016x}"}
+
+
+def legacy_save_user(db_file: Path, user_dict: dict):
+    # The previous main.save_user
+    users = []
+    if db_file.exists():
+        users = json.loads(db_file.read_text())
+    users.append(user_dict)
+    db_file.write_text(json.dumps(users, indent=2))
+
+
+def bench_legacy(workdir: Path, sizes: list, samples: int = 20):
+    print(f"{'legacy users':>14}{'ms / registration':>20}")
+    db_file = workdir / "users.json"
+    for size in sizes:
+        db_file.write_text(json.dumps([user(i) for i in range(size)], indent=2))
+        start = time.perf_counter()
+        for i in range(samples):
+            legacy_save_user(db_file, user(size + i))
+        print(f"{size:>14,}{(time.perf_counter() - start) / samples * 1000:>20.2f}")
+
+
+def bench_store(workdir: Path, total: int, samples: int = 2000):
+    store = UserStore(workdir / "users.jsonl")
+    checkpoints = [n for n in (1_000, 10_000, 100_000, 1_000_000, 10_000_000) if n <= total]
+    print(f"{'store users':>14}{'us / add':>12}{'us / get':>12}{'log MB':>9}")
+    count = 0
+    for checkpoint in checkpoints:
+        while count < checkpoint:
+            batch = min(10_000, checkpoint - count)
+            store.add_many([user(i) for i in range(count, count + batch)])
+            count += batch
+        new = [user(i) for i in range(count, count + samples)]
+        start = time.perf_counter()
+        for u in new:
+            store.add(u)
+        add_us = (time.perf_counter() - start) / samples * 1e6
+        count += samples
+        probes = [f"user{random.randrange(count)}@example.com" for _ in range(samples)]
+        start = time.perf_counter()
+        for email in probes:
+            assert store.get(email) is not None
+        get_us = (time.perf_counter() - start) / samples * 1e6
+        print(f"{checkpoint:>14,}{add_us:>12.1f}{get_us:>12.1f}{os.path.getsize(store.path) / 2**20:>9.1f}")
+    store.close()
+
+    start = time.perf_counter()
+    store = UserStore(workdir / "users.jsonl")
+    print(f"reopen (rebuild index of {len(store):,} users): {time.perf_counter() - start:.1f}s, "
+          f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    store.close()
+
+
+def register_many(path: str, worker: int, count: int):
+    store = UserStore(path)
+    for i in range(count):
+        store.add({"name": f"w{worker}", "email": f"w{worker}-{i}@example.com", "password": "hashed"})
+    store.close()
+
+
+def bench_workers(workdir: Path, workers: int, count: int):
+    path = str(workdir / "shared.jsonl")
+    UserStore(path).close()
+    start = time.perf_counter()
+    processes = [multiprocessing.Process(target=register_many, args=(path, w, count)) for w in range(workers)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - start
+    store = UserStore(path)
+    print(f"{workers} processes x {count} registrations: {len(store):,}/{workers * count:,} stored "
+          f"in {elapsed:.1f}s ({workers * count / elapsed:,.0f}/s)")
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--legacy-sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    random.seed(1)
+    with tempfile.TemporaryDirectory(prefix="user_store_") as tmp:
+        workdir = Path(tmp)
+        bench_legacy(workdir, args.legacy_sizes)
+        print()
+        bench_store(workdir, args.users)
+        print()
+        bench_workers(workdir, args.workers, 5_000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# bench_ws_hub.py
+# Broadcast throughput of the WebSocket hub (ws_hub.py).
+#
+# 1. In-process: 10k fake connections, a share of them slow. Compares the hub
+#    (per-client queues, slow clients drop) with a naive loop that awaits
+#    every send in turn.
+# 2. Over the network: real WebSocket clients connected to uvicorn worker
+#    processes that share a LocalPubSub directory. Messages are published to
+#    one worker and every client counts what arrives.
+#
+# Usage: python bench_ws_hub.py --connections 10000 --messages 100 --clients 10000 --workers 2
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_ws_hub_")
+os.chdir(WORKDIR)  # main.py keeps its user store under ./db
+os.environ.setdefault("WS_PUBSUB_DIR", os.path.join(WORKDIR, "pubsub"))
+
+import httpx
+import uvicorn
+from websockets.asyncio.client import connect
+
+import ws_hub
+
+BASE_PORT = 8773
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def in_process(connections: int, messages: int, slow_share: float, slow_delay: float):
+    slow = int(connections * slow_share)
+    sockets = [FakeWebSocket(slow_delay if i < slow else 0.0) for i in range(connections)]
+    fast = sockets[slow:]
+
+    hub = ws_hub.Hub(ws_hub.MemoryPubSub(), queue_size=64)
+    await hub.start()
+    for websocket in sockets:
+        await hub.connect(websocket, rooms=["all"])
+    start = time.perf_counter()
+    for i in range(messages):
+        await hub.broadcast({"seq": i, "text": "hello"}, "all")
+        await asyncio.sleep(0)
+    while sum(ws.received for ws in fast) < len(fast) * messages:
+        await asyncio.sleep(0.001)
+    hub_time = time.perf_counter() - start
+    dropped = hub.stats["dropped"]
+    await hub.stop()
+
+    for websocket in sockets:
+        websocket.received = 0
+    naive_messages = max(messages // 10, 1)  # The naive loop is too slow for the full run once clients are slow
+    start = time.perf_counter()
+    for i in range(naive_messages):
+        for websocket in sockets:
+            await websocket.send_text(f'{{"seq": {i}, "text": "hello"}}')
+    naive_time = time.perf_counter() - start
+
+    print(f"in-process, {connections} connections ({slow} with {slow_delay * 1000:.0f} ms sends):")
+    print(f"  hub   {len(fast) * messages / hub_time:>12,.0f} deliveries/s to fast clients "
+          f"({messages} broadcasts in {hub_time:.2f}s, {dropped} dropped for slow clients)")
+    print(f"  naive {connections * naive_messages / naive_time:>12,.0f} deliveries/s "
+          f"({naive_messages} broadcasts in {naive_time:.2f}s, each waits for the slowest client)")
+
+
+async def over_network(clients: int, workers: int, messages: int):
+    counts = [0] * clients
+    done = asyncio.Event()
+    target = clients * messages
+
+    async def client(i, ready):
+        port = BASE_PORT + i % workers
+        async with connect(f"ws://127.0.0.1:{port}/ws?rooms=bench", compression=None, open_timeout=120, max_queue=None) as websocket:
+            ready.set()
+            async for message in websocket:
+                if message.startswith('{"seq"'):
+                    counts[i] += 1
+                    if counts[i] == messages and sum(counts) == target:
+                        done.set()
+
+    tasks = []
+    for i in range(clients):
+        ready = asyncio.Event()
+        tasks.append(asyncio.create_task(client(i, ready)))
+        await ready.wait()
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{BASE_PORT}") as http:
+        start = time.perf_counter()
+        for i in range(messages):
+            await http.post("/broadcast", params={"room": "bench"}, json={"seq": i})
+        try:
+            await asyncio.wait_for(done.wait(), 300)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - start
+    received = sum(counts)
+    print(f"network, {clients} clients over {workers} worker(s), {messages} broadcasts published to one worker:")
+    print(f"  {received:,}/{target:,} delivered in {elapsed:.2f}s = {received / elapsed:,.0f} messages/s")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def serve(port: int):
+    from main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", backlog=16384, ws_per_message_deflate=False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=10000, help="Fake connections for the in-process run")
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--slow-share", type=float, default=0.01)
+    parser.add_argument("--slow-delay", type=float, default=0.05)
+    parser.add_argument("--clients", type=int, default=10000, help="Real WebSocket clients for the network run")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--network-messages", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(in_process(args.connections, args.messages, args.slow_share, args.slow_delay))
+
+    servers = [multiprocessing.get_context("fork").Process(target=serve, args=(BASE_PORT + w,), daemon=True) for w in range(args.workers)]
+    for server in servers:
+        server.start()
+    time.sleep(3)
+    try:
+        asyncio.run(over_network(args.clients, args.workers, args.network_messages))
+    finally:
+        for server in servers:
+            server.terminate()
+
+
+if __name__ == "__main__":
+    main()
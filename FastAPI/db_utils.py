@@ -1,20 +1,12 @@
-import json
 from pathlib import Path
+from user_store import USER_STORE, get_user_store
 
-DB_FILE = Path("db/users.json")
+DB_FILE = Path("db/users.json")      # Legacy JSON array, imported into the log on first use
+USER_LOG = Path(USER_STORE)           # USER_STORE env, see user_store.py
 
 def read_users_from_db():
-    if not DB_FILE.exists():
-        return []
-    with DB_FILE.open("r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []
+    return get_user_store(USER_LOG, legacy_json=DB_FILE).all()
 
 def write_users_to_db(users_dict):
-    users = read_users_from_db()
-    users.append(users_dict)
-    with DB_FILE.open("w", encoding="utf-8") as f:
-        json.dump(users, f, ensure_ascii=False, indent=4)
-
+    # One append instead of rewriting every user; raises ValueError for a registered email
+    get_user_store(USER_LOG, legacy_json=DB_FILE).add(users_dict)
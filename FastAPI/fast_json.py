@@ -0,0 +1,95 @@
+# fast_json.py
+# Opt-in fast JSON responses. FastJSONResponse encodes with orjson (or msgspec)
+# instead of jsonable_encoder + json.dumps, and model_response() validates
+# ORM rows straight into a Pydantic type and dumps them to bytes in
+# pydantic-core, skipping the intermediate dict pass. Set FAST_JSON=1 to make
+# FastJSONResponse the default response class of the apps that use
+# app_options(); endpoints can also return these responses directly.
+import os
+import json
+import logging
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from pathlib import PurePath
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1"
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")   # auto | orjson | msgspec | json
+
+
+def _default(obj):
+    # Types the encoders do not handle natively
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (Decimal, PurePath)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _pick_backend(name: str):
+    if name in ("auto", "orjson") and orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        return "orjson", lambda content: orjson.dumps(content, default=_default, option=option)
+    if name in ("auto", "msgspec") and msgspec is not None:
+        encoder = msgspec.json.Encoder(enc_hook=_default)
+        return "msgspec", encoder.encode
+    if name not in ("auto", "json"):
+        logger.warning(f"JSON backend {name!r} is not installed; using the standard library")
+    return "json", lambda content: json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode()
+
+
+BACKEND, dumps = _pick_backend(JSON_BACKEND)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse encoded by the fastest installed backend (BACKEND).
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=256)
+def _adapter(tp) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+def model_response(tp, content, status_code: int = 200, headers: dict | None = None) -> Response:
+    """
+    Serializes `content` (models, dicts or ORM objects) as the Pydantic type
+    `tp`, e.g. List[DocumentOut], in one validate + dump_json pass. Keep
+    response_model on the route for the OpenAPI schema.
+    """
+    adapter = _adapter(tp)
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def app_options() -> dict:
+    """
+    FastAPI(...) keyword arguments: FastJSONResponse as the default response
+    class when FAST_JSON=1, otherwise nothing, which keeps FastAPI's own
+    serialization (newer versions dump response_model routes in pydantic-core).
+    """
+    return {"default_response_class": FastJSONResponse} if FAST_JSON else {}
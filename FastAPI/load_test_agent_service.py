@@ -0,0 +1,146 @@
+# load_test_agent_service.py
+# Load test for agent_service.py with a fake streaming LLM (no network, no keys).
+#
+# Starts the service in-process on uvicorn, then opens many concurrent SSE
+# streams against both agents and reports time-to-first-token, total latency
+# and errors. It also checks that disconnecting mid-stream and DELETE
+# /agents/runs/{id} cancel runs.
+#
+# Usage: python load_test_agent_service.py --users 200
+import os
+import time
+import json
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+
+# Offline configuration; must be set before the service and agents are imported
+WORKDIR = tempfile.mkdtemp(prefix="agent_service_")
+os.environ.setdefault("MODE", "Fake")
+# One response that is a valid intent, SQL plan (json_stream) and answer, since the fake is shared by all users
+os.environ.setdefault("FAKE_LLM_RESPONSES", '{"query": ["SELECT COUNT(*) AS n FROM Employees"]}')
+os.environ.setdefault("FAKE_LLM_SLEEP", "0.01")
+os.environ.setdefault("SQL_OUTPUT_MODE", "json_stream")
+os.environ.setdefault("LLM_RPM", "1000000")
+os.environ.setdefault("LLM_TPM", "1000000000")
+os.environ.setdefault("LLM_MAX_CONCURRENCY", "10000")
+os.environ.setdefault("TENANT_DB_URL", f"sqlite:///{WORKDIR}/{{tenant_id}}.db")
+os.environ.setdefault("RESEARCH_STORE_DIR", os.path.join(WORKDIR, "research_store"))
+
+import httpx
+import uvicorn
+
+from agent_service import app, runs
+
+PORT = 8765
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+
+def create_tenant_db():
+    connection = sqlite3.connect(os.path.join(WORKDIR, "northwind.db"))
+    connection.execute("CREATE TABLE Employees (EmployeeID INTEGER PRIMARY KEY, LastName TEXT)")
+    connection.executemany("INSERT INTO Employees (LastName) VALUES (?)", [("Davolio",), ("Fuller",)])
+    connection.commit()
+    connection.close()
+
+
+def start_server():
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def one_stream(client, agent, thread_id, stop_after_tokens=None):
+    """
+    Returns (time to first token, total time, final event, run id).
+    """
+    start = time.perf_counter()
+    first_token = None
+    final_event = None
+    run_id = None
+    tokens = 0
+    async with client.stream("POST", f"/agents/{agent}/stream", json={"message": "How many employees are there?", "thread_id": thread_id}) as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = json.loads(line[6:])
+                if event == "run":
+                    run_id = data["run_id"]
+                elif event == "token":
+                    tokens += 1
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    if stop_after_tokens and tokens >= stop_after_tokens:
+                        final_event = "disconnected"
+                        break
+                elif event in ("done", "error", "cancelled"):
+                    final_event = event
+                    break
+    return first_token, time.perf_counter() - start, final_event, run_id
+
+
+async def load(users: int):
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=120, limits=limits) as client:
+        # Warm up: import both agents once
+        await one_stream(client, "db", "warmup")
+        await one_stream(client, "research", "warmup")
+
+        for agent in ("db", "research"):
+            start = time.perf_counter()
+            results = await asyncio.gather(*(one_stream(client, agent, f"user-{i}") for i in range(users)), return_exceptions=True)
+            elapsed = time.perf_counter() - start
+            ok = [r for r in results if not isinstance(r, Exception) and r[2] == "done"]
+            ttft = sorted(r[0] for r in ok if r[0] is not None)
+            total = sorted(r[1] for r in ok)
+            print(f"{agent:<9}{users:>6}{len(ok):>6}{users - len(ok):>7}{users / elapsed:>9.1f}"
+                  f"{statistics.median(ttft) * 1000:>10.0f}{ttft[int(len(ttft) * 0.95) - 1] * 1000:>10.0f}"
+                  f"{statistics.median(total) * 1000:>10.0f}{total[int(len(total) * 0.95) - 1] * 1000:>10.0f}")
+            errors = [r for r in results if isinstance(r, Exception) or r[2] != "done"]
+            if errors:
+                print("   first error:", errors[0])
+
+
+async def cancellation():
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60) as client:
+        # Client disconnect after the first token
+        _, _, final_event, _ = await one_stream(client, "research", "cancel-disconnect", stop_after_tokens=1)
+        await asyncio.sleep(0.2)
+        print(f"disconnect: client saw '{final_event}', active runs after = {len(runs)}")
+
+        # Explicit cancel via DELETE while the stream is open
+        async def cancel_soon():
+            while not runs:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.1)
+            response = await client.delete(f"/agents/runs/{next(iter(runs))}")
+            return response.status_code
+
+        stream, status_code = await asyncio.gather(one_stream(client, "research", "cancel-delete"), cancel_soon())
+        await asyncio.sleep(0.2)
+        print(f"DELETE:     status {status_code}, client saw '{stream[2]}', active runs after = {len(runs)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    create_tenant_db()
+    server = start_server()
+    print(f"{'agent':<9}{'users':>6}{'ok':>6}{'failed':>7}{'runs/s':>9}{'ttft p50':>10}{'ttft p95':>10}{'total p50':>10}{'total p95':>10}")
+    asyncio.run(load(args.users))
+    asyncio.run(cancellation())
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
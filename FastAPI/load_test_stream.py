@@ -0,0 +1,127 @@
+# load_test_stream.py
+# Concurrent /stream connections on one uvicorn worker: the async endpoint
+# (streaming.py) against the previous sync generator with time.sleep, kept
+# here as /stream_legacy, which holds a threadpool thread per open stream.
+# Also checks that closed clients stop their producers and that idle SSE
+# streams get heartbeats.
+#
+# Clients are raw asyncio sockets so thousands of them fit in this process;
+# the server runs in a child process.
+#
+# Usage: python load_test_stream.py --streams 100 1000 3000
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+
+os.chdir(tempfile.mkdtemp(prefix="load_test_stream_"))  # main.py keeps its user store under ./db
+os.environ.setdefault("STREAM_HEARTBEAT", "0.5")
+
+import uvicorn
+from fastapi.responses import StreamingResponse
+
+from main import app
+
+PORT = 8772
+HOST = "127.0.0.1"
+
+
+@app.get("/stream_legacy")
+def stream_legacy(count: int = 10, interval: float = 0.1):
+    # The previous implementation
+    def generator():
+        for i in range(count):
+            yield f"number: {i}\n"
+            time.sleep(interval)
+    return StreamingResponse(generator(), media_type="text/plain")
+
+
+async def open_stream(path: str):
+    reader, writer = await asyncio.open_connection(HOST, PORT, limit=1 << 20)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {HOST}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    return reader, writer
+
+
+async def read_stream(path: str, expect: int):
+    start = time.perf_counter()
+    reader, writer = await open_stream(path)
+    body = b""
+    while chunk := await reader.read(65536):
+        body += chunk
+    writer.close()
+    return body.count(b"number") >= expect, time.perf_counter() - start
+
+
+async def get_json(path: str):
+    reader, writer = await open_stream(path)
+    data = await reader.read()
+    writer.close()
+    return json.loads(data.split(b"\r\n\r\n", 1)[1])
+
+
+async def concurrency(path: str, streams: int, count: int, interval: float):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(read_stream(f"{path}?count={count}&interval={interval}", count) for _ in range(streams)))
+    wall = time.perf_counter() - start
+    durations = sorted(d for _, d in results)
+    return sum(ok for ok, _ in results), wall, statistics.median(durations), durations[int(len(durations) * 0.99) - 1]
+
+
+async def disconnects(streams: int):
+    before = await get_json("/stream/stats")
+    connections = [await open_stream("/stream?count=100000&interval=0.05&format=sse") for _ in range(streams)]
+    for reader, _ in connections:
+        await reader.readuntil(b"data: ")
+    during = await get_json("/stream/stats")
+    for _, writer in connections:
+        writer.close()
+    await asyncio.sleep(1)
+    after = await get_json("/stream/stats")
+    return during["active"] - before["active"], after["active"] - before["active"], after["disconnected"] - before["disconnected"]
+
+
+async def heartbeat():
+    reader, writer = await open_stream("/stream?count=2&interval=2&format=sse")
+    body = await reader.read()
+    writer.close()
+    return body.count(b": ping")
+
+
+async def main_async(args):
+    print(f"stream = {args.count} chunks x {args.interval}s ({args.count * args.interval:.0f}s ideal)")
+    print(f"{'endpoint':<15}{'streams':>8}{'completed':>11}{'wall s':>8}{'p50 s':>7}{'p99 s':>7}")
+    for path, levels in (("/stream_legacy", [n for n in args.streams if n <= args.legacy_max]), ("/stream", args.streams)):
+        for streams in levels:
+            ok, wall, p50, p99 = await concurrency(path, streams, args.count, args.interval)
+            print(f"{path:<15}{streams:>8}{ok:>11}{wall:>8.1f}{p50:>7.1f}{p99:>7.1f}")
+    opened, left, disconnected = await disconnects(500)
+    print(f"disconnect: {opened} streams open, {left} still active 1s after the clients closed, {disconnected} counted as disconnected")
+    print(f"heartbeat: {await heartbeat()} ': ping' frames on an SSE stream idle for 2s (STREAM_HEARTBEAT=0.5)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, nargs="+", default=[100, 1000, 3000])
+    parser.add_argument("--legacy-max", type=int, default=100, help="Largest level also run against /stream_legacy")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.25)
+    args = parser.parse_args()
+
+    server = multiprocessing.get_context("fork").Process(
+        target=uvicorn.run, args=(app,), kwargs={"host": HOST, "port": PORT, "log_level": "warning", "backlog": 8192}, daemon=True
+    )
+    server.start()
+    time.sleep(2)
+    try:
+        asyncio.run(main_async(args))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,26 @@
 # main.py
-from fastapi import FastAPI, Depends, BackgroundTasks, Request, HTTPException, status, Header, UploadFile, File, Form, Cookie, WebSocket
-from fastapi.responses import StreamingResponse, FileResponse, JSONResponse
+from fastapi import FastAPI, Depends, BackgroundTasks, Request, HTTPException, status, Header, Form, Cookie, Query, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 from enum import Enum
-import time
-import json
+from typing import Literal
+import asyncio
 import logging
 from pathlib import Path
+from user_store import USER_STORE, get_user_store
+import uploads
+import static_files
+import streaming
+import ws_hub
+import metrics
+import fast_json
 
 app = FastAPI(
     title="FastAPI Structured Examples",
     description="Demonstrates core FastAPI features with unique endpoints and clear explanations.",
-    version="1.0.0"
+    version="1.0.0",
+    **fast_json.app_options()  # FAST_JSON=1: orjson / msgspec responses (fast_json.py)
 )
 
 # Configure logging
@@ -107,7 +115,8 @@ def secure_data():
 # -----------------------------------
 # Concept: Executes time-consuming tasks asynchronously after sending the response.
 
-DB_FILE = Path("db/users.json")
+DB_FILE = Path("db/users.json")       # Legacy JSON array, imported into the log on first start
+USER_LOG = Path(USER_STORE)            # USER_STORE env, see user_store.py
 
 class UserCreate(BaseModel):
     name: str
@@ -120,12 +129,11 @@ def fake_hash(password: str) -> str:
 
 
 def save_user(user_dict: dict):
-    """Writes user data to a JSON file."""
-    users = []
-    if DB_FILE.exists():
-        users = json.loads(DB_FILE.read_text())
-    users.append(user_dict)
-    DB_FILE.write_text(json.dumps(users, indent=2))
+    """Appends user data to the append-only user store (see user_store.py)."""
+    try:
+        get_user_store(USER_LOG, legacy_json=DB_FILE).add(user_dict)
+    except ValueError as e:
+        logging.warning(f"Registration skipped: {e}")
 
 @app.post("/register", summary="Register User", tags=["Tasks"])
 def register(user: UserCreate, background_tasks: BackgroundTasks):
@@ -139,14 +147,15 @@ def register(user: UserCreate, background_tasks: BackgroundTasks):
 # Section 7: Middleware Example
 # -----------------------------------
 # Concept: Shows how to write custom middleware to process requests and responses globally.
+# A pure ASGI middleware (metrics.py) sets X-Process-Time and records per-route metrics without wrapping each response.
+
+app_metrics = metrics.Metrics()
+app.add_middleware(metrics.MetricsMiddleware, metrics=app_metrics)
 
-@app.middleware("http")
-async def add_process_time(request: Request, call_next):  # noqa: ARG001
-    """Adds X-Process-Time header to each response."""
-    start = time.time()
-    response = await call_next(request)
-    response.headers["X-Process-Time"] = str(time.time() - start)
-    return response
+@app.get("/metrics", summary="Prometheus Metrics", tags=["Middleware"], response_class=PlainTextResponse)
+def read_metrics():
+    """Request counts, latency and response-size histograms and in-flight requests, in Prometheus text format."""
+    return PlainTextResponse(app_metrics.render(), media_type="text/plain; version=0.0.4")
 
 # -----------------------------------
 # Section 8: Enum Constraint
@@ -188,20 +197,26 @@ def list_users():
 # -----------------------------------
 # Section 10: File Uploads & Downloads
 # -----------------------------------
-# Concept: Handles file uploads with UploadFile and serves files with FileResponse, including 404 handling.
+# Concept: Streams file uploads to disk chunk by chunk (uploads.py) and serves files with caching and Range support (static_files.py), including 404 handling.
+
+@app.post("/uploadfile", summary="Upload File", tags=["Files"], openapi_extra=uploads.MULTIPART_FILE_OPENAPI)
+async def upload_file(request: Request):
+    """Streams the multipart file to disk, hashing as it goes; 413 past MAX_UPLOAD_BYTES, 400 on a malformed body.
+    An existing file is never replaced: a taken name is stored as name-1.ext, name-2.ext, ..."""
+    files = await uploads.stream_multipart(request)
+    if not files:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file in upload")
+    file = files[0]
+    logging.info(f"Received file {file['filename']}, size={file['size']} bytes")
+    return {"filename": file["filename"], "size": file["size"], "sha256": file["sha256"]}
 
-@app.post("/uploadfile", summary="Upload File", tags=["Files"])
-async def upload_file(file: UploadFile = File(...)):
-    content = await file.read()
-    logging.info(f"Received file {file.filename}, size={len(content)} bytes")
-    return {"filename": file.filename, "size": len(content)}
+# Resumable uploads: POST /uploads, then PATCH /uploads/{id} with Upload-Offset (HEAD to resume)
+app.include_router(uploads.router)
 
-@app.get("/download/{filename}", summary="Download File", tags=["Files"])
-def download_file(filename: str):
-    file_path = Path("static") / filename
-    if not file_path.exists():
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
-    return FileResponse(path=file_path, filename=filename)
+@app.api_route("/download/{filename:path}", methods=["GET", "HEAD"], summary="Download File", tags=["Files"])
+async def download_file(filename: str, request: Request):
+    """Serves a file from ./static with ETag / 304, Range and multi-range support (static_files.py)."""
+    return await static_files.serve(request, filename)
 
 # -----------------------------------
 # Section 11: Form Data & Cookies
@@ -234,27 +249,62 @@ def read_unicorn(name: str):
 # -----------------------------------
 # Section 13: Streaming Responses
 # -----------------------------------
-# Concept: Streams large or infinite data gradually using StreamingResponse.
+# Concept: Streams large or infinite data gradually from async generators (streaming.py), so an open stream holds no thread.
+
+STREAM_FORMATS = {"text": streaming.TEXT, "sse": streaming.SSE, "ndjson": streaming.NDJSON}
+
+async def count_numbers(count: int, interval: float, format: str):
+    for i in range(count):
+        yield f"number: {i}\n" if format == "text" else {"number": i}
+        await asyncio.sleep(interval)
 
 @app.get("/stream", summary="Streaming Response", tags=["Streaming"])
-def stream_numbers():
-    def generator():
-        for i in range(10):
-            yield f"number: {i}\n"
-            time.sleep(0.1)
-    return StreamingResponse(generator(), media_type="text/plain")
+async def stream_numbers(
+    request: Request,
+    count: int = Query(10, ge=1, le=100_000),
+    interval: float = Query(0.1, ge=0, le=60),
+    format: Literal["text", "sse", "ndjson"] = "text",
+):
+    """Streams numbers as plain text, Server-Sent Events or NDJSON; stops when the client disconnects."""
+    return streaming.stream_response(request, count_numbers(count, interval, format), STREAM_FORMATS[format])
+
+@app.get("/stream/stats", summary="Streaming Stats", tags=["Streaming"])
+def stream_stats():
+    """Open, completed and disconnected streams in this worker."""
+    return streaming.stats
 
 # -----------------------------------
 # Section 14: WebSocket Support
 # -----------------------------------
 # Concept: Establishes a persistent bi-directional connection for real-time communication.
 
+hub = ws_hub.Hub()
+
+@app.on_event("startup")
+async def start_hub():
+    await hub.start()
+
+@app.on_event("shutdown")
+async def stop_hub():
+    await hub.stop()
+
+async def echo(client: ws_hub.Client, text: str):
+    hub.send(client, f"Echo: {text}")
+
 @app.websocket("/ws")  # summary and tags not supported for websocket routes
-async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    while True:
-        data = await websocket.receive_text()
-        await websocket.send_text(f"Echo: {data}")
+async def websocket_endpoint(websocket: WebSocket, rooms: str = ""):
+    """Echoes plain text; JSON {"type": "join" | "leave" | "publish", "room", "data"} uses the hub (ws_hub.py)."""
+    await hub.serve(websocket, [room for room in rooms.split(",") if room], on_text=echo)
+
+@app.post("/broadcast", summary="Broadcast To WebSockets", tags=["WebSocket"])
+async def broadcast(message: dict, room: str | None = None):
+    """Sends a JSON message to every WebSocket client in `room` (all clients if omitted)."""
+    await hub.broadcast(message, room)
+    return {"room": room, "recipients": len(hub.clients) if room is None else len(hub.rooms.get(room, ()))}
+
+@app.get("/ws/stats", summary="WebSocket Stats", tags=["WebSocket"])
+def websocket_stats():
+    return {**hub.stats, "clients": len(hub.clients), "rooms": len(hub.rooms)}
 
 # -----------------------------------
 # Section 15: Dependency with Teardown
@@ -0,0 +1,128 @@
+# metrics.py
+# Pure ASGI request metrics: per-route latency and response-size histograms
+# with fixed buckets, request counts by status and an in-flight gauge, kept
+# in plain dicts and rendered in the Prometheus text format. Unlike
+# @app.middleware("http") it adds no task or stream wrapping per request, so
+# streaming responses pass through untouched.
+from bisect import bisect_left
+from time import perf_counter_ns
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)   # Seconds
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)                                       # Bytes
+UNMATCHED = "<unmatched>"   # Label for 404s, so unknown paths cannot grow the label set
+OTHER_METHOD = "OTHER"      # Label for non-standard methods, for the same reason
+METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE", "CONNECT"})
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # Last slot is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, size_buckets=SIZE_BUCKETS):
+        # Latencies are recorded in ns against bounds converted once, so observe() stays integer-only
+        self.latency_bounds_ns = tuple(int(b * 1e9) for b in latency_buckets)
+        self.latency_buckets = latency_buckets
+        self.size_buckets = size_buckets
+        self.latency = {}     # (method, route) -> Histogram (ns)
+        self.sizes = {}       # (method, route) -> Histogram (bytes)
+        self.requests = {}    # (method, route, status) -> count
+        self.in_flight = 0
+
+    def record(self, method: str, route: str, status: int, duration_ns: int, size: int):
+        key = (method, route)
+        latency = self.latency.get(key)
+        if latency is None:
+            latency = self.latency[key] = Histogram(self.latency_bounds_ns)
+            self.sizes[key] = Histogram(self.size_buckets)
+        latency.observe(duration_ns)
+        self.sizes[key].observe(size)
+        counter = (method, route, status)
+        self.requests[counter] = self.requests.get(counter, 0) + 1
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Requests handled, by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}')
+        lines += _histogram_lines("http_request_duration_seconds", "Time from request to the last response byte.",
+                                  self.latency, self.latency_buckets, scale=1e-9)
+        lines += _histogram_lines("http_response_size_bytes", "Response body size.", self.sizes, self.size_buckets)
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name, help_text, histograms, buckets, scale=1):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for (method, route), histogram in sorted(histograms.items()):
+        labels = f'method="{method}",route="{_escape(route)}"'
+        cumulative = 0
+        for bound, count in zip(buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum * scale:.9g}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+class MetricsMiddleware:
+    """
+    Records every HTTP request into `metrics` and sets X-Process-Time (seconds
+    until the response headers) on each response.
+    """
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter_ns()
+        status = 500
+        size = 0
+        metrics = self.metrics
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (perf_counter_ns() - start) / 1e9
+                message["headers"] = [*message.get("headers", ()), (b"x-process-time", f"{elapsed:.6f}".encode())]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.in_flight -= 1
+            route = scope.get("route")
+            method = scope["method"] if scope["method"] in METHODS else OTHER_METHOD
+            metrics.record(method, getattr(route, "path", UNMATCHED), status, perf_counter_ns() - start, size)
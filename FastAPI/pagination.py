@@ -0,0 +1,124 @@
+# pagination.py
+# Keyset (cursor) pagination helpers for list endpoints: opaque cursors over
+# the primary key, `fields=` projection onto ORM columns, and total counts
+# that never scan the table. A page is `WHERE id > :last ORDER BY id LIMIT n`,
+# an index range read whose cost does not depend on how deep the page is or
+# how large the table has grown.
+import os
+import json
+import time
+import base64
+import logging
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+COUNT_EXACT_LIMIT = int(os.getenv("COUNT_EXACT_LIMIT", "10000"))   # Counts above this are estimated
+COUNT_TTL = float(os.getenv("COUNT_TTL", "10"))                    # Seconds a count is reused
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> int | None:
+    if not cursor:
+        return None
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["id"]
+        if not isinstance(last_id, int):
+            raise ValueError(last_id)
+        return last_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def parse_fields(fields: str | None, allowed: list[str], key: str = "id") -> list[str]:
+    """
+    `fields=title,owner_id` -> ["id", "title", "owner_id"]. The key is always
+    included because the next cursor is built from it; None means all fields.
+    """
+    if not fields:
+        return list(allowed)
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(requested) - set(allowed))
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown field(s): {', '.join(unknown)}; choose from {', '.join(allowed)}")
+    return [key] + [name for name in allowed if name in requested and name != key]
+
+
+def keyset_page(db: Session, model, fields: list[str], after: int | None, limit: int, filters=()) -> tuple[list[dict], int | None]:
+    """
+    Fetches one page of `model` rows as dicts holding only `fields`, ordered
+    by id. Returns the rows and the id to continue after (None on the last page).
+    """
+    query = select(*[getattr(model, name) for name in fields]).where(*filters)
+    if after is not None:
+        query = query.where(model.id > after)
+    rows = db.execute(query.order_by(model.id).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    items = [dict(zip(fields, row)) for row in rows[:limit]]
+    return items, items[-1]["id"] if has_more else None
+
+
+class CountEstimator:
+    """
+    Total rows matching a filter, for pagination headers. Up to
+    COUNT_EXACT_LIMIT the count is exact (a bounded index scan); past it the
+    planner's row estimate is used (PostgreSQL), or the key range for an
+    unfiltered SQLite table. Results are reused for COUNT_TTL seconds.
+    """
+
+    def __init__(self, exact_limit: int = COUNT_EXACT_LIMIT, ttl: float = COUNT_TTL):
+        self.exact_limit = exact_limit
+        self.ttl = ttl
+        self._cache = {}   # (table, key) -> (expires, count, exact)
+
+    def count(self, db: Session, model, filters=(), cache_key=()) -> tuple[int, bool]:
+        """
+        Returns (count, exact).
+        """
+        key = (model.__tablename__, cache_key)
+        cached = self._cache.get(key)
+        now = time.monotonic()
+        if cached is not None and cached[0] > now:
+            return cached[1], cached[2]
+
+        bounded = select(model.id).where(*filters).limit(self.exact_limit + 1).subquery()
+        count = db.execute(select(func.count()).select_from(bounded)).scalar_one()
+        exact = count <= self.exact_limit
+        if not exact:
+            count = max(self._estimate(db, model, filters), self.exact_limit + 1)
+        if len(self._cache) > 10000:
+            self._cache.clear()
+        self._cache[key] = (now + self.ttl, count, exact)
+        return count, exact
+
+    def _estimate(self, db: Session, model, filters) -> int:
+        dialect = db.get_bind().dialect.name
+        try:
+            if dialect == "postgresql":
+                query = select(model.id).where(*filters)
+                compiled = query.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+                plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar_one()
+                return int(plan[0]["Plan"]["Plan Rows"])
+            if not filters:
+                # Ids are allocated in order, so the key range bounds the row count (gaps from deletes overcount)
+                low, high = db.execute(select(func.min(model.id), func.max(model.id))).one()
+                return 0 if low is None else high - low + 1
+        except Exception:
+            logger.exception("Row count estimate failed")
+        return self.exact_limit + 1   # Only known to be more than the exact limit
+
+    def invalidate(self, model=None):
+        if model is None:
+            self._cache.clear()
+        else:
+            for key in [key for key in self._cache if key[0] == model.__tablename__]:
+                del self._cache[key]
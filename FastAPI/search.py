@@ -0,0 +1,246 @@
+# search.py
+# Full-text search over documents behind a small backend interface. The
+# default backend is SQLite FTS5: an external-content index on
+# documents(title, content) kept up to date by triggers in the same
+# transaction as every insert, update and delete, ranked with BM25 (title
+# weighted over content) and returning highlighted snippets. Words are not
+# stemmed: the last word of a query matches as a prefix, which a stemmed
+# index would break ("runni" against the stored stem "run"). Queries matching
+# more than RANK_WINDOW documents rank only the newest of them, which keeps
+# near-stopwords from scoring the whole table.
+#
+# Rebuild the index from the documents table (e.g. after a bulk load with the
+# triggers dropped, or to compact it):
+#   python search.py rebuild [--database sqlite:///./test.db]
+#   python search.py optimize
+import os
+import re
+import html
+import time
+import logging
+import argparse
+import unicodedata
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "fts5")
+MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "1000"))       # Deepest result reachable by paging
+COUNT_LIMIT = int(os.getenv("SEARCH_COUNT_LIMIT", "10000"))      # Match counts above this are reported as a lower bound
+RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "10000"))      # Queries matching more than this rank only the newest matches
+TITLE_WEIGHT = float(os.getenv("SEARCH_TITLE_WEIGHT", "10"))     # BM25 weight of a title match relative to content
+SNIPPET_TOKENS = 16
+HIGHLIGHT_START, HIGHLIGHT_END = "<mark>", "</mark>"
+
+
+@dataclass
+class SearchPage:
+    results: list[dict]   # id, title, owner_id, score, title_highlight, snippet
+    total: int
+    total_exact: bool
+
+
+class SearchBackend(ABC):
+    """
+    A search index over the documents table. setup() creates whatever the
+    backend needs and keeps it current with document writes; search() runs a
+    ranked query restricted to `owner_id` when given. optimize() is optional.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    @abstractmethod
+    def setup(self):
+        pass
+
+    @abstractmethod
+    def search(self, query: str, limit: int, offset: int = 0, owner_id: int | None = None) -> SearchPage:
+        pass
+
+    @abstractmethod
+    def rebuild(self):
+        pass
+
+    def optimize(self):
+        pass
+
+
+def fts5_query(query: str) -> str:
+    """
+    User text -> an FTS5 MATCH expression: every word must match, the last
+    one as a prefix (search-as-you-type). Words are quoted, so FTS5 operators
+    and punctuation in the input are taken literally.
+    """
+    words = query.split()
+    if not words:
+        return ""
+    quoted = ['"' + word.replace('"', '""') + '"' for word in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+_WORD = re.compile(r"\w+")
+
+
+def _fold(word: str) -> str:
+    # Case and accent folding as in the unicode61 tokenizer with remove_diacritics
+    return "".join(c for c in unicodedata.normalize("NFKD", word.casefold()) if not unicodedata.combining(c))
+
+
+def term_matcher(query: str):
+    """
+    Returns word -> bool for the words `query` matches, the last query word as a prefix.
+    """
+    terms = [_fold(word) for word in _WORD.findall(query)]
+    if not terms:
+        return lambda word: False
+    exact, prefix = set(terms[:-1]), terms[-1]
+    return lambda word: (folded := _fold(word)) in exact or folded.startswith(prefix)
+
+
+def highlight(value: str | None, matches) -> str | None:
+    """
+    HTML-escapes `value` and wraps the matching words in HIGHLIGHT_START / HIGHLIGHT_END.
+    """
+    if value is None:
+        return None
+    parts, position = [], 0
+    for word in _WORD.finditer(value):
+        if matches(word.group()):
+            parts += [html.escape(value[position:word.start()]), HIGHLIGHT_START, html.escape(word.group()), HIGHLIGHT_END]
+            position = word.end()
+    parts.append(html.escape(value[position:]))
+    return "".join(parts)
+
+
+def snippet(value: str | None, matches, size: int = SNIPPET_TOKENS) -> str | None:
+    """
+    The `size`-word fragment of `value` with the most matching words, highlighted.
+    """
+    if value is None:
+        return None
+    words = list(_WORD.finditer(value))
+    if len(words) <= size:
+        return highlight(value, matches)
+    hits = [i for i, word in enumerate(words) if matches(word.group())]
+    start, best = 0, 0
+    for hit in hits:
+        candidate = max(0, min(hit - 2, len(words) - size))  # A little context before the first hit
+        count = sum(1 for other in hits if candidate <= other < candidate + size)
+        if count > best:
+            start, best = candidate, count
+    end = start + size
+    fragment = value[words[start].start() if start else 0:words[end - 1].end() if end < len(words) else len(value)]
+    return ("…" if start else "") + highlight(fragment, matches) + ("…" if end < len(words) else "")
+
+
+class FTS5Backend(SearchBackend):
+    table = "documents_fts"
+
+    def setup(self):
+        with self.engine.begin() as conn:
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": self.table}).first()
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "title, content, content='documents', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_ai AFTER INSERT ON documents BEGIN "
+                f"INSERT INTO {self.table}(rowid, title, content) VALUES (new.id, new.title, new.content); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_ad AFTER DELETE ON documents BEGIN "
+                f"INSERT INTO {self.table}({self.table}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_au AFTER UPDATE OF title, content ON documents BEGIN "
+                f"INSERT INTO {self.table}({self.table}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+                f"INSERT INTO {self.table}(rowid, title, content) VALUES (new.id, new.title, new.content); END"
+            ))
+            if not exists and conn.execute(text("SELECT 1 FROM documents LIMIT 1")).first():
+                logger.info("Building the search index over existing documents")
+                conn.execute(text(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')"))
+
+    def search(self, query: str, limit: int, offset: int = 0, owner_id: int | None = None) -> SearchPage:
+        match = fts5_query(query)
+        if not match or offset >= MAX_RESULTS:
+            return SearchPage([], 0, True)
+        limit = min(limit, MAX_RESULTS - offset)
+        params = {"match": match, "limit": limit, "offset": offset, "owner_id": owner_id, "window": RANK_WINDOW,
+                  "count_limit": max(COUNT_LIMIT, RANK_WINDOW) + 1}
+        # CROSS JOIN keeps the index scan outermost; otherwise SQLite may walk the owner's
+        # documents and probe the index once per row
+        owner_join = "CROSS JOIN documents d ON d.id = f.rowid AND d.owner_id = :owner_id" if owner_id is not None else ""
+        matches = f"FROM {self.table} f {owner_join} WHERE {self.table} MATCH :match"
+        bm25 = f"bm25({self.table}, {TITLE_WEIGHT}, 1.0)"
+        with self.engine.connect() as conn:
+            matched = conn.execute(text(f"SELECT count(*) FROM (SELECT f.rowid {matches} LIMIT :count_limit)"), params).scalar_one()
+            exact, total = matched <= COUNT_LIMIT, min(matched, COUNT_LIMIT)
+            if not matched:
+                return SearchPage([], 0, True)
+            if matched > RANK_WINDOW:
+                # A near-stopword would need BM25 over most of the table, and scores that barely
+                # differ; rank the newest RANK_WINDOW matches instead
+                ranking = (f"SELECT rowid, score FROM (SELECT f.rowid AS rowid, {bm25} AS score {matches} "
+                           f"ORDER BY f.rowid DESC LIMIT :window) ORDER BY score LIMIT :limit OFFSET :offset")
+            else:
+                ranking = f"SELECT f.rowid, {bm25} AS score {matches} ORDER BY score LIMIT :limit OFFSET :offset"
+            ranked = conn.execute(text(ranking), params).all()
+            if not ranked:
+                return SearchPage([], total, exact)
+            # Highlighting happens here rather than with snippet(): that needs another MATCH,
+            # which rereads the whole match list of a common term for every row on the page
+            ids = ", ".join(str(int(rowid)) for rowid, _ in ranked)
+            rows = conn.execute(text(f"SELECT id, title, content, owner_id FROM documents WHERE id IN ({ids})")).all()
+        details = {row[0]: row for row in rows}
+        matches = term_matcher(query)
+        results = []
+        for rowid, score in ranked:
+            row = details.get(rowid)
+            if row is None:  # Deleted between the two queries
+                continue
+            results.append({
+                "id": rowid, "title": row[1], "owner_id": row[3], "score": -score,
+                "title_highlight": highlight(row[1], matches), "snippet": snippet(row[2], matches),
+            })
+        return SearchPage(results, total, exact)
+
+    def rebuild(self):
+        with self.engine.begin() as conn:
+            conn.execute(text(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')"))
+
+    def optimize(self):
+        with self.engine.begin() as conn:
+            conn.execute(text(f"INSERT INTO {self.table}({self.table}) VALUES ('optimize')"))
+
+
+BACKENDS = {"fts5": FTS5Backend}   # Register other backends here and select them with SEARCH_BACKEND
+
+
+def get_backend(engine: Engine, name: str = SEARCH_BACKEND) -> SearchBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown search backend {name!r}; available: {', '.join(BACKENDS)}")
+    return BACKENDS[name](engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the document search index.")
+    parser.add_argument("command", choices=["rebuild", "optimize"])
+    parser.add_argument("--database", default="sqlite:///./test.db")
+    parser.add_argument("--backend", default=SEARCH_BACKEND, choices=list(BACKENDS))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    backend = get_backend(create_engine(args.database), args.backend)
+    backend.setup()
+    start = time.perf_counter()
+    getattr(backend, args.command)()
+    logger.info(f"{args.command} finished in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
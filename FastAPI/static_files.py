@@ -0,0 +1,248 @@
+# static_files.py
+# Serving files from STATIC_DIR: paths are confined to the directory, every
+# response carries a strong ETag and caching headers, conditional requests get
+# 304, and Range / multi-range requests get 206. Small hot files are served
+# from memory; larger ones go through Starlette's FileResponse, which uses the
+# ASGI pathsend extension (zero-copy sendfile) when the server offers it.
+import os
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from pathlib import Path
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException, Request, status
+from fastapi.responses import FileResponse, Response
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path(os.getenv("STATIC_DIR", "static"))
+MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))           # Cache-Control max-age, seconds
+SMALL_FILE_MAX = int(os.getenv("STATIC_SMALL_FILE_MAX", str(64 * 1024)))
+MEMORY_CACHE_BYTES = int(os.getenv("STATIC_MEMORY_CACHE_BYTES", str(32 * 1024 * 1024)))
+HASH_MAX = 256 * 1024 * 1024    # Larger files get an ETag from (inode, mtime, size) instead of a content hash
+MAX_ENTRIES = 10000
+MAX_RANGES = 16                 # More ranges than this are answered with the whole file
+CHUNK_SIZE = 256 * 1024
+
+
+class FileEntry:
+    __slots__ = ("key", "etag", "last_modified", "mtime", "content")
+
+    def __init__(self, key, etag, last_modified, mtime, content=None):
+        self.key = key                  # (inode, mtime_ns, size); a change means the file changed
+        self.etag = etag
+        self.last_modified = last_modified
+        self.mtime = mtime
+        self.content = content          # Bytes for small files while they stay in the memory cache
+
+
+class StaticFileCache:
+    """
+    ETags per file, computed once per (inode, mtime, size), and the bytes of
+    small files, LRU-bounded to MEMORY_CACHE_BYTES in total.
+    """
+
+    def __init__(self, small_file_max: int = SMALL_FILE_MAX, memory_bytes: int = MEMORY_CACHE_BYTES):
+        self.small_file_max = small_file_max
+        self.memory_bytes = memory_bytes
+        self._entries = OrderedDict()   # path -> FileEntry
+        self._pending = {}              # (path, key) -> Future, so concurrent misses hash a file once
+        self._cached_bytes = 0
+        self.stats = {"hits": 0, "memory_hits": 0, "misses": 0}
+
+    async def lookup(self, path: Path, stat_result: os.stat_result) -> FileEntry:
+        key = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+        entry = self._entries.get(path)
+        if entry is not None and entry.key == key:
+            self._entries.move_to_end(path)
+            self.stats["hits"] += 1
+            if entry.content is not None:
+                self.stats["memory_hits"] += 1
+            return entry
+
+        pending = self._pending.get((path, key))
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = self._pending[(path, key)] = asyncio.get_running_loop().create_future()
+        try:
+            self.stats["misses"] += 1
+            entry = await anyio.to_thread.run_sync(self._load, path, key, stat_result.st_mtime)
+            self._store(path, entry)
+            future.set_result(entry)
+            return entry
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._pending[(path, key)]
+
+    def _load(self, path: Path, key: tuple, mtime: float) -> FileEntry:
+        inode, mtime_ns, size = key
+        content = None
+        if size <= self.small_file_max:
+            content = path.read_bytes()
+            digest = hashlib.sha256(content).hexdigest()
+            if len(content) != size:  # Changed while being read; the next request reloads it
+                content = None
+        elif size <= HASH_MAX:
+            sha256 = hashlib.sha256()
+            with open(path, "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    sha256.update(chunk)
+            digest = sha256.hexdigest()
+        else:
+            digest = f"{inode:x}-{mtime_ns:x}-{size:x}"
+        return FileEntry(key, f'"{digest[:32]}"', formatdate(mtime, usegmt=True), mtime, content)
+
+    def _store(self, path: Path, entry: FileEntry):
+        old = self._entries.pop(path, None)
+        if old is not None and old.content is not None:
+            self._cached_bytes -= len(old.content)
+        self._entries[path] = entry
+        if entry.content is not None:
+            self._cached_bytes += len(entry.content)
+        # Drop file contents (oldest first) past the byte budget, whole entries past MAX_ENTRIES
+        for cached in self._entries.values():
+            if self._cached_bytes <= self.memory_bytes:
+                break
+            if cached.content is not None and cached is not entry:
+                self._cached_bytes -= len(cached.content)
+                cached.content = None
+        while len(self._entries) > MAX_ENTRIES:
+            _, evicted = self._entries.popitem(last=False)
+            if evicted.content is not None:
+                self._cached_bytes -= len(evicted.content)
+
+
+cache = StaticFileCache()
+
+
+def resolve_static(filename: str, root: Path = STATIC_DIR) -> Path:
+    """
+    Maps a request path to a regular file inside `root`; anything that
+    escapes it (`..`, absolute paths, symlinks out) is a 404.
+    """
+    root = root.resolve()
+    try:
+        path = (root / filename).resolve()
+    except (OSError, ValueError):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    if not path.is_relative_to(root) or not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    return path
+
+
+def not_modified(request: Request, entry: FileEntry) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or entry.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(entry.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def parse_ranges(header: str, size: int):
+    """
+    Parses `bytes=a-b,c-,-n` into sorted, merged (start, end) pairs with an
+    exclusive end. Returns None for a header that should be ignored (the whole
+    file is sent) and [] when no range is satisfiable (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec or spec.count(",") >= MAX_RANGES:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        first, dash, last = part.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                if last and int(last) < start:
+                    return None
+                end = min(int(last) + 1, size) if last else size
+            else:
+                length = int(last)  # Suffix range: the last `length` bytes
+                if length == 0:
+                    continue
+                start, end = max(size - length, 0), size
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class StaticFileResponse(FileResponse):
+    chunk_size = CHUNK_SIZE
+
+
+def memory_response(request: Request, entry: FileEntry, headers: dict, media_type: str) -> Response:
+    """
+    Full, single-range or multi-range response for a file held in memory.
+    """
+    content, size = entry.content, len(entry.content)
+    ranges = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header is not None and (if_range is None or if_range in (entry.etag, entry.last_modified)):
+        ranges = parse_ranges(range_header, size)
+    if ranges is None:
+        return Response(content, headers=headers, media_type=media_type)
+    if not ranges:
+        return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers={"Content-Range": f"bytes */{size}"})
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        return Response(content[start:end], status_code=status.HTTP_206_PARTIAL_CONTENT, media_type=media_type,
+                        headers={**headers, "Content-Range": f"bytes {start}-{end - 1}/{size}"})
+    boundary = hashlib.md5(entry.etag.encode(), usedforsecurity=False).hexdigest()
+    parts = []
+    for start, end in ranges:
+        parts.append(f"--{boundary}\r\nContent-Type: {media_type}\r\nContent-Range: bytes {start}-{end - 1}/{size}\r\n\r\n".encode())
+        parts.append(content[start:end])
+        parts.append(b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return Response(b"".join(parts), status_code=status.HTTP_206_PARTIAL_CONTENT, headers=headers,
+                    media_type=f"multipart/byteranges; boundary={boundary}")
+
+
+async def serve(request: Request, filename: str, root: Path = STATIC_DIR) -> Response:
+    path = resolve_static(filename, root)
+    stat_result = os.stat(path)
+    entry = await cache.lookup(path, stat_result)
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": entry.last_modified,
+        "Cache-Control": f"public, max-age={MAX_AGE}",
+        "Accept-Ranges": "bytes",
+    }
+    if not_modified(request, entry):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    media_type = guess_type(path.name)[0] or "application/octet-stream"
+    if entry.content is not None:
+        quoted = quote(path.name)
+        headers["Content-Disposition"] = (
+            f'attachment; filename="{path.name}"' if quoted == path.name else f"attachment; filename*=utf-8''{quoted}"
+        )
+        return memory_response(request, entry, headers, media_type)
+    # Starlette handles Range / If-Range against our ETag and sends via pathsend where supported
+    return StaticFileResponse(path, headers=headers, media_type=media_type, filename=path.name, stat_result=stat_result)
@@ -0,0 +1,182 @@
+# streaming.py
+# Async streaming helpers: a producer (any async iterator) runs as its own
+# task behind a bounded queue, so a slow client pushes back on production and
+# whatever queued up meanwhile is sent as one batched chunk. Idle streams get
+# heartbeat frames, and a client disconnect cancels the producer. No thread is
+# held per open stream.
+import os
+import json
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT", "15"))   # Seconds without data before a heartbeat frame
+STREAM_BUFFER = int(os.getenv("STREAM_BUFFER", "64"))             # Items a producer may run ahead of the client
+MAX_BATCH = 64                                                    # Items coalesced into one chunk
+
+stats = {"active": 0, "started": 0, "completed": 0, "disconnected": 0, "errors": 0}
+
+
+@dataclass
+class Event:
+    """
+    A server-sent event with an optional name and id; plain items are sent as `data` only.
+    """
+    data: Any
+    event: str | None = None
+    id: str | None = None
+
+
+def encode_json(item: Any) -> str:
+    # One compact encoding for every format, so SSE data and NDJSON lines match
+    return json.dumps(item, separators=(",", ":"))
+
+
+def sse_event(data: Any, event: str | None = None, id: str | None = None) -> str:
+    text = data if isinstance(data, str) else encode_json(data)
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    if id is not None:
+        lines.append(f"id: {id}")
+    lines.extend(f"data: {line}" for line in text.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+def ndjson_line(item: Any) -> str:
+    return encode_json(item) + "\n"
+
+
+@dataclass
+class StreamFormat:
+    media_type: str
+    encode: Callable[[Any], str]
+    heartbeat: str | None           # Frame sent when idle; None disables heartbeats
+    error: Callable[[Exception], str]
+
+
+def _encode_sse(item: Any) -> str:
+    if isinstance(item, Event):
+        return sse_event(item.data, item.event, item.id)
+    return sse_event(item)
+
+
+SSE = StreamFormat("text/event-stream", _encode_sse, ": ping\n\n", lambda e: sse_event({"detail": str(e)}, event="error"))
+NDJSON = StreamFormat("application/x-ndjson", ndjson_line, "\n", lambda e: ndjson_line({"error": str(e)}))  # Readers skip blank lines
+TEXT = StreamFormat("text/plain", str, None, lambda e: f"error: {e}\n")
+
+_END = object()
+_GONE = object()   # The client disconnected
+
+
+class _Failed:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+async def _watch_disconnect(request: Request, producer: asyncio.Task, queue: asyncio.Queue):
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            producer.cancel()
+            while not queue.empty():  # Nobody will read these; make room to wake the consumer
+                queue.get_nowait()
+            queue.put_nowait(_GONE)
+            return
+
+
+async def pipeline(
+    request: Request,
+    source: AsyncIterator,
+    format: StreamFormat,
+    heartbeat: float | None = HEARTBEAT_INTERVAL,
+    buffer: int = STREAM_BUFFER,
+    max_batch: int = MAX_BATCH,
+):
+    """
+    Yields encoded chunks from `source`, batching items that queued up while
+    the previous chunk was being sent.
+    """
+    queue = asyncio.Queue(buffer)
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put(item)
+            await queue.put(_END)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Stream producer failed")
+            await queue.put(_Failed(e))
+
+    producer = asyncio.create_task(produce())
+    # Starlette cancels the response on disconnect for ASGI < 2.4 servers (uvicorn);
+    # newer ones only fail the next send, so watch for the disconnect here
+    spec_version = tuple(map(int, request.scope.get("asgi", {}).get("spec_version", "2.0").split(".")))
+    watcher = asyncio.create_task(_watch_disconnect(request, producer, queue)) if spec_version >= (2, 4) else None
+    heartbeat_frame = format.heartbeat if heartbeat else None
+    stats["active"] += 1
+    stats["started"] += 1
+    finished = False
+    try:
+        while True:
+            try:
+                if heartbeat_frame is None:
+                    item = await queue.get()
+                else:
+                    async with asyncio.timeout(heartbeat):
+                        item = await queue.get()
+            except TimeoutError:
+                yield heartbeat_frame
+                continue
+            if item is _GONE:
+                break
+            parts = []
+            while True:
+                if item is _END:
+                    finished = True
+                elif isinstance(item, _Failed):
+                    stats["errors"] += 1
+                    parts.append(format.error(item.error))
+                    finished = True
+                else:
+                    parts.append(format.encode(item))
+                if finished or len(parts) >= max_batch or queue.empty():
+                    break
+                item = queue.get_nowait()
+                if item is _GONE:
+                    return
+            if parts:
+                yield "".join(parts)
+            if finished:
+                break
+    finally:
+        stats["active"] -= 1
+        if finished:
+            stats["completed"] += 1
+        else:
+            stats["disconnected"] += 1
+        producer.cancel()
+        if watcher is not None:
+            watcher.cancel()
+
+
+def stream_response(
+    request: Request,
+    source: AsyncIterator,
+    format: StreamFormat = SSE,
+    heartbeat: float | None = HEARTBEAT_INTERVAL,
+    buffer: int = STREAM_BUFFER,
+) -> StreamingResponse:
+    return StreamingResponse(
+        pipeline(request, source, format, heartbeat, buffer),
+        media_type=format.media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,123 @@
+# Standalone checks for the verified-principal cache in authentication.py:
+# role changes, deletions and rollbacks made through SessionLocal, and a user
+# lookup that races with an invalidation.
+#
+# Runs the app in-process (TestClient) against a throwaway test.db in a temp
+# folder, so no server is needed.
+#
+# Usage: python test_auth_cache.py
+import os
+import uuid
+import tempfile
+
+os.chdir(tempfile.mkdtemp(prefix="auth_cache_test_"))  # authentication.py opens ./test.db on import
+
+from fastapi.testclient import TestClient
+
+from auth_cache import Principal
+from authentication import app, principal_cache, load_principal, SessionLocal, User
+
+test_counter = 0
+passed = 0
+failed = 0
+
+
+def run_test(description, func):
+    global test_counter, passed, failed
+    test_counter += 1
+    try:
+        result = func()
+        if not result:
+            raise AssertionError(f"Failed: {description}")
+        print(f"Test {test_counter} PASS: {description}")
+        passed += 1
+    except AssertionError as e:
+        print(f"Test {test_counter} FAIL: {description} - {e}")
+        failed += 1
+
+
+client = TestClient(app)
+
+
+def register(role):
+    username = f"u{uuid.uuid4().hex[:8]}"
+    resp = client.post("/register", json={"username": username, "email": f"{username}@example.com", "password": "password123", "role": role})
+    token = resp.json()["access_token"]
+    with SessionLocal() as db:
+        user_id = db.query(User).filter(User.username == username).first().id
+    return token, user_id
+
+
+def auth_header(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def can_create(token):
+    return client.post("/documents", json={"title": "T", "content": "C"}, headers=auth_header(token)).status_code
+
+
+def set_role(user_id, role, commit=True):
+    with SessionLocal() as db:
+        db.get(User, user_id).role = role
+        db.flush()
+        if commit:
+            db.commit()
+        else:
+            db.rollback()
+
+
+def main():
+    # Role change: the committed update drops the cached principal
+    token, user_id = register("editor")
+    run_test("Editor can create document", lambda: can_create(token) == 200)
+    run_test("Principal is cached", lambda: principal_cache.get(token) is not None)
+    set_role(user_id, "user")
+    run_test("Role change invalidates the cached principal", lambda: principal_cache.get(token) is None)
+    run_test("Demoted user is refused", lambda: can_create(token) == 403)
+
+    # Rollback: nothing committed, so the cached principal stays
+    token, user_id = register("editor")
+    can_create(token)
+    set_role(user_id, "user", commit=False)
+    run_test("Rolled-back role change keeps the cached principal", lambda: principal_cache.get(token) is not None)
+    run_test("Rolled-back user keeps the old role", lambda: can_create(token) == 200)
+
+    # Deletion: the token stops working at once
+    token, user_id = register("user")
+    client.get("/documents", headers=auth_header(token))
+    with SessionLocal() as db:
+        db.delete(db.get(User, user_id))
+        db.commit()
+    run_test("Deletion invalidates the cached principal", lambda: principal_cache.get(token) is None)
+    run_test("Deleted user's token is refused", lambda: client.get("/documents", headers=auth_header(token)).status_code == 401)
+
+    # Race: an invalidation commits between the user read and the cache put
+    token, user_id = register("editor")
+    principal_cache.invalidate_user(user_id)
+    original_put = principal_cache.put
+
+    def put_after_role_change(*args, **kwargs):
+        set_role(user_id, "user")
+        return original_put(*args, **kwargs)
+
+    principal_cache.put = put_after_role_change
+    try:
+        stale = load_principal(token)
+    finally:
+        principal_cache.put = original_put
+    run_test("Racing lookup still returns the row it read", lambda: stale.role == "editor")
+    run_test("Racing lookup is not cached", lambda: principal_cache.get(token) is None)
+    run_test("Next lookup sees the new role", lambda: can_create(token) == 403)
+
+    # Unrelated invalidations do not block caching
+    token, user_id = register("user")
+    generation = principal_cache.generation()
+    principal_cache.invalidate_user(user_id + 1000)
+    principal_cache.put(token, Principal(id=user_id, username="user", role="user"), None, generation)
+    run_test("Other users' invalidations do not block caching", lambda: principal_cache.get(token) is not None)
+
+    print(f"\nExecuted {test_counter} tests: {passed} passed, {failed} failed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Standalone checks for the append-only user store (user_store.py): a record
+# torn by a crashed writer at the end of the log, followed by new appends.
+#
+# Works on a throwaway log in a temp folder.
+#
+# Usage: python test_user_store.py
+import json
+import tempfile
+from pathlib import Path
+
+from user_store import UserStore
+
+test_counter = 0
+passed = 0
+failed = 0
+
+
+def run_test(description, func):
+    global test_counter, passed, failed
+    test_counter += 1
+    try:
+        result = func()
+        if not result:
+            raise AssertionError(f"Failed: {description}")
+        print(f"Test {test_counter} PASS: {description}")
+        passed += 1
+    except AssertionError as e:
+        print(f"Test {test_counter} FAIL: {description} - {e}")
+        failed += 1
+
+
+def user(name):
+    return {"username": name, "email": f"{name}@example.com", "password": "x"}
+
+
+def main():
+    path = Path(tempfile.mkdtemp(prefix="user_store_test_")) / "users.jsonl"
+    store = UserStore(path)
+    store.add(user("alice"))
+    store.flush()
+
+    # A writer crashed halfway through its record
+    with open(path, "ab") as f:
+        f.write(b'{"username":"torn","email":"torn@exam')
+
+    run_test("Torn tail is not indexed by readers", lambda: "torn@example.com" not in store and len(store) == 1)
+    run_test("Records before the torn tail still read", lambda: store.get("alice@example.com")["username"] == "alice")
+
+    store.add(user("bob"))
+    store.put(user("carol"))
+    run_test("Append after a torn tail reads back", lambda: store.get("bob@example.com")["username"] == "bob")
+    run_test("Second append after a torn tail reads back", lambda: store.get("carol@example.com")["username"] == "carol")
+    run_test("All records in append order", lambda: [u["username"] for u in store.all()] == ["alice", "bob", "carol"])
+    store.close()
+
+    run_test("Every line in the log is a complete record", lambda: all(json.loads(line) for line in path.read_bytes().splitlines()))
+    reopened = UserStore(path)
+    run_test("Reopened store indexes the same users", lambda: sorted(u["username"] for u in reopened.all()) == ["alice", "bob", "carol"])
+    reopened.close()
+
+    # A torn tail found on open is truncated before the next append
+    with open(path, "ab") as f:
+        f.write(b'{"username":"to')
+    reopened = UserStore(path)
+    reopened.add(user("dave"))
+    run_test("Append after repair on open reads back", lambda: reopened.get("dave@example.com")["username"] == "dave")
+    reopened.close()
+
+    print(f"\nExecuted {test_counter} tests: {passed} passed, {failed} failed.")
+
+
+if __name__ == "__main__":
+    main()
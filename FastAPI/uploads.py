@@ -0,0 +1,324 @@
+# uploads.py
+# Streaming file uploads: bodies are read in chunks, written to disk with async
+# file I/O and hashed as they arrive, so memory per upload stays at about one
+# chunk whatever the file size. Covers multipart form uploads (/uploadfile in
+# main.py) and resumable uploads (/uploads, offsets in the style of tus).
+import os
+import json
+import time
+import itertools
+import uuid
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from starlette.requests import ClientDisconnect
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+    from python_multipart.exceptions import MultipartParseError
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+    from multipart.exceptions import MultipartParseError
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+PARTIAL_DIR = UPLOAD_DIR / ".partial"             # Resumable uploads in progress
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024                          # Bytes buffered before each disk write
+SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+
+
+# OpenAPI request body for endpoints that read multipart uploads themselves
+MULTIPART_FILE_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object", "properties": {"file": {"type": "string", "format": "binary"}}, "required": ["file"],
+        }}},
+    }
+}
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def safe_filename(filename: str) -> str:
+    name = Path(filename.replace("\\", "/")).name
+    if name in ("", ".", ".."):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid filename")
+    return name
+
+
+def check_content_length(request: Request, max_bytes: int = MAX_UPLOAD_BYTES):
+    """
+    Rejects a malformed or declared oversized body before any of it is read.
+    """
+    length = request.headers.get("content-length")
+    if length is None:
+        return
+    if not length.isdigit():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Content-Length header")
+    if int(length) > max_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Upload exceeds {max_bytes} bytes")
+
+
+def store_unique(source: Path, directory: Path, filename: str) -> str:
+    """
+    Moves a finished upload into `directory` without replacing an existing
+    file: a taken name gets a -1, -2, ... suffix. Returns the stored name.
+    """
+    stem, suffix = Path(filename).stem, Path(filename).suffix
+    for attempt in itertools.count():
+        name = filename if attempt == 0 else f"{stem}-{attempt}{suffix}"
+        try:
+            os.link(source, directory / name)  # Fails instead of replacing, unlike os.replace
+        except FileExistsError:
+            continue
+        source.unlink()
+        return name
+
+
+class ChunkSink:
+    """
+    Appends to a file in CHUNK_SIZE writes, keeping the size and SHA-256 up
+    to date. Raises UploadTooLarge as soon as `max_bytes` is passed.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = MAX_UPLOAD_BYTES, size: int = 0, sha256=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = size
+        self.sha256 = sha256 or hashlib.sha256()
+        self._buffer = bytearray()
+        self._file = None
+
+    async def write(self, data: bytes):
+        if self.size + len(self._buffer) + len(data) > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+        self._buffer += data
+        if len(self._buffer) >= CHUNK_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        if self._file is None:
+            self._file = await anyio.open_file(self.path, "ab")
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        await self._file.write(chunk)
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+
+    async def close(self):
+        try:
+            await self.flush()
+        finally:
+            if self._file is not None:
+                await self._file.aclose()
+                self._file = None
+
+
+async def stream_multipart(request: Request, directory: Path = UPLOAD_DIR, max_bytes: int = MAX_UPLOAD_BYTES) -> list[dict]:
+    """
+    Parses a multipart/form-data body as it arrives and streams each file part
+    to `directory`. Returns {"field", "filename", "size", "sha256"} per file.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected multipart/form-data")
+    check_content_length(request, max_bytes)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # The parser's callbacks are synchronous: collect events per network chunk, then handle them
+    events = []
+    header = {"field": b"", "value": b""}
+    headers = {}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        headers[header["field"].lower()] = header["value"]
+        header["field"], header["value"] = b"", b""
+
+    callbacks = {
+        "on_part_begin": lambda: headers.clear(),
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": lambda: events.append(("begin", dict(headers))),
+        "on_part_data": lambda data, start, end: events.append(("data", bytes(data[start:end]))),
+        "on_part_end": lambda: events.append(("end", None)),
+    }
+    parser = MultipartParser(params[b"boundary"], callbacks)
+    results, sink, part = [], None, None
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes + 64 * 1024:  # Room for part headers and boundaries
+                raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+            parser.write(chunk)
+            for kind, value in events:
+                if kind == "begin":
+                    _, disposition = parse_options_header(value.get(b"content-disposition", b""))
+                    if b"filename" in disposition:
+                        part = {"field": disposition.get(b"name", b"").decode(), "filename": safe_filename(disposition[b"filename"].decode())}
+                        part["temp"] = directory / f".{uuid.uuid4().hex}.part"
+                        sink = ChunkSink(part["temp"], max_bytes)
+                elif kind == "data" and sink is not None:
+                    await sink.write(value)
+                elif kind == "end" and sink is not None:
+                    await sink.close()
+                    part["filename"] = store_unique(part["temp"], directory, part["filename"])
+                    results.append({"field": part["field"], "filename": part["filename"], "size": sink.size, "sha256": sink.sha256.hexdigest()})
+                    sink, part = None, None
+            events.clear()
+        parser.finalize()
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except MultipartParseError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Malformed multipart body: {e}")
+    finally:
+        if sink is not None:  # Aborted mid-part
+            await sink.close()
+            part["temp"].unlink(missing_ok=True)
+    return results
+
+
+# --- Resumable uploads ---
+# POST /uploads with Upload-Length (and ?filename=) creates a session; each
+# PATCH /uploads/{id} carries Upload-Offset and appends its body; HEAD reports
+# the offset to resume from after a dropped connection. The upload is moved
+# into UPLOAD_DIR once Upload-Length bytes have arrived (renamed like multipart
+# uploads if the name is taken).
+
+router = APIRouter(prefix="/uploads", tags=["Files"])
+
+_hashers = {}   # upload id -> sha256 of the bytes received so far (rebuilt from disk after a restart)
+_locks = {}     # upload id -> asyncio.Lock; one PATCH at a time per upload
+
+
+def _session_paths(upload_id: str):
+    try:
+        uuid.UUID(hex=upload_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return PARTIAL_DIR / f"{upload_id}.json", PARTIAL_DIR / f"{upload_id}.data"
+
+
+def _load_session(upload_id: str) -> dict:
+    meta_path, data_path = _session_paths(upload_id)
+    if not meta_path.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    session = json.loads(meta_path.read_text())
+    session["offset"] = data_path.stat().st_size if data_path.exists() else 0
+    return session
+
+
+def _hash_file(path: Path):
+    sha256 = hashlib.sha256()
+    if path.exists():
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                sha256.update(chunk)
+    return sha256
+
+
+def _last_activity(meta_path: Path) -> float:
+    # The .json is written once at create; every PATCH appends to the .data
+    data_path = meta_path.with_suffix(".data")
+    mtime = meta_path.stat().st_mtime
+    return max(mtime, data_path.stat().st_mtime) if data_path.exists() else mtime
+
+
+def _expire_sessions():
+    cutoff = time.time() - SESSION_TTL
+    for meta_path in PARTIAL_DIR.glob("*.json"):
+        try:
+            idle = _last_activity(meta_path) < cutoff
+        except FileNotFoundError:  # Completed or expired by another request meanwhile
+            continue
+        if idle:
+            meta_path.with_suffix(".data").unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+            _hashers.pop(meta_path.stem, None)
+
+
+@router.post("", status_code=status.HTTP_201_CREATED, summary="Start Resumable Upload")
+async def create_upload(request: Request, filename: str):
+    """Creates an upload session; the total size comes from the Upload-Length header."""
+    try:
+        length = int(request.headers["upload-length"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload-Length header required")
+    if length > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+    PARTIAL_DIR.mkdir(parents=True, exist_ok=True)
+    await anyio.to_thread.run_sync(_expire_sessions)
+    upload_id = uuid.uuid4().hex
+    meta_path, _ = _session_paths(upload_id)
+    meta_path.write_text(json.dumps({"filename": safe_filename(filename), "length": length}))
+    return {"upload_id": upload_id, "offset": 0, "length": length}
+
+
+@router.head("/{upload_id}", summary="Resumable Upload Offset")
+async def upload_offset(upload_id: str):
+    session = _load_session(upload_id)
+    return Response(headers={"Upload-Offset": str(session["offset"]), "Upload-Length": str(session["length"])})
+
+
+@router.patch("/{upload_id}", summary="Append To Resumable Upload")
+async def append_upload(upload_id: str, request: Request):
+    """Appends the request body at Upload-Offset, which must equal the bytes received so far."""
+    lock = _locks.setdefault(upload_id, asyncio.Lock())
+    if lock.locked():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another request is appending to this upload")
+    try:
+        async with lock:
+            return await _append(upload_id, request)
+    finally:
+        _locks.pop(upload_id, None)
+
+
+async def _append(upload_id: str, request: Request):
+    session = _load_session(upload_id)
+    _, data_path = _session_paths(upload_id)
+    remaining = session["length"] - session["offset"]
+    if request.headers.get("upload-offset") != str(session["offset"]):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Offset mismatch", headers={"Upload-Offset": str(session["offset"])})
+    check_content_length(request, remaining)
+
+    sha256 = _hashers.get(upload_id)
+    if sha256 is None:
+        sha256 = await anyio.to_thread.run_sync(_hash_file, data_path)
+    sink = ChunkSink(data_path, session["length"], size=session["offset"], sha256=sha256)
+    try:
+        async for chunk in request.stream():
+            await sink.write(chunk)
+    except UploadTooLarge:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Body exceeds Upload-Length")
+    except ClientDisconnect:
+        logger.info(f"Upload {upload_id} interrupted; the client can resume from HEAD's Upload-Offset")
+    finally:
+        await sink.close()  # Keep what arrived; the client resumes from HEAD's offset
+        _hashers[upload_id] = sink.sha256
+
+    if sink.size < session["length"]:
+        return {"upload_id": upload_id, "offset": sink.size, "length": session["length"], "complete": False}
+    meta_path, _ = _session_paths(upload_id)
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    filename = store_unique(data_path, UPLOAD_DIR, session["filename"])
+    meta_path.unlink(missing_ok=True)
+    _hashers.pop(upload_id, None)
+    return {"filename": filename, "size": sink.size, "sha256": sink.sha256.hexdigest(), "complete": True}
@@ -0,0 +1,294 @@
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+USER_STORE = os.getenv("USER_STORE", "db/users.jsonl")
+SYNC_INTERVAL = float(os.getenv("USER_STORE_SYNC_INTERVAL", "0.05"))  # Max seconds an append waits for fsync
+SYNC_EVERY = int(os.getenv("USER_STORE_SYNC_EVERY", "256"))           # ...or this many appends, whichever is first
+COMPACT_MIN_GARBAGE = 10000   # Compact once superseded records exceed this and the live count
+READ_CHUNK = 1 << 20
+
+
+def email_key(email: str) -> str:
+    return email.strip().lower()
+
+
+class UserStore:
+    """
+    Users as an append-only JSON-lines log with an in-memory index from email
+    to the offset of its latest record, so a registration is one append and a
+    lookup one seek, whatever the number of users.
+
+    - Appends are fsynced in batches (every SYNC_INTERVAL seconds or SYNC_EVERY
+      records), so a crash can lose at most that window; `flush()` forces it.
+    - Writers from several worker processes serialize on an exclusive lock on
+      `<path>.lock` and first read any records the others appended.
+    - Updates and deletes append a new record / tombstone; `compact()` rewrites
+      only live records to a temp file and swaps it in with `os.replace`.
+      Other processes notice the new inode and reload.
+    """
+
+    def __init__(self, path=USER_STORE, legacy_json=None, sync_interval: float = SYNC_INTERVAL, sync_every: int = SYNC_EVERY):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.sync_interval = sync_interval
+        self.sync_every = sync_every
+        self._lock = threading.RLock()
+        self._lock_fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._fd = None
+        self._reader = None
+        self._pending = 0
+        with self._lock, self._exclusive():
+            if not self.path.exists() and legacy_json and Path(legacy_json).exists():
+                self._import_json(Path(legacy_json))
+            self._open(repair=True)
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="user-store-fsync", daemon=True)
+        self._flusher.start()
+
+    @contextmanager
+    def _exclusive(self):
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        else:
+            os.lseek(self._lock_fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._lock_fd, msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._lock_fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._lock_fd, msvcrt.LK_UNLCK, 1)
+
+    def _open(self, repair: bool = False):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._reader.close()
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._reader = open(self.path, "rb")
+        self._inode = os.fstat(self._fd).st_ino
+        self._index = {}   # email key -> offset of its latest record
+        self._garbage = 0  # Superseded records and tombstones
+        self._end = 0      # Offset up to which the log has been indexed
+        self._catch_up(repair)
+
+    def _catch_up(self, repair: bool = False):
+        """
+        Indexes records appended since the last call (by this or another
+        process); reloads if the log was compacted elsewhere. Indexing stops at
+        the last complete line. Writers pass `repair`: under the exclusive lock
+        no append is in progress, so an incomplete tail is a crashed writer's
+        torn record and is truncated before anything is appended after it.
+        """
+        try:
+            if os.stat(self.path).st_ino != self._inode:
+                self._open()
+                return
+        except FileNotFoundError:
+            return
+        size = os.fstat(self._reader.fileno()).st_size
+        if size <= self._end:
+            return
+        self._reader.seek(self._end)
+        offset = self._end
+        tail = b""
+        while True:
+            chunk = self._reader.read(READ_CHUNK)
+            if not chunk:
+                break
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()  # Incomplete last line (being written by a process outside the lock, or torn by a crash)
+            for line in lines:
+                if line:
+                    self._index_record(json.loads(line), offset)
+                offset += len(line) + 1
+        self._end = offset
+        if tail and repair:
+            logger.warning(f"Truncating {len(tail)} bytes of an incomplete record at the end of {self.path}.")
+            os.ftruncate(self._fd, self._end)
+
+    def _index_record(self, record: dict, offset: int):
+        key = email_key(record["email"])
+        if key in self._index:
+            self._garbage += 1
+        if record.get("_deleted"):
+            self._garbage += 1
+            self._index.pop(key, None)
+        else:
+            self._index[key] = offset
+
+    def _append(self, records: list):
+        lines = [json.dumps(r, ensure_ascii=False, separators=(",", ":")).encode() + b"\n" for r in records]
+        data = b"".join(lines)
+        written = 0
+        while written < len(data):
+            written += os.write(self._fd, data[written:])
+        for record, line in zip(records, lines):
+            self._index_record(record, self._end)
+            self._end += len(line)
+        self._pending += len(records)
+        if self._pending >= self.sync_every:
+            self._sync()
+        if self._garbage >= max(COMPACT_MIN_GARBAGE, len(self._index)):
+            self._compact()
+
+    def _sync(self):
+        os.fsync(self._fd)
+        self._pending = 0
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.sync_interval):
+            with self._lock:
+                if self._pending and not self._closed.is_set():
+                    self._sync()
+
+    def _read(self, offset: int) -> dict:
+        self._reader.seek(offset)
+        return json.loads(self._reader.readline())
+
+    def add(self, user: dict):
+        """
+        Appends a new user. Raises ValueError if the email is already registered.
+        """
+        self.add_many([user])
+
+    def add_many(self, users: list):
+        keys = [email_key(u["email"]) for u in users]
+        with self._lock, self._exclusive():
+            self._catch_up(repair=True)
+            taken = [k for k in keys if k in self._index]
+            if taken or len(set(keys)) != len(keys):
+                raise ValueError(f"Email already registered: {taken[0] if taken else 'duplicate in batch'}")
+            self._append(users)
+
+    def put(self, user: dict):
+        """
+        Inserts or replaces the user with this email.
+        """
+        with self._lock, self._exclusive():
+            self._catch_up(repair=True)
+            self._append([user])
+
+    def delete(self, email: str) -> bool:
+        with self._lock, self._exclusive():
+            self._catch_up(repair=True)
+            if email_key(email) not in self._index:
+                return False
+            self._append([{"email": email, "_deleted": True}])
+            return True
+
+    def get(self, email: str):
+        with self._lock:
+            self._catch_up()
+            offset = self._index.get(email_key(email))
+            return None if offset is None else self._read(offset)
+
+    def __contains__(self, email: str) -> bool:
+        with self._lock:
+            self._catch_up()
+            return email_key(email) in self._index
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._catch_up()
+            return len(self._index)
+
+    def all(self) -> list:
+        with self._lock:
+            self._catch_up()
+            return [self._read(offset) for offset in sorted(self._index.values())]
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._sync()
+
+    def compact(self):
+        with self._lock, self._exclusive():
+            self._catch_up(repair=True)
+            self._compact()
+
+    def _compact(self):
+        # Caller holds both locks and has caught up
+        temp = self.path.with_name(self.path.name + ".compact")
+        index, offset = {}, 0
+        with open(temp, "wb") as f:
+            for key, old in sorted(self._index.items(), key=lambda item: item[1]):
+                self._reader.seek(old)
+                line = self._reader.readline()
+                f.write(line)
+                index[key] = offset
+                offset += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path)
+        if os.name != "nt":
+            directory = os.open(self.path.parent, os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+        logger.info(f"Compacted {self.path}: {self._garbage} superseded records dropped, {len(index)} kept.")
+        self._open()
+        self._pending = 0
+
+    def _import_json(self, legacy: Path):
+        # One-time migration from the old JSON array file; the first record per email wins
+        try:
+            users = json.loads(legacy.read_text(encoding="utf-8") or "[]")
+        except json.JSONDecodeError:
+            users = []
+        unique, skipped = {}, 0
+        for user in users if isinstance(users, list) else []:
+            if not isinstance(user, dict) or not isinstance(user.get("email"), str) or not user["email"].strip():
+                skipped += 1
+                continue
+            unique.setdefault(email_key(user["email"]), user)
+        if skipped:
+            logger.warning(f"Skipped {skipped} legacy records without an email in {legacy}.")
+        temp = self.path.with_name(self.path.name + ".import")
+        with open(temp, "w", encoding="utf-8") as f:
+            for user in unique.values():
+                f.write(json.dumps(user, ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path)
+        logger.info(f"Imported {len(unique)} users from {legacy} into {self.path}.")
+
+    def close(self):
+        self._closed.set()
+        self._flusher.join()
+        with self._lock:
+            if self._pending:
+                self._sync()
+            os.close(self._fd)
+            self._reader.close()
+            os.close(self._lock_fd)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_user_store(path=USER_STORE, legacy_json=None) -> UserStore:
+    """
+    One UserStore per path per process.
+    """
+    with _stores_lock:
+        store = _stores.get(str(path))
+        if store is None:
+            store = _stores[str(path)] = UserStore(path, legacy_json=legacy_json)
+        return store
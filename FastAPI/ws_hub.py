@@ -0,0 +1,285 @@
+# ws_hub.py
+# WebSocket hub: a registry of connected clients, rooms, and broadcast that
+# never waits on a slow client. Each client has a bounded send queue drained
+# by its own sender task; when the queue is full the message is dropped or
+# the client is disconnected (WS_SLOW_CLIENT). One keepalive task pings every
+# client and closes those that stay silent. With a pub/sub backend, messages
+# published in one worker process reach the clients of all workers.
+import os
+import glob
+import json
+import time
+import socket
+import asyncio
+import logging
+import itertools
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+logger = logging.getLogger(__name__)
+
+SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "256"))                # Messages buffered per client
+SLOW_CLIENT = os.getenv("WS_SLOW_CLIENT", "drop")                    # drop | disconnect, when a client's queue is full
+PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))
+PONG_TIMEOUT = float(os.getenv("WS_PONG_TIMEOUT", "20"))             # Silence allowed after a ping before closing
+PUBSUB_DIR = os.getenv("WS_PUBSUB_DIR")                             # Set to enable cross-worker fan-out (LocalPubSub)
+CLOSE_TRY_AGAIN_LATER = 1013
+
+_ids = itertools.count(1)
+
+
+class Client:
+    def __init__(self, websocket: WebSocket, queue_size: int = SEND_QUEUE):
+        self.id = next(_ids)
+        self.websocket = websocket
+        self.rooms = set()
+        self.queue = asyncio.Queue(queue_size)
+        self.last_seen = time.monotonic()
+        self.dropped = 0
+        self.sender = None
+        self.closing = False
+
+
+class MemoryPubSub:
+    """
+    Single-process backend: publishing is delivering.
+    """
+
+    async def start(self, deliver):
+        self.deliver = deliver
+
+    async def publish(self, room, message: str):
+        self.deliver(room, message)
+
+    async def close(self):
+        pass
+
+
+class LocalPubSub:
+    """
+    Fan-out between worker processes on one host: each worker binds a Unix
+    datagram socket in `directory` and a publish is sent to every socket
+    there. Messages must fit in one datagram (about 200 KB on Linux).
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f"ws-hub-{os.getpid()}.sock")
+        self.transport = None
+        self.sender = None
+
+    async def start(self, deliver):
+        self.deliver = deliver
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        pubsub = self
+
+        class Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                try:
+                    envelope = json.loads(data)
+                    room, message = envelope["room"], envelope["message"]
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Dropped malformed pub/sub datagram: {e!r}")
+                    return
+                pubsub.deliver(room, message)
+
+        self.transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            Protocol, local_addr=self.path, family=socket.AF_UNIX
+        )
+        # Sends go through a plain non-blocking socket: unlike the transport's
+        # sendto, it raises per peer, so stale sockets can be found and removed
+        self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sender.setblocking(False)
+
+    async def publish(self, room, message: str):
+        data = json.dumps({"room": room, "message": message}).encode()
+        self.deliver(room, message)
+        for peer in glob.glob(os.path.join(self.directory, "ws-hub-*.sock")):
+            if peer == self.path:
+                continue
+            try:
+                self.sender.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.unlink(peer)  # A worker that exited without cleaning up
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                logger.warning(f"Pub/sub peer {peer} is not keeping up; message dropped.")
+
+    async def close(self):
+        if self.transport is not None:
+            self.transport.close()
+        if self.sender is not None:
+            self.sender.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class Hub:
+    def __init__(self, pubsub=None, queue_size: int = SEND_QUEUE, slow_client: str = SLOW_CLIENT,
+                 ping_interval: float = PING_INTERVAL, pong_timeout: float = PONG_TIMEOUT):
+        self.pubsub = pubsub or (LocalPubSub(PUBSUB_DIR) if PUBSUB_DIR else MemoryPubSub())
+        self.queue_size = queue_size
+        self.slow_client = slow_client
+        self.ping_interval = ping_interval
+        self.pong_timeout = pong_timeout
+        self.clients = {}   # id -> Client
+        self.rooms = {}     # room -> set of Clients
+        self.stats = {"connected": 0, "disconnected": 0, "delivered": 0, "dropped": 0, "slow_disconnects": 0, "timeouts": 0}
+        self._keepalive = None
+
+    async def start(self):
+        await self.pubsub.start(self._deliver)
+        self._keepalive = asyncio.create_task(self._keepalive_loop())
+
+    async def stop(self):
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+        for client in list(self.clients.values()):
+            await self._close(client, 1001)
+        await self.pubsub.close()
+
+    async def connect(self, websocket: WebSocket, rooms=()) -> Client:
+        await websocket.accept()
+        client = Client(websocket, self.queue_size)
+        self.clients[client.id] = client
+        for room in rooms:
+            self.join(client, room)
+        client.sender = asyncio.create_task(self._send_loop(client))
+        self.stats["connected"] += 1
+        return client
+
+    def disconnect(self, client: Client):
+        if self.clients.pop(client.id, None) is None:
+            return
+        for room in client.rooms:
+            members = self.rooms.get(room)
+            if members is not None:
+                members.discard(client)
+                if not members:
+                    del self.rooms[room]
+        client.rooms.clear()
+        if client.sender is not None and client.sender is not asyncio.current_task():
+            client.sender.cancel()
+        self.stats["disconnected"] += 1
+
+    def join(self, client: Client, room: str):
+        self.rooms.setdefault(room, set()).add(client)
+        client.rooms.add(room)
+
+    def leave(self, client: Client, room: str):
+        client.rooms.discard(room)
+        members = self.rooms.get(room)
+        if members is not None:
+            members.discard(client)
+            if not members:
+                del self.rooms[room]
+
+    def send(self, client: Client, message: str) -> bool:
+        """
+        Queues a message for one client without waiting. Returns False if it was dropped.
+        """
+        try:
+            client.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            if self.slow_client == "disconnect":
+                if not client.closing:
+                    client.closing = True
+                    self.stats["slow_disconnects"] += 1
+                    asyncio.create_task(self._close(client, CLOSE_TRY_AGAIN_LATER))
+            else:
+                client.dropped += 1
+                self.stats["dropped"] += 1
+            return False
+
+    async def broadcast(self, message, room: str = None):
+        """
+        Sends to every client in `room` (all clients when None) across workers.
+        Dicts are JSON-encoded once for all recipients.
+        """
+        if not isinstance(message, str):
+            message = json.dumps(message)
+        await self.pubsub.publish(room, message)
+
+    def _deliver(self, room, message: str):
+        # No awaits here, so the registry cannot change mid-loop
+        for client in self.clients.values() if room is None else self.rooms.get(room, ()):
+            self.send(client, message)
+
+    async def _send_loop(self, client: Client):
+        websocket = client.websocket
+        try:
+            while True:
+                message = await client.queue.get()
+                await websocket.send_text(message)
+                self.stats["delivered"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.disconnect(client)  # The socket is gone; the receive loop will notice too
+
+    async def _close(self, client: Client, code: int):
+        self.disconnect(client)
+        try:
+            await client.websocket.close(code)
+        except Exception:
+            pass
+
+    async def _keepalive_loop(self):
+        ping = json.dumps({"type": "ping"})
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            deadline = time.monotonic() - self.ping_interval - self.pong_timeout
+            for client in list(self.clients.values()):
+                if client.last_seen < deadline:
+                    self.stats["timeouts"] += 1
+                    await self._close(client, 1001)
+                else:
+                    self.send(client, ping)
+
+    async def serve(self, websocket: WebSocket, rooms=(), on_text=None):
+        """
+        Runs one connection until it closes. JSON messages of type join,
+        leave, publish and pong are handled here; other text goes to
+        `on_text(client, text)`. join, leave and publish need a "room";
+        without one the client gets an error message and stays connected.
+        Clients can only publish to a room; broadcasting to every connection
+        is left to server code (`broadcast(message)`).
+        """
+        client = await self.connect(websocket, rooms)
+        try:
+            while True:
+                text = await websocket.receive_text()
+                client.last_seen = time.monotonic()
+                command = None
+                if text.startswith("{"):
+                    try:
+                        command = json.loads(text)
+                    except ValueError:
+                        pass
+                kind = command.get("type") if isinstance(command, dict) else None
+                if kind == "pong":
+                    continue
+                elif kind in ("join", "leave", "publish"):
+                    room = command.get("room")
+                    if room is None or isinstance(room, (dict, list)):
+                        self.send(client, json.dumps({"type": "error", "detail": f"{kind} needs a room"}))
+                    elif kind == "join":
+                        self.join(client, str(room))
+                    elif kind == "leave":
+                        self.leave(client, str(room))
+                    else:
+                        room = str(room)
+                        await self.broadcast({"type": "message", "room": room, "from": client.id, "data": command.get("data")}, room)
+                elif on_text is not None:
+                    await on_text(client, text)
+        except WebSocketDisconnect:
+            pass
+        except RuntimeError:
+            pass  # The hub closed this socket (slow client or keepalive timeout)
+        finally:
+            self.disconnect(client)
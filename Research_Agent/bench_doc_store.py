@@ -0,0 +1,80 @@
+# Benchmark for the local research document store: recall@k vs latency
+# of the HNSW index against an exact scan over the memory-mapped vectors.
+#
+# Usage: python bench_doc_store.py --docs 20000 --queries 200 --k 5
+import time
+import random
+import argparse
+import tempfile
+
+import numpy as np
+
+from doc_store import DocStore
+
+
+def synthetic_corpus(n_docs: int, vocab_size: int = 5000, words_per_doc: int = 80, seed: int = 7):
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    topics = [rng.sample(vocab, 200) for _ in range(max(1, n_docs // 50))]
+    docs = []
+    for i in range(n_docs):
+        topic = topics[i % len(topics)]
+        words = [rng.choice(topic) if rng.random() < 0.7 else rng.choice(vocab) for _ in range(words_per_doc)]
+        docs.append({"title": f"Doc {i}", "url": f"https://example.org/doc/{i}", "text": " ".join(words)})
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    docs = synthetic_corpus(args.docs)
+    rng = random.Random(11)
+    queries = [" ".join(rng.sample(d["text"].split(), 12)) for d in rng.sample(docs, args.queries)]
+
+    with tempfile.TemporaryDirectory() as path:
+        store = DocStore(path)
+
+        # Incremental indexing: upsert in batches, as research turns would
+        start = time.perf_counter()
+        for i in range(0, len(docs), args.batch):
+            store.upsert(docs[i:i + args.batch])
+        elapsed = time.perf_counter() - start
+        print(f"Indexed {store.count} chunks in {elapsed:.2f}s ({store.count / elapsed:.0f} chunks/s)")
+
+        start = time.perf_counter()
+        store.upsert(docs[:args.batch])
+        print(f"Re-upsert of {args.batch} known chunks (fetched_at refresh only): {time.perf_counter() - start:.3f}s")
+
+        exact_results, exact_latency = [], []
+        for q in queries:
+            t = time.perf_counter()
+            exact_results.append({h["url"] for h in store.search(q, args.k, max_age=None, exact=True)})
+            exact_latency.append(time.perf_counter() - t)
+
+        print(f"\n{'mode':<12}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p95 ms':>10}")
+        print(f"{'exact':<12}{1.0:>10.3f}{np.percentile(exact_latency, 50) * 1000:>10.2f}{np.percentile(exact_latency, 95) * 1000:>10.2f}")
+
+        if store.index is None:
+            print("hnswlib not installed; only exact search was benchmarked.")
+            return
+
+        for ef in (16, 32, 64, 128, 256):
+            store.index.set_ef(ef)
+            hits, latency = 0, []
+            for q, truth in zip(queries, exact_results):
+                t = time.perf_counter()
+                found = {h["url"] for h in store.search(q, args.k, max_age=None)}
+                latency.append(time.perf_counter() - t)
+                hits += len(found & truth)
+            recall = hits / sum(len(t) for t in exact_results)
+            print(f"{'hnsw ef=' + str(ef):<12}{recall:>10.3f}{np.percentile(latency, 50) * 1000:>10.2f}{np.percentile(latency, 95) * 1000:>10.2f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List
+
+import numpy as np
+
+from retrieval import tokenize
+
+try:
+    import hnswlib  # Optional: approximate nearest-neighbour index
+except ImportError:  # pragma: no cover - falls back to exact search
+    hnswlib = None
+
+
+# Store settings
+STORE_DIR = os.getenv("RESEARCH_STORE_DIR", "research_store")
+EMBEDDING_DIM = 384
+STALE_AFTER_SECONDS = 7 * 24 * 3600   # Local results older than this trigger a live search
+MIN_LOCAL_HITS = 3                    # Fresh hits needed to skip live search
+MIN_LOCAL_SCORE = 0.35                # Cosine similarity a hit must reach to count
+INITIAL_CAPACITY = 1024
+SAVE_INDEX_EVERY = 2048               # New vectors between HNSW snapshots (also saved on close)
+
+
+class HashingEmbedder:
+    """
+    Local, model-free embeddings: unigrams and bigrams are hashed into a fixed
+    number of dimensions and L2-normalised, so cosine similarity is a dot product.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _bucket(self, feature: str):
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        return h % self.dim, 1.0 if h >> 63 else -1.0
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = tokenize(text)
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                index, sign = self._bucket(feature)
+                vectors[row, index] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class DocStore:
+    """
+    Persistent store of previously fetched research chunks.
+
+    - Chunk text and metadata live in SQLite (docs.db).
+    - Vectors live in a memory-mapped float32 matrix (vectors.f32), one row per chunk.
+    - An HNSW index (hnswlib) is maintained incrementally when available;
+      otherwise search falls back to an exact scan over the memory map.
+      The index is snapshotted to hnsw.bin after the SQLite commit every
+      SAVE_INDEX_EVERY new vectors and on close; rows missing from an older
+      snapshot are re-added from the memory map on open.
+    """
+
+    def __init__(self, path: str = STORE_DIR, embedder: HashingEmbedder | None = None, use_ann: bool = True):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(os.path.join(path, "docs.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                row INTEGER PRIMARY KEY,
+                key TEXT UNIQUE,
+                title TEXT,
+                url TEXT,
+                text TEXT,
+                fetched_at REAL
+            )
+            """
+        )
+        self.conn.commit()
+        self.count = self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        existing_rows = os.path.getsize(self._vectors_path) // (self.dim * 4) if os.path.exists(self._vectors_path) else 0
+        self._open_vectors(max(INITIAL_CAPACITY, existing_rows, self.count))
+
+        self.index = None
+        self._unsaved = 0
+        if use_ann and hnswlib is not None:
+            self._open_index()
+
+    # --- Storage helpers ---
+
+    def _open_vectors(self, capacity: int):
+        size = capacity * self.dim * 4
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def _grow(self, needed: int):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        self.vectors.flush()
+        del self.vectors
+        self._open_vectors(capacity)
+        if self.index is not None:
+            self.index.resize_index(capacity)
+
+    def _open_index(self):
+        index_path = os.path.join(self.path, "hnsw.bin")
+        self.index = hnswlib.Index(space="ip", dim=self.dim)
+        if os.path.exists(index_path):
+            self.index.load_index(index_path, max_elements=self.capacity)
+            indexed = self.index.get_current_count()
+            if indexed < self.count:
+                # Snapshot predates the last commits: catch up from the memory map
+                self.index.add_items(np.asarray(self.vectors[indexed:self.count]), np.arange(indexed, self.count))
+        else:
+            self.index.init_index(max_elements=self.capacity, ef_construction=200, M=16)
+            if self.count:
+                self.index.add_items(np.asarray(self.vectors[:self.count]), np.arange(self.count))
+        self.index.set_ef(128)
+
+    def _save_index(self):
+        if self.index is not None:
+            tmp_path = os.path.join(self.path, "hnsw.bin.tmp")
+            self.index.save_index(tmp_path)
+            os.replace(tmp_path, os.path.join(self.path, "hnsw.bin"))
+        self._unsaved = 0
+
+    @staticmethod
+    def chunk_key(url: str, text: str) -> str:
+        return hashlib.sha1(f"{url}\n{text}".encode("utf-8")).hexdigest()
+
+    # --- Public API ---
+
+    def upsert(self, chunks: List[dict]) -> int:
+        """
+        Inserts new chunks ({title, url, text}) and refreshes fetched_at for ones
+        already stored. Only new chunks are embedded and indexed. Returns the
+        number of new chunks.
+        """
+        now = time.time()
+        with self._lock:
+            new_chunks, seen = [], set()
+            for chunk in chunks:
+                key = self.chunk_key(chunk.get("url", ""), chunk["text"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                updated = self.conn.execute("UPDATE docs SET fetched_at = ? WHERE key = ?", (now, key)).rowcount
+                if not updated:
+                    new_chunks.append((key, chunk))
+
+            if new_chunks:
+                start = self.count
+                self._grow(start + len(new_chunks))
+                vectors = self.embedder.embed([c["text"] for _, c in new_chunks])
+                self.vectors[start:start + len(new_chunks)] = vectors
+                self.vectors.flush()
+                self.conn.executemany(
+                    "INSERT INTO docs (row, key, title, url, text, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (start + i, key, c.get("title", ""), c.get("url", ""), c["text"], now)
+                        for i, (key, c) in enumerate(new_chunks)
+                    ],
+                )
+                if self.index is not None:
+                    self.index.add_items(vectors, np.arange(start, start + len(new_chunks)))
+                    self._unsaved += len(new_chunks)
+                self.count += len(new_chunks)
+            self.conn.commit()
+            if self._unsaved >= SAVE_INDEX_EVERY:
+                self._save_index()
+        return len(new_chunks)
+
+    def search(self, query: str, k: int = 5, max_age: float | None = STALE_AFTER_SECONDS, exact: bool = False) -> List[dict]:
+        """
+        Returns up to k stored chunks most similar to the query, newest data only
+        when max_age is set. Each hit carries its cosine score and fetched_at.
+        """
+        if not self.count:
+            return []
+        query_vec = self.embedder.embed([query])[0]
+        with self._lock:
+            if self.index is not None and not exact:
+                labels, distances = self.index.knn_query(query_vec, k=min(k * 2, self.count))
+                candidates = [(int(row), 1.0 - float(dist)) for row, dist in zip(labels[0], distances[0])]
+            else:
+                scores = np.asarray(self.vectors[:self.count]) @ query_vec
+                top = np.argsort(-scores)[:k * 2]
+                candidates = [(int(row), float(scores[row])) for row in top]
+
+            placeholders = ",".join("?" * len(candidates))
+            rows = self.conn.execute(
+                f"SELECT row, title, url, text, fetched_at FROM docs WHERE row IN ({placeholders})",
+                [row for row, _ in candidates],
+            ).fetchall()
+
+        by_row = {r[0]: r for r in rows}
+        cutoff = time.time() - max_age if max_age is not None else None
+        hits = []
+        for row, score in candidates:
+            record = by_row.get(row)
+            if record is None or (cutoff is not None and record[4] < cutoff):
+                continue
+            hits.append({"title": record[1], "url": record[2], "text": record[3], "fetched_at": record[4], "score": score})
+        return hits[:k]
+
+    def close(self):
+        with self._lock:
+            self._save_index()
+            self.vectors.flush()
+            self.conn.close()
+
+
+def is_sufficient(hits: List[dict], min_hits: int = MIN_LOCAL_HITS, min_score: float = MIN_LOCAL_SCORE) -> bool:
+    """
+    Local recall is good enough when enough fresh hits clear the similarity bar.
+    """
+    return sum(1 for hit in hits if hit["score"] >= min_score) >= min_hits
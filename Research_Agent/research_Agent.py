@@ -1,23 +1,33 @@
 import os
+import sys
 import asyncio
+from pathlib import Path
 from typing import Annotated, List
 from typing_extensions import TypedDict
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import create_react_agent
 from langgraph.graph import StateGraph, END, START
 from langchain_openai import ChatOpenAI
+
+# The LLM client registry, rate limiter and prompt templates are shared with the DB agent
+SHARED_DIR = str(Path(__file__).resolve().parent.parent / "DB_Agent" / "DB_Agent")
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
 from azure_openai_llm import get_llm
 from langchain_core.messages import HumanMessage
+from prompt_templates import StablePrompt
 from tavily import TavilyClient
 from langchain_community.utilities.wikipedia import WikipediaAPIWrapper
 from langgraph.checkpoint.memory import MemorySaver
+from retrieval import build_context
+from doc_store import DocStore, is_sufficient
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-
-llm = get_llm()
+# The LLM client is fetched with get_llm() at call time; the registry builds it once on first use.
 
 # Initialize OpenAI LLM 
 # llm = ChatOpenAI(
@@ -28,6 +38,23 @@ llm = get_llm()
 # Get API key from environment
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 
+# Local store of previously fetched research documents
+doc_store = DocStore()
+
+# Prompts are built once; the static system text is a byte-identical prefix on every
+# call (provider prompt caching), with history and per-turn text appended after it.
+research_prompt = StablePrompt(
+    "generate_response",
+    "You are a Research Agent. You can Browse the Internet to find answers to questions using Tavily and wikipedia. "
+    "When research context is provided, base your answer on it and include all URLs for reference.",
+    suffix="",
+)
+decide_prompt = StablePrompt(
+    "decide_research",
+    "Determine if the user message requires research. Respond with 'yes' or 'no'.",
+    "User message: '{message}'",
+)
+
 
 def search_wikipedia(topic: str, top_k: int = 2):
     """
@@ -100,6 +127,8 @@ class AgentState(TypedDict):
     research_needed: bool                       # Flag to trigger research - Safely allows multiple nodes to read this key in parallel
     wikipedia_results: List[dict]               # Stores Wikipedia results
     tavily_results: List[dict]                  # Stores Tavily results
+    local_results: List[dict]                   # Hits from the local document store
+    live_search_needed: bool                    # Set when local recall is insufficient or stale
     final_response: str                         # Final response to user
 
 
@@ -120,34 +149,47 @@ def tavily_node(state: AgentState):
     return {"tavily_results": []}
 
 
+# Local retrieval node - serves previously fetched documents before going to the network
+def local_search_node(state: AgentState):
+    query = state["messages"][-1].content
+    hits = doc_store.search(query)
+    return {"local_results": hits, "live_search_needed": not is_sufficient(hits)}
+
+
 # Node to determine if research is required
 def decide_research(state: AgentState) -> AgentState:
     last_message = state["messages"][-1].content
-    research_prompt = (
-        f"Determine if the following user message requires research: '{last_message}'. "
-        "Respond with 'yes' or 'no'."
-    )
-    response = llm.invoke(research_prompt).content.strip().lower()
-    state["research_needed"] = response == "yes"
+    response = get_llm().invoke(decide_prompt.messages(message=last_message))
+    decide_prompt.report(response)
+    state["research_needed"] = response.content.strip().lower() == "yes"
     return state
 
 def route_research(state: AgentState) -> List[str]:
     if state["research_needed"]:
+        return ["local_search_node"]
+    else:
+        return ["generate_response"]
+
+
+def route_live_search(state: AgentState) -> List[str]:
+    if state["live_search_needed"]:
         return ["wikipedia_node", "tavily_node"]
     else:
         return ["generate_response"]
 
 
 async def generate_response(state: AgentState):
-    # Prepend system prompt if not already in messages
-    messages = [{"role": "system", "content": "You are a Research Agent. You can Browse the Internet to find answers to questions using Tavily and wikipedia."}] + state["messages"]
+    # Static system prompt first, then the (append-only) history
+    messages = research_prompt.messages(history=state["messages"])
 
     final_response = ""
+    full_message = None
 
     # No research: respond based on full history
     if not state["research_needed"]:
-        async for chunk in llm.astream(messages):
+        async for chunk in get_llm().astream(messages):
             final_response += chunk.content
+            full_message = chunk if full_message is None else full_message + chunk
             yield {
                 "final_response": final_response,
                 "__event__": {
@@ -155,6 +197,7 @@ async def generate_response(state: AgentState):
                     "data": {"chunk": chunk},
                 }
             }
+        research_prompt.report(full_message)
 
         yield {
             "messages": state["messages"] + [{"role": "assistant", "content": final_response}],
@@ -163,23 +206,18 @@ async def generate_response(state: AgentState):
 
     # Research needed: build context and inject into history
     else:
-        context = "Research results:\n"
-        if state["wikipedia_results"]:
-            context += "Wikipedia:\n"
-            for result in state["wikipedia_results"]:
-                context += f"- {result['title']}: {result['summary']}... ({result['url']})\n"
-        if state["tavily_results"]:
-            context += "Tavily:\n"
-            for result in state["tavily_results"]:
-                context += f"- {result['title']}: {result['content']}... ({result['url']})\n"
-
+        # Fetch full pages, rank chunks against the question and pack them into a fixed budget
         user_question = state["messages"][-1].content
-        contextual_prompt = f"Based on the following context, respond to the user message '{user_question}':\n{context}\nInclude all URLs for reference."
+        sources = state.get("local_results", []) + state["wikipedia_results"] + state["tavily_results"]
+        context = await build_context(user_question, sources, store=doc_store)
 
-        extended_messages = messages + [{"role": "user", "content": contextual_prompt}]
+        contextual_prompt = f"{context}\nBased on the context above, respond to the user message '{user_question}'."
 
-        async for chunk in llm.astream(extended_messages):
+        extended_messages = messages + [HumanMessage(content=contextual_prompt)]
+
+        async for chunk in get_llm().astream(extended_messages):
             final_response += chunk.content
+            full_message = chunk if full_message is None else full_message + chunk
             yield {
                 "final_response": final_response,
                 "__event__": {
@@ -187,6 +225,7 @@ async def generate_response(state: AgentState):
                     "data": {"chunk": chunk},
                 }
             }
+        research_prompt.report(full_message)
 
         yield {
             "messages": state["messages"] + [{"role": "assistant", "content": final_response}],
@@ -199,6 +238,7 @@ workflow = StateGraph(AgentState)
 
 # define nodes
 workflow.add_node("decide_research", decide_research)
+workflow.add_node("local_search_node", local_search_node)
 workflow.add_node("wikipedia_node", wikipedia_node)
 workflow.add_node("tavily_node", tavily_node)
 workflow.add_node("generate_response", generate_response)
@@ -208,11 +248,19 @@ workflow.add_edge(START, "decide_research")
 workflow.add_conditional_edges(
     "decide_research",
     route_research,
+    {
+        "local_search_node": "local_search_node",
+        "generate_response": "generate_response"
+    } # “condition mapping” — it tells the graph which nodes are valid destinations for the condition function (route_research) to return.
+)
+workflow.add_conditional_edges(
+    "local_search_node",
+    route_live_search,
     {
         "wikipedia_node": "wikipedia_node",
         "tavily_node": "tavily_node",
         "generate_response": "generate_response"
-    } # “condition mapping” — it tells the graph which nodes are valid destinations for the condition function (route_research) to return.
+    }
 )
 workflow.add_edge("wikipedia_node", "generate_response")
 workflow.add_edge("tavily_node", "generate_response")
@@ -230,6 +278,8 @@ async def run_research_agent_stream(user_message: str, thread_id: str = "default
         "research_needed": False,
         "wikipedia_results": [],
         "tavily_results": [],
+        "local_results": [],
+        "live_search_needed": False,
         "final_response": ""
     }
 
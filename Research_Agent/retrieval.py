@@ -0,0 +1,249 @@
+import re
+import math
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+from html.parser import HTMLParser
+from typing import AsyncIterator, Iterable, List
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+# Retrieval settings
+FETCH_CONCURRENCY = 4         # Pages fetched in parallel
+FETCH_TIMEOUT = 10.0          # Seconds per page
+MAX_PAGE_BYTES = 500_000      # Stop streaming a page after this many bytes
+CHUNK_WORDS = 120             # Target chunk size in words
+CHUNK_OVERLAP = 20            # Words shared between consecutive chunks
+SIMHASH_DISTANCE = 3          # Max Hamming distance for two chunks to count as duplicates
+CONTEXT_TOKEN_BUDGET = 1500   # Tokens reserved for research context in the prompt
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text from an HTML document, skipping scripts and styles."""
+
+    _SKIP = {"script", "style", "noscript", "header", "footer", "nav"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth and data.strip():
+            self.parts.append(data)
+
+    def pop_text(self) -> str:
+        text = " ".join(self.parts)
+        self.parts = []
+        return text
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token), good enough for budgeting.
+    """
+    return max(1, len(text) // 4)
+
+
+# --- Fetching & chunking ---
+
+async def stream_page_text(client: httpx.AsyncClient, url: str, max_bytes: int = MAX_PAGE_BYTES) -> AsyncIterator[str]:
+    """
+    Streams a page and yields plain-text pieces as the HTML arrives.
+    Reading stops once max_bytes have been received. Only HTML and text/*
+    responses are read; anything else (PDF, images, archives) yields nothing.
+    """
+    extractor = _TextExtractor()
+    received = 0
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("content-type", "text/html").split(";")[0].strip().lower()
+        is_html = "html" in content_type
+        if not is_html and not content_type.startswith("text/"):
+            logger.info(f"Skipping {url}: unsupported content type {content_type!r}")
+            return
+        async for piece in response.aiter_text():
+            received += len(piece)
+            if is_html:
+                extractor.feed(piece)
+                text = extractor.pop_text()
+            else:
+                text = piece
+            if text:
+                yield text
+            if received >= max_bytes:
+                break
+
+
+async def chunk_stream(pieces: AsyncIterator[str], chunk_words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> AsyncIterator[str]:
+    """
+    Groups a stream of text pieces into overlapping word windows without
+    waiting for the whole page.
+    """
+    buffer: List[str] = []
+    emitted = False
+    async for piece in pieces:
+        buffer.extend(piece.split())
+        while len(buffer) >= chunk_words:
+            yield " ".join(buffer[:chunk_words])
+            buffer = buffer[chunk_words - overlap:]
+            emitted = True
+    # Only the overlap is left over once something was emitted; skip it
+    if len(buffer) > (overlap if emitted else 0):
+        yield " ".join(buffer)
+
+
+def chunk_text(text: str, chunk_words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    words = text.split()
+    if len(words) <= chunk_words:
+        return [" ".join(words)] if words else []
+    step = chunk_words - overlap
+    return [" ".join(words[i:i + chunk_words]) for i in range(0, len(words) - overlap, step)]
+
+
+async def fetch_chunks(client: httpx.AsyncClient, source: dict, semaphore: asyncio.Semaphore) -> List[dict]:
+    """
+    Fetches and chunks the full page behind a search result. Falls back to the
+    snippet the search API returned if the page cannot be fetched.
+    """
+    if source.get("text"):
+        # Already a stored chunk (e.g. a local DocStore hit); nothing to fetch
+        return [{"title": source.get("title", ""), "url": source.get("url", ""), "text": source["text"]}]
+
+    snippet = source.get("content") or source.get("summary") or ""
+    chunks = []
+    if source.get("url"):
+        try:
+            async with semaphore:
+                async for chunk in chunk_stream(stream_page_text(client, source["url"])):
+                    chunks.append(chunk)
+        except Exception as e:  # Network, decoding or HTML parsing errors: fall back for this URL only
+            logger.warning(f"Could not read {source['url']}: {e!r}")
+            chunks = []
+    if not chunks:
+        chunks = chunk_text(snippet)
+    return [{"title": source.get("title", ""), "url": source.get("url", ""), "text": c} for c in chunks]
+
+
+# --- Near-duplicate removal ---
+
+def simhash(text: str, bits: int = 64) -> int:
+    """
+    64-bit SimHash over word shingles; near-identical texts land within a few bits.
+    """
+    weights = [0] * bits
+    words = tokenize(text)
+    shingles = {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(bits):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+
+def dedupe_chunks(chunks: Iterable[dict], max_distance: int = SIMHASH_DISTANCE) -> List[dict]:
+    kept, fingerprints = [], []
+    for chunk in chunks:
+        fp = simhash(chunk["text"])
+        if any(bin(fp ^ other).count("1") <= max_distance for other in fingerprints):
+            continue
+        fingerprints.append(fp)
+        kept.append(chunk)
+    return kept
+
+
+# --- Ranking & packing ---
+
+class BM25:
+    """
+    Okapi BM25 over an in-memory list of chunk texts.
+    """
+
+    def __init__(self, docs: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_terms = [Counter(tokenize(doc)) for doc in docs]
+        self.doc_lens = [sum(terms.values()) for terms in self.doc_terms]
+        self.avg_len = (sum(self.doc_lens) / len(self.doc_lens)) if docs else 0.0
+        df = Counter(term for terms in self.doc_terms for term in terms)
+        n = len(docs)
+        self.idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+
+    def scores(self, query: str) -> List[float]:
+        query_terms = tokenize(query)
+        results = []
+        for terms, length in zip(self.doc_terms, self.doc_lens):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_len or 1))
+            for term in query_terms:
+                tf = terms.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+
+def rank_chunks(question: str, chunks: List[dict]) -> List[dict]:
+    if not chunks:
+        return []
+    scores = BM25([c["text"] for c in chunks]).scores(question)
+    order = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+    return [chunks[i] for i in order]
+
+
+def pack_chunks(chunks: List[dict], token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[dict]:
+    """
+    Greedily takes the best-ranked chunks that still fit in the token budget.
+    """
+    packed, used = [], 0
+    for chunk in chunks:
+        cost = estimate_tokens(chunk["text"]) + estimate_tokens(chunk["url"]) + 4
+        if used + cost > token_budget:
+            continue
+        packed.append(chunk)
+        used += cost
+    return packed
+
+
+def format_context(chunks: List[dict]) -> str:
+    lines = ["Research results:"]
+    lines.extend(f"- {c['title']}: {c['text']} ({c['url']})" for c in chunks)
+    return "\n".join(lines) + "\n"
+
+
+async def build_context(question: str, sources: List[dict], token_budget: int = CONTEXT_TOKEN_BUDGET, store=None) -> str:
+    """
+    Retrieval pipeline used by generate_response:
+    fetch full pages concurrently -> stream & chunk -> dedupe -> BM25 rank -> pack into the token budget.
+    When a DocStore is given, every freshly fetched chunk is upserted into it.
+    """
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+    async with httpx.AsyncClient(timeout=FETCH_TIMEOUT, follow_redirects=True) as client:
+        per_source = await asyncio.gather(*(fetch_chunks(client, s, semaphore) for s in sources))
+
+    if store is not None:
+        fetched = [chunk for s, group in zip(sources, per_source) if not s.get("text") for chunk in group]
+        if fetched:
+            await asyncio.to_thread(store.upsert, fetched)
+
+    chunks = dedupe_chunks(chunk for group in per_source for chunk in group)
+    ranked = rank_chunks(question, chunks)
+    return format_context(pack_chunks(ranked, token_budget))
@@ -1,7 +1,16 @@
+import sys
+import queue
+from pathlib import Path
 import streamlit as st
-import asyncio
+
+# The shared LLM plumbing and UI helpers live in DB_Agent/DB_Agent
+SHARED_DIR = str(Path(__file__).resolve().parent.parent / "DB_Agent" / "DB_Agent")
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
 from research_Agent import graph  # Your agent with graph.astream_events
 from langchain_core.messages import HumanMessage
+from streamlit_streaming import render_message, init_history, add_to_history, stream_response
 
 st.set_page_config(page_title="Research Agent")
 
@@ -47,65 +56,48 @@ st.markdown("""
 st.title("Research Agent:")
 
 # Initialize conversation state
-if "conversation_history" not in st.session_state:
-    st.session_state.conversation_history = []
+init_history()
 
 chat_container = st.container()
 
 # Render conversation history
 with chat_container:
-    for msg in st.session_state.conversation_history:
-        if msg["role"] == "user":
-            st.markdown(
-                f'<div class="user-message-container"><div class="user-message">{msg["content"]}</div></div>',
-                unsafe_allow_html=True,
-            )
-        elif msg["role"] == "assistant":
-            st.markdown(
-                f'<div class="bot-message-container"><div class="bot-message">{msg["content"]}</div></div>',
-                unsafe_allow_html=True,
-            )
+    if st.session_state.history_html:
+        st.markdown(st.session_state.history_html, unsafe_allow_html=True)
 
-# Streaming function
-async def run_agent_stream(user_message: str):
+# Streaming function (runs on the background loop, hands tokens to the script thread)
+async def run_agent_stream(user_message: str, tokens: queue.Queue):
     config = {"configurable": {"thread_id": "streamlit_thread"}}
     initial_state = {
         "messages": [{"role": "user", "content": user_message}],
         "research_needed": False,
         "wikipedia_results": [],
         "tavily_results": [],
+        "local_results": [],
+        "live_search_needed": False,
         "final_response": ""
     }
 
-    bot_response = ""
-    response_placeholder = st.empty()
+    try:
+        async for event in graph.astream_events(initial_state, config):
+            if (
+                event["event"] == "on_chat_model_stream"
+                and event["metadata"].get("langgraph_node") == "generate_response"
+            ):
+                tokens.put(event["data"]["chunk"].content)
+    finally:
+        tokens.put(None)
 
-    async for event in graph.astream_events(initial_state, config):
-        if (
-            event["event"] == "on_chat_model_stream"
-            and event["metadata"].get("langgraph_node") == "generate_response"
-        ):
-            chunk = event["data"]["chunk"]
-            bot_response += chunk.content
-            response_placeholder.markdown(
-                f'<div class="bot-message-container"><div class="bot-message">{bot_response}</div></div>',
-                unsafe_allow_html=True,
-            )
-    return bot_response
 
 # Main chat handler
 def chat_with_researchbot():
     user_input = st.chat_input("Ask about anything, and I'll research it for you!")
     if user_input:
-        st.session_state.conversation_history.append({"role": "user", "content": user_input})
+        add_to_history("user", user_input)
         with chat_container:
-            st.markdown(
-                f'<div class="user-message-container"><div class="user-message">{user_input}</div></div>',
-                unsafe_allow_html=True,
-            )
-
-        response = asyncio.run(run_agent_stream(user_input))
+            st.markdown(render_message("user", user_input), unsafe_allow_html=True)
+            response = stream_response(lambda tokens: run_agent_stream(user_input, tokens))
 
-        st.session_state.conversation_history.append({"role": "assistant", "content": response})
+        add_to_history("assistant", response)
 
 chat_with_researchbot()
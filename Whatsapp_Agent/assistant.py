@@ -1,39 +1,221 @@
-from fastapi import FastAPI
-from langchain.prompts import PromptTemplate
-from azure_openai_llm import get_llm
+import os
+import sys
+import json
+import asyncio
+import logging
+from pathlib import Path
+import httpx
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+# The shared LLM plumbing lives in DB_Agent/DB_Agent
+SHARED_DIR = str(Path(__file__).resolve().parent.parent / "DB_Agent" / "DB_Agent")
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
+from azure_openai_llm import get_llm, get_embeddings
+from prompt_templates import StablePrompt
+from message_queue import MessageQueue, WorkerPool, parse_webhook
+from conversation_store import ConversationStore, ResponseCache
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()  # This folder's .env; the shared registry would otherwise look next to itself
 
 app = FastAPI()
-llm = get_llm()
-
-system_prompt = PromptTemplate(
-    input_variables=["input"],
-    template=(
-        "You are an engaging and friendly assistant. Respond to the user's queries with enthusiasm, "
-        "clarity, and a conversational tone. Encourage follow-up questions and make the interaction enjoyable. "
-        "User: {input}"
-    )
+
+RESPONSE_TIMEOUT = float(os.getenv("ASSISTANT_TIMEOUT", "30"))  # Seconds allowed per request
+FALLBACK_RESPONSE = "Unable to get a response. Please try again."
+TIMEOUT_RESPONSE = "Sorry, that took too long. Please try again."
+REPLY_URL = os.getenv("WHATSAPP_REPLY_URL")  # Where webhook replies are POSTed as {"to", "text"}; unset = log only
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "1") == "1"
+SEMANTIC_CACHE = os.getenv("CACHE_SEMANTIC", "0") == "1"    # Also match paraphrases by embedding similarity
+
+# The instructions are a byte-stable system prefix built once; only the user text changes per call
+system_prompt = StablePrompt(
+    "whatsapp_assistant",
+    "You are an engaging and friendly assistant. Respond to the user's queries with enthusiasm, "
+    "clarity, and a conversational tone. Encourage follow-up questions and make the interaction enjoyable.",
+    "User: {input}",
 )
 
-def get_response(prompt: str):
+conversations = ConversationStore()
+response_cache = ResponseCache(embeddings=get_embeddings() if SEMANTIC_CACHE else None) if RESPONSE_CACHE else None
+
+
+def cacheable(prompt: str, history: list) -> bool:
+    # The cache is keyed on the text alone and shared by all senders, so only
+    # replies that cannot depend on earlier turns (a conversation's opener) go in it
+    return response_cache is not None and not history
+
+async def generate_reply(prompt: str, sender: str = None, record: bool = True) -> str:
+    """
+    Awaits the LLM, bounded by RESPONSE_TIMEOUT. Raises on failure.
+    With a sender, the reply sees that conversation's recent history and is
+    recorded in it (unless `record` is False, for callers that record the turn
+    themselves); cacheable inputs are answered from the response cache.
+    """
+    history = conversations.history(sender) if sender else []
+    use_cache = cacheable(prompt, history)
+    reply = await response_cache.get(prompt) if use_cache else None
+    if reply is None:
+        response = await asyncio.wait_for(get_llm().ainvoke(system_prompt.messages(history=history, input=prompt)), RESPONSE_TIMEOUT)
+        system_prompt.report(response)
+        if not response:
+            return FALLBACK_RESPONSE
+        reply = response.content
+        if use_cache:
+            await response_cache.put(prompt, reply)
+    if sender and record:
+        conversations.append(sender, prompt, reply)
+    return reply
+
+
+async def aget_response(prompt: str, sender: str = None):
+    """
+    `generate_reply` for the HTTP endpoint: timeouts and errors become the reply text.
+    """
     try:
-        response = llm.invoke(system_prompt.format(input=prompt))
-        if response:
-            response = response.content
-            return response
-        return "Unable to get a response. Please try again."
+        return await generate_reply(prompt, sender)
+    except asyncio.TimeoutError:
+        logger.warning(f"LLM call timed out after {RESPONSE_TIMEOUT:.0f}s")
+        return TIMEOUT_RESPONSE
     except Exception as e:
         return str(e)
-    
+
+
+async def stream_response(prompt: str, sender: str = None):
+    """
+    Server-Sent Events: one `data` event per chunk, then `done` (or `error`).
+    A cached reply is sent as a single chunk.
+    """
+    full_message = None
+    try:
+        history = conversations.history(sender) if sender else []
+        use_cache = cacheable(prompt, history)
+        reply = await response_cache.get(prompt) if use_cache else None
+        if reply is not None:
+            yield f"data: {json.dumps({'text': reply})}\n\n"
+        else:
+            async with asyncio.timeout(RESPONSE_TIMEOUT):
+                async for chunk in get_llm().astream(system_prompt.messages(history=history, input=prompt)):
+                    full_message = chunk if full_message is None else full_message + chunk
+                    if chunk.content:
+                        yield f"data: {json.dumps({'text': chunk.content})}\n\n"
+            system_prompt.report(full_message)
+            reply = full_message.content if full_message else ""
+            if use_cache and reply:
+                await response_cache.put(prompt, reply)
+        if sender:
+            conversations.append(sender, prompt, reply)
+        yield "event: done\ndata: {}\n\n"
+    except TimeoutError:
+        logger.warning(f"LLM stream timed out after {RESPONSE_TIMEOUT:.0f}s")
+        yield f"event: error\ndata: {json.dumps({'detail': TIMEOUT_RESPONSE})}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+
 @app.get("/assistant")
-async def assistant(input: str):
+async def assistant(input: str, sender: str = None):
     """
-    Endpoint to get a response from the assistant.
+    Endpoint to get a response from the assistant. Pass `sender` to keep
+    conversation context.
     """
     try:
-        print(f"Input: {input}")
-        response = get_response(input)
+        logger.info(f"Input: {input}")
+        response = await aget_response(input, sender)
         return response
     except Exception as e:
         return f"Error: {str(e)}"
-    
-# curl -X GET "http://localhost:8000/assistant?input=Hello
\ No newline at end of file
+
+
+@app.get("/assistant/stream")
+async def assistant_stream(input: str, sender: str = None):
+    """
+    Streams the assistant's response as it is generated (text/event-stream).
+    """
+    logger.info(f"Streaming input: {input}")
+    return StreamingResponse(
+        stream_response(input, sender),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Webhook ingestion: ack immediately, answer from a durable queue with a worker pool
+
+message_queue = None
+worker_pool = None
+reply_client = None
+
+
+async def deliver_reply(sender: str, reply: str):
+    if REPLY_URL is None:
+        logger.info(f"Reply to {sender}: {reply}")
+        return
+    response = await reply_client.post(REPLY_URL, json={"to": sender, "text": reply})
+    response.raise_for_status()
+
+
+async def handle_conversation(sender: str, texts: list[str]) -> str:
+    # Messages that queued up from one sender are answered together, in order
+    prompt = "\n".join(texts)
+    reply = await generate_reply(prompt, sender, record=False)
+    await deliver_reply(sender, reply)
+    # Recorded only once delivered: a failed delivery is retried with the same history
+    conversations.append(sender, prompt, reply)
+    return reply
+
+
+@app.on_event("startup")
+async def start_workers():
+    global message_queue, worker_pool, reply_client
+    message_queue = MessageQueue()
+    reply_client = httpx.AsyncClient(timeout=10)
+    worker_pool = WorkerPool(message_queue, handle_conversation)
+    await worker_pool.start()
+
+
+@app.on_event("shutdown")
+async def stop_workers():
+    await worker_pool.stop()
+    await reply_client.aclose()
+    message_queue.close()
+
+
+@app.post("/webhook")
+async def webhook(request: Request):
+    """
+    Receives WhatsApp message webhooks. Messages are committed to the queue
+    before the 200 is returned; replies are sent by the workers.
+    """
+    try:
+        messages = parse_webhook(await request.json())
+    except ValueError as e:  # Invalid JSON (JSONDecodeError) or not a JSON object
+        raise HTTPException(status_code=400, detail=f"Invalid webhook payload: {e}")
+    queued = await asyncio.to_thread(message_queue.enqueue, messages) if messages else 0
+    if queued:
+        worker_pool.notify()
+    return {"received": len(messages), "queued": queued}
+
+
+@app.get("/webhook/metrics")
+async def webhook_metrics():
+    """
+    Queue depth by status, worker counters and receipt-to-reply latency.
+    """
+    return await worker_pool.metrics()
+
+
+@app.get("/assistant/cache")
+async def cache_metrics():
+    """
+    Response cache hit rate and LLM calls saved, plus live conversations.
+    """
+    report = response_cache.report() if response_cache is not None else {"enabled": False}
+    return {**report, "conversations": len(conversations)}
+
+# curl -X GET "http://localhost:8000/assistant?input=Hello
+# curl -N "http://localhost:8000/assistant/stream?input=Hello"
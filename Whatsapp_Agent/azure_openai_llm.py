@@ -1 +0,0 @@
-# Your Azure OpenAI Connection
\ No newline at end of file
@@ -0,0 +1,126 @@
+# bench_response_cache.py
+# Replays a synthetic WhatsApp workload through assistant.generate_reply with a
+# counting mock LLM and reports the response cache hit rate and LLM calls saved.
+#
+# Each simulated user opens with a greeting or an FAQ question (popular ones
+# more often, with varied casing and punctuation), then asks follow-ups that
+# are unique to the conversation. Runs once with exact matching and once with
+# semantic matching (a bag-of-words embedder stands in for the embeddings model).
+#
+# Usage: python bench_response_cache.py --users 2000
+import os
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+
+import numpy as np
+
+os.environ.setdefault("WHATSAPP_QUEUE_DB", os.path.join(tempfile.mkdtemp(prefix="assistant_cache_"), "queue.db"))
+
+from langchain_core.messages import AIMessage
+
+import assistant
+from conversation_store import ConversationStore, ResponseCache, estimate_tokens, normalize
+
+GREETINGS = ["hi", "Hi!", "hello", "Hello!!", "hey", "good morning", "thanks", "Thank you!"]
+FAQS = [
+    "What are your opening hours?",
+    "Where is your store located?",
+    "How do I track my order?",
+    "What is your return policy?",
+    "Do you ship internationally?",
+    "How can I reset my password?",
+    "What payment methods do you accept?",
+    "How long does delivery take?",
+    "Can I change my delivery address?",
+    "Do you have a loyalty program?",
+]
+PARAPHRASES = {
+    "What are your opening hours?": "what are the opening hours",
+    "How do I track my order?": "how can I track my order",
+    "What is your return policy?": "what is the return policy",
+    "How long does delivery take?": "how long does the delivery take",
+}
+
+
+class CountingLLM:
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = []
+
+    async def ainvoke(self, messages, config=None):
+        self.calls += 1
+        self.prompt_tokens.append(sum(estimate_tokens(m.content) for m in messages))
+        return AIMessage(content=f"Answer to: {messages[-1].content}")
+
+
+class BagOfWordsEmbeddings:
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    async def aembed_query(self, text: str):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in text.split():
+            vector[hash(word) % self.dimensions] += 1.0
+        return vector
+
+
+def vary(text: str) -> str:
+    text = random.choice([text, text.lower(), text.upper(), text.rstrip("?!.")])
+    return text + random.choice(["", "", "?", " ", "!!"])
+
+
+def workload(users: int, followups: int, paraphrase_rate: float):
+    weights = [1 / (rank + 1) for rank in range(len(FAQS))]  # Zipf-like popularity
+    for u in range(users):
+        sender = f"44700{u:06d}"
+        if random.random() < 0.4:
+            opener = vary(random.choice(GREETINGS))
+        else:
+            opener = random.choices(FAQS, weights)[0]
+            if opener in PARAPHRASES and random.random() < paraphrase_rate:
+                opener = PARAPHRASES[opener]
+            opener = vary(opener)
+        yield sender, opener
+        for f in range(random.randint(0, followups)):
+            yield sender, f"about order {u}-{f}, can you tell me more about item {random.randint(1, 10**6)}?"
+        if random.random() < 0.3:
+            yield sender, vary(random.choice(["thanks", "thank you", "ok thanks"]))
+
+
+async def run(messages, embeddings, threshold):
+    llm = CountingLLM()
+    assistant.get_llm = lambda: llm
+    assistant.conversations = ConversationStore()
+    assistant.response_cache = ResponseCache(embeddings=embeddings, threshold=threshold)
+    for sender, text in messages:
+        await assistant.generate_reply(text, sender)
+    return llm, assistant.response_cache.report()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--followups", type=int, default=3, help="Max unique follow-up questions per user")
+    parser.add_argument("--paraphrase-rate", type=float, default=0.3)
+    parser.add_argument("--threshold", type=float, default=0.75, help="Cosine threshold for the bag-of-words embedder")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    messages = list(workload(args.users, args.followups, args.paraphrase_rate))
+    print(f"{len(messages)} messages from {args.users} users")
+    # hit rate is over cache lookups; follow-ups that depend on history are never looked up
+    print(f"{'mode':>9}{'lookups':>9}{'hit rate':>10}{'exact':>7}{'semantic':>10}{'llm calls':>11}{'saved':>7}{'of all':>8}{'avg prompt tok':>16}")
+    for mode, embeddings in [("exact", None), ("semantic", BagOfWordsEmbeddings())]:
+        llm, report = asyncio.run(run(messages, embeddings, args.threshold))
+        print(f"{mode:>9}{report['lookups']:>9}{report['hit_rate']:>10.1%}{report['exact_hits']:>7}{report['semantic_hits']:>10}"
+              f"{llm.calls:>11}{report['llm_calls_saved']:>7}{report['llm_calls_saved'] / len(messages):>8.1%}{np.mean(llm.prompt_tokens):>16.0f}")
+    top = Counter(normalize(text) for _, text in messages).most_common(5)
+    print("most frequent inputs:", ", ".join(f"{text!r} x{n}" for text, n in top))
+
+
+if __name__ == "__main__":
+    main()
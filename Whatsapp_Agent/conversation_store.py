@@ -0,0 +1,160 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+from langchain_core.messages import HumanMessage, AIMessage
+
+logger = logging.getLogger(__name__)
+
+MAX_CONVERSATIONS = int(os.getenv("CONVERSATION_MAX", "10000"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))
+MAX_TURNS = 50                     # Hard cap on stored messages per conversation
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", str(24 * 3600)))
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "3600"))
+SEMANTIC_THRESHOLD = float(os.getenv("CACHE_SEMANTIC_THRESHOLD", "0.92"))
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def normalize(text: str) -> str:
+    """
+    Cache key: lowercase, punctuation dropped, whitespace collapsed ("Hi!!" == "hi").
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+class ConversationStore:
+    """
+    Recent messages per sender, in memory. Conversations are kept in LRU order
+    (at most `max_conversations`) and dropped after CONVERSATION_TTL of
+    inactivity; `history()` returns the newest messages that fit the token budget.
+    """
+
+    def __init__(self, max_conversations: int = MAX_CONVERSATIONS, token_budget: int = HISTORY_TOKEN_BUDGET):
+        self.max_conversations = max_conversations
+        self.token_budget = token_budget
+        self._conversations = OrderedDict()  # sender -> [deque of (role, text, tokens), last_active]
+        self._lock = threading.Lock()
+
+    def history(self, sender: str) -> list:
+        with self._lock:
+            item = self._conversations.get(sender)
+            if item is None:
+                return []
+            if time.monotonic() - item[1] > CONVERSATION_TTL:
+                del self._conversations[sender]
+                return []
+            messages, used = [], 0
+            for role, text, tokens in reversed(item[0]):
+                if used + tokens > self.token_budget:
+                    break
+                used += tokens
+                messages.append(HumanMessage(content=text) if role == "user" else AIMessage(content=text))
+        messages.reverse()
+        return messages
+
+    def append(self, sender: str, user_text: str, reply: str):
+        with self._lock:
+            item = self._conversations.get(sender)
+            if item is None:
+                item = self._conversations[sender] = [deque(maxlen=MAX_TURNS), 0.0]
+            item[0].append(("user", user_text, estimate_tokens(user_text)))
+            item[0].append(("assistant", reply, estimate_tokens(reply)))
+            item[1] = time.monotonic()
+            self._conversations.move_to_end(sender)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+
+    def __len__(self):
+        return len(self._conversations)
+
+
+class ResponseCache:
+    """
+    Replies to frequent inputs, keyed by the normalized text, with TTL and LRU
+    eviction. With `embeddings` set, a miss falls back to the most similar
+    cached input above `threshold` (cosine).
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL, embeddings=None, threshold: float = SEMANTIC_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self._entries = OrderedDict()   # key -> [reply, expires_at, unit vector or None]
+        self._probes = OrderedDict()    # key -> vector computed on a miss, reused by put()
+        self.stats = {"lookups": 0, "exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    async def _embed(self, key: str):
+        vector = np.asarray(await self.embeddings.aembed_query(key), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def get(self, text: str):
+        key = normalize(text)
+        now = time.monotonic()
+        self.stats["lookups"] += 1
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return entry[0]
+            del self._entries[key]
+
+        if self.embeddings is not None and self._entries:
+            vector = await self._embed(key)
+            self._probes[key] = vector
+            while len(self._probes) > self.max_entries:
+                self._probes.popitem(last=False)
+            live = [(k, e) for k, e in self._entries.items() if e[1] > now and e[2] is not None]
+            if live:
+                scores = np.stack([e[2] for _, e in live]) @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    reply, expires_at, _ = live[best][1]
+                    self._probes.pop(key, None)
+                    self._store(key, [reply, expires_at, vector])  # The next identical input is an exact hit
+                    self.stats["semantic_hits"] += 1
+                    return reply
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, text: str, reply: str):
+        key = normalize(text)
+        vector = None
+        if self.embeddings is not None:
+            vector = self._probes.pop(key, None)
+            if vector is None:
+                vector = await self._embed(key)
+        self._store(key, [reply, time.monotonic() + self.ttl, vector])
+        self.stats["stores"] += 1
+
+    def _store(self, key: str, entry: list):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def report(self) -> dict:
+        """
+        Hit rate and LLM calls saved so far.
+        """
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        lookups = self.stats["lookups"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "llm_calls_saved": hits,
+        }
@@ -80,6 +80,7 @@ async function connectToWhatsApp() {
                     const response = await axios.get(`${FASTAPI_URL}`, {
                         params: {
                             input: text,
+                            sender,
                         },
                     });
                     console.log(`📝 FastAPI response:`, response.data);
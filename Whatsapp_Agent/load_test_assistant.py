@@ -0,0 +1,125 @@
+# load_test_assistant.py
+# Load test for assistant.py with a mock LLM that takes a fixed time per call.
+#
+# Compares the async /assistant endpoint against the old pattern (a blocking
+# LLM call inside an async route, reproduced here as /assistant_blocking) at
+# increasing concurrency, and measures time-to-first-chunk on /assistant/stream.
+# The app runs on uvicorn in a child process (localhost only); no network or keys needed.
+#
+# Usage: python load_test_assistant.py --latency 0.2
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+
+os.environ.setdefault("WHATSAPP_QUEUE_DB", os.path.join(tempfile.mkdtemp(prefix="assistant_load_"), "queue.db"))
+os.environ.setdefault("RESPONSE_CACHE", "0")  # Measure LLM-bound throughput, not cache hits
+
+
+import httpx
+import uvicorn
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+import assistant
+from assistant import app, system_prompt, FALLBACK_RESPONSE
+
+PORT = 8766
+
+
+class MockLLM:
+    def __init__(self, latency: float, chunks: int = 10):
+        self.latency = latency
+        self.chunks = chunks
+
+    def invoke(self, messages, config=None):
+        time.sleep(self.latency)
+        return AIMessage(content="Hi there! " * self.chunks)
+
+    async def ainvoke(self, messages, config=None):
+        await asyncio.sleep(self.latency)
+        return AIMessage(content="Hi there! " * self.chunks)
+
+    async def astream(self, messages, config=None):
+        for _ in range(self.chunks):
+            await asyncio.sleep(self.latency / self.chunks)
+            yield AIMessageChunk(content="Hi there! ")
+
+
+def get_response(prompt: str):
+    # The previous implementation's sync LLM call, kept as the baseline
+    try:
+        response = assistant.get_llm().invoke(system_prompt.messages(input=prompt))
+        return response.content if response else FALLBACK_RESPONSE
+    except Exception as e:
+        return str(e)
+
+
+@app.get("/assistant_blocking")
+async def assistant_blocking(input: str):
+    # The previous implementation: a blocking LLM call inside an async endpoint
+    return get_response(input)
+
+
+async def run(client, path: str, users: int):
+    async def one(i):
+        start = time.perf_counter()
+        response = await client.get(path, params={"input": f"hello {i}"})
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one(i) for i in range(users)))
+    return users / (time.perf_counter() - start), statistics.median(latencies)
+
+
+async def first_chunk(client, users: int):
+    async def one(i):
+        start = time.perf_counter()
+        async with client.stream("GET", "/assistant/stream", params={"input": f"hello {i}"}) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    return time.perf_counter() - start
+
+    return statistics.median(await asyncio.gather(*(one(i) for i in range(users))))
+
+
+async def main_async(args):
+    limits = httpx.Limits(max_connections=max(args.users), max_keepalive_connections=max(args.users))
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=600, limits=limits) as client:
+        print(f"{'users':>6}{'blocking req/s':>16}{'async req/s':>13}{'async p50 ms':>14}{'stream ttfc ms':>16}")
+        for users in args.users:
+            blocking_rps, _ = await run(client, "/assistant_blocking", users)
+            async_rps, async_p50 = await run(client, "/assistant", users)
+            ttfc = await first_chunk(client, users)
+            print(f"{users:>6}{blocking_rps:>16.1f}{async_rps:>13.1f}{async_p50 * 1000:>14.0f}{ttfc * 1000:>16.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock LLM seconds per call")
+    args = parser.parse_args()
+
+    assistant.get_llm = lambda: MockLLM(args.latency)
+    # Separate process so the client does not share the server's GIL and event loop
+    server = multiprocessing.get_context("fork").Process(
+        target=uvicorn.run, args=(app,), kwargs={"host": "127.0.0.1", "port": PORT, "log_level": "warning", "timeout_keep_alive": 600}, daemon=True
+    )
+    server.start()
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/docs")
+            break
+        except httpx.TransportError:
+            time.sleep(0.1)
+    try:
+        asyncio.run(main_async(args))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DB = os.getenv("WHATSAPP_QUEUE_DB", "whatsapp_queue.db")
+WORKERS = int(os.getenv("WHATSAPP_WORKERS", "8"))
+MAX_BATCH = int(os.getenv("WHATSAPP_MAX_BATCH", "5"))          # Queued messages from one sender answered together
+MAX_ATTEMPTS = int(os.getenv("WHATSAPP_MAX_ATTEMPTS", "5"))
+RETRY_BASE = float(os.getenv("WHATSAPP_RETRY_BASE", "1.0"))    # Seconds; doubles per attempt
+RETRY_CAP = 60.0
+POLL_INTERVAL = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    message_id TEXT UNIQUE,          -- WhatsApp message id; webhook redeliveries are ignored
+    sender TEXT NOT NULL,
+    text TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    available_at REAL NOT NULL,      -- Not before this time (retry backoff)
+    status TEXT NOT NULL DEFAULT 'queued',   -- queued | processing | done | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    reply TEXT,
+    error TEXT,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS messages_status_sender ON messages (status, sender, id);
+"""
+
+
+def _items(value) -> list:
+    return value if isinstance(value, list) else []
+
+
+def _text_message(message, body) -> dict | None:
+    """
+    {"message_id", "sender", "text"} for a message with a sender and non-empty
+    text, else None.
+    """
+    sender = message.get("from")
+    if isinstance(body, dict):
+        body = body.get("body")
+    if not isinstance(sender, (str, int)) or not isinstance(body, str) or not body:
+        return None
+    message_id = message.get("id")
+    return {"message_id": str(message_id) if message_id is not None else None, "sender": str(sender), "text": body}
+
+
+def parse_webhook(payload) -> list[dict]:
+    """
+    Extracts text messages from a WhatsApp Cloud API webhook
+    (entry -> changes -> value -> messages) or a flat {"id", "from", "text"} message.
+    Malformed entries are skipped (and logged) so the rest of the delivery is
+    still accepted; a payload that is not a JSON object raises ValueError.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Webhook payload must be a JSON object.")
+    messages, skipped = [], 0
+    for entry in _items(payload.get("entry")):
+        for change in _items(entry.get("changes") if isinstance(entry, dict) else None):
+            value = change.get("value") if isinstance(change, dict) else None
+            for message in _items(value.get("messages") if isinstance(value, dict) else None):
+                if not isinstance(message, dict):
+                    skipped += 1
+                    continue
+                if message.get("type", "text") != "text":
+                    continue  # Media, reactions, ... are not answered
+                parsed = _text_message(message, message.get("text"))
+                if parsed is None:
+                    skipped += 1
+                else:
+                    messages.append(parsed)
+    if not messages and "entry" not in payload and ("from" in payload or "text" in payload):
+        parsed = _text_message(payload, payload.get("text"))
+        if parsed is None:
+            skipped += 1
+        else:
+            messages.append(parsed)
+    if skipped:
+        logger.warning(f"Skipped {skipped} malformed webhook message(s).")
+    return messages
+
+
+class MessageQueue:
+    """
+    Durable inbound message queue in SQLite (WAL). Enqueues commit with
+    synchronous=FULL, so an ack means the message survives a crash or power
+    loss; state changes after that commit without fsync (at worst a message is
+    answered again after a power loss). Messages are claimed one conversation
+    at a time: a sender with a message in flight, or whose oldest message is
+    waiting out a retry, is skipped, which keeps per-sender order.
+    """
+
+    def __init__(self, path: str = QUEUE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def enqueue(self, messages: list[dict]) -> int:
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("PRAGMA synchronous=FULL")  # fsync before the webhook is acked
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO messages (message_id, sender, text, received_at, available_at) VALUES (?, ?, ?, ?, ?)",
+                    [(m.get("message_id"), m["sender"], m["text"], now, now) for m in messages],
+                )
+                self._conn.commit()
+            finally:
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            return self._conn.total_changes - before
+
+    def claim(self, max_batch: int = MAX_BATCH):
+        """
+        Marks up to `max_batch` consecutive queued messages of one eligible
+        sender as processing. Returns (sender, rows) or None.
+        """
+        now = time.time()
+        with self._lock:
+            # The write lock is taken before the SELECT, so another process sharing
+            # the database cannot claim the same sender between the read and the UPDATE
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """
+                    SELECT sender FROM messages WHERE status = 'queued'
+                    GROUP BY sender
+                    HAVING MAX(available_at) <= ?
+                       AND sender NOT IN (SELECT sender FROM messages WHERE status = 'processing')
+                    ORDER BY MIN(id) LIMIT 1
+                    """,
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    self._conn.rollback()
+                    return None
+                sender = row[0]
+                rows = self._conn.execute(
+                    "SELECT id, text, received_at, attempts FROM messages WHERE status = 'queued' AND sender = ? ORDER BY id LIMIT ?",
+                    (sender, max_batch),
+                ).fetchall()
+                self._conn.executemany("UPDATE messages SET status = 'processing' WHERE id = ?", [(r[0],) for r in rows])
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            return sender, rows
+
+    def complete(self, ids: list[int], reply: str):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE messages SET status = 'done', reply = ?, finished_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(reply, now, i) for i in ids],
+            )
+            self._conn.commit()
+
+    def fail(self, ids: list[int], error: str, attempts: int) -> bool:
+        """
+        Requeues with exponential backoff, or marks failed after MAX_ATTEMPTS.
+        Returns True if the messages will be retried.
+        """
+        now = time.time()
+        retry = attempts + 1 < MAX_ATTEMPTS
+        delay = min(RETRY_CAP, RETRY_BASE * 2 ** attempts)
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE messages SET status = ?, error = ?, attempts = attempts + 1, available_at = ?, finished_at = ? WHERE id = ?",
+                [("queued" if retry else "failed", error, now + delay, None if retry else now, i) for i in ids],
+            )
+            self._conn.commit()
+        return retry
+
+    def recover(self) -> int:
+        """
+        Requeues messages left in processing by a crashed or stopped process.
+        """
+        with self._lock:
+            count = self._conn.execute("UPDATE messages SET status = 'queued' WHERE status = 'processing'").rowcount
+            self._conn.commit()
+        return count
+
+    def depth(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM messages GROUP BY status").fetchall()
+        return {"queued": 0, "processing": 0, "done": 0, "failed": 0, **dict(rows)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WorkerPool:
+    """
+    Async workers that drain a MessageQueue. `handle(sender, texts)` returns the
+    reply for a batch of one sender's consecutive messages; an exception
+    requeues the batch with backoff.
+    """
+
+    def __init__(self, queue: MessageQueue, handle, workers: int = WORKERS, max_batch: int = MAX_BATCH):
+        self.queue = queue
+        self.handle = handle
+        self.workers = workers
+        self.max_batch = max_batch
+        self.latencies = deque(maxlen=10000)  # Seconds from webhook receipt to reply
+        self.stats = {"batches": 0, "messages": 0, "retries": 0, "failed": 0}
+        self._tasks = []
+        self._signal = asyncio.Semaphore(0)  # One release per enqueue wakes one idle worker
+
+    async def start(self):
+        recovered = await asyncio.to_thread(self.queue.recover)
+        if recovered:
+            logger.info(f"Requeued {recovered} messages left in processing.")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    def notify(self):
+        self._signal.release()
+
+    async def _worker(self, index: int):
+        while True:
+            claimed = await asyncio.to_thread(self.queue.claim, self.max_batch)
+            if claimed is None:
+                # Idle: wait for an enqueue, or poll for retries coming out of backoff
+                try:
+                    await asyncio.wait_for(self._signal.acquire(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            sender, rows = claimed
+            ids = [r[0] for r in rows]
+            try:
+                reply = await self.handle(sender, [r[1] for r in rows])
+            except asyncio.CancelledError:
+                raise  # Left in processing; recover() requeues it on the next start
+            except Exception as e:
+                attempts = max(r[3] for r in rows)
+                if await asyncio.to_thread(self.queue.fail, ids, f"{type(e).__name__}: {e}", attempts):
+                    self.stats["retries"] += 1
+                else:
+                    self.stats["failed"] += len(ids)
+                    logger.error(f"Giving up on {len(ids)} messages from {sender}: {e}")
+                continue
+            await asyncio.to_thread(self.queue.complete, ids, reply)
+            now = time.time()
+            self.latencies.extend(now - r[2] for r in rows)
+            self.stats["batches"] += 1
+            self.stats["messages"] += len(ids)
+
+    async def metrics(self) -> dict:
+        ordered = sorted(self.latencies)
+        latency = {}
+        if ordered:
+            latency = {
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+                "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 1) if len(ordered) >= 20 else None,
+                "max_ms": round(ordered[-1] * 1000, 1),
+            }
+        return {"depth": await asyncio.to_thread(self.queue.depth), "workers": self.workers, **self.stats, "latency": latency}
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,138 @@
+# simulate_webhooks.py
+# Offline simulation of WhatsApp webhook traffic against assistant.py.
+#
+# Starts the app on uvicorn in a child process with a mock LLM (fixed latency,
+# some random failures), sends bursts of Cloud API-style webhooks from many
+# senders (including redeliveries), then waits for the queue to drain and
+# reports ack latency, queue metrics and whether per-sender order was kept.
+#
+# Usage: python simulate_webhooks.py --senders 50 --messages 10 --fail-rate 0.1
+import os
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+
+WORKDIR = tempfile.mkdtemp(prefix="whatsapp_sim_")
+os.environ.setdefault("WHATSAPP_QUEUE_DB", os.path.join(WORKDIR, "queue.db"))
+os.environ.setdefault("WHATSAPP_RETRY_BASE", "0.05")
+
+import httpx
+import uvicorn
+from langchain_core.messages import AIMessage
+
+import assistant
+
+PORT = 8768
+
+
+class FlakyMockLLM:
+    def __init__(self, latency: float, fail_rate: float):
+        self.latency = latency
+        self.fail_rate = fail_rate
+
+    async def ainvoke(self, messages, config=None):
+        await asyncio.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            raise RuntimeError("Simulated 503 from the LLM")
+        return AIMessage(content=f"echo: {messages[-1].content}")
+
+
+def webhook_payload(sender: str, seq: int) -> dict:
+    return {"entry": [{"changes": [{"value": {"messages": [
+        {"id": f"wamid.{sender}.{seq}", "from": sender, "timestamp": str(int(time.time())), "type": "text", "text": {"body": f"message {seq}"}}
+    ]}}]}]}
+
+
+async def send_all(client, senders: int, messages: int, redelivery_rate: float):
+    ack_latencies = []
+
+    async def sender_loop(s):
+        sender = f"4470000{s:05d}"
+        for seq in range(messages):
+            for _ in range(2 if random.random() < redelivery_rate else 1):
+                start = time.perf_counter()
+                response = await client.post("/webhook", json=webhook_payload(sender, seq))
+                response.raise_for_status()
+                ack_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(random.uniform(0, 0.02))  # Bursty, but in order per sender
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender_loop(s) for s in range(senders)))
+    return ack_latencies, time.perf_counter() - start
+
+
+async def wait_for_drain(client, timeout: float = 300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        metrics = (await client.get("/webhook/metrics")).json()
+        if metrics["depth"]["queued"] == 0 and metrics["depth"]["processing"] == 0:
+            return metrics
+        await asyncio.sleep(0.2)
+    raise TimeoutError("Queue did not drain")
+
+
+def check_order(path: str):
+    """
+    Within each sender, messages must finish in arrival order (batched ones together).
+    """
+    connection = sqlite3.connect(path)
+    rows = connection.execute("SELECT sender, id, finished_at FROM messages WHERE status = 'done' ORDER BY sender, id").fetchall()
+    connection.close()
+    violations = 0
+    last = {}
+    for sender, _, finished_at in rows:
+        if finished_at < last.get(sender, 0):
+            violations += 1
+        last[sender] = finished_at
+    return len(rows), violations
+
+
+async def main_async(args):
+    limits = httpx.Limits(max_connections=args.senders)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=60, limits=limits) as client:
+        ack_latencies, send_time = await send_all(client, args.senders, args.messages, args.redelivery_rate)
+        ordered = sorted(ack_latencies)
+        print(f"sent {len(ordered)} webhooks in {send_time:.1f}s "
+              f"(ack p50 {statistics.median(ordered) * 1000:.1f} ms, p95 {ordered[int(len(ordered) * 0.95) - 1] * 1000:.1f} ms)")
+        metrics = await wait_for_drain(client)
+        print(f"queue   {metrics['depth']}")
+        print(f"workers batches={metrics['batches']} messages={metrics['messages']} retries={metrics['retries']} failed={metrics['failed']}")
+        print(f"latency receipt->reply {metrics['latency']}")
+    done, violations = check_order(os.environ["WHATSAPP_QUEUE_DB"])
+    expected = args.senders * args.messages
+    print(f"order   {done}/{expected} done, {violations} per-sender order violations")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--senders", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=10, help="Messages per sender")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock LLM seconds per call")
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    parser.add_argument("--redelivery-rate", type=float, default=0.05, help="Share of webhooks delivered twice")
+    args = parser.parse_args()
+
+    assistant.get_llm = lambda: FlakyMockLLM(args.latency, args.fail_rate)
+    server = multiprocessing.get_context("fork").Process(
+        target=uvicorn.run, args=(assistant.app,), kwargs={"host": "127.0.0.1", "port": PORT, "log_level": "warning"}, daemon=True
+    )
+    server.start()
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/webhook/metrics")
+            break
+        except httpx.TransportError:
+            time.sleep(0.1)
+    try:
+        asyncio.run(main_async(args))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()